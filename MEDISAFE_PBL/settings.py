@@ -112,11 +112,15 @@ WSGI_APPLICATION = 'MEDISAFE_PBL.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Django advises against persistent connections under ASGI (the production server): they
+# are kept per thread and are not reliably reused. Keep 0 and let the Supabase pooler pool.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+
 # Railway provides DATABASE_URL, parse it if available
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=DB_CONN_MAX_AGE)
     }
 else:
     # Fallback to Supabase connection for local development
@@ -131,7 +135,7 @@ else:
             'OPTIONS': {
                 'sslmode': os.getenv('DB_SSLMODE', 'require'),
             },
-            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
         }
     }
 # Custom User Model
@@ -215,3 +219,50 @@ SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6
 SUPABASE_STORAGE_BUCKET = os.getenv('SUPABASE_STORAGE_BUCKET', 'profile-photos')
 SUPABASE_STORAGE_BUCKET_PRESCRIPTIONS = os.getenv('SUPABASE_STORAGE_BUCKET_PRESCRIPTIONS', 'prescriptions')
 SUPABASE_STORAGE_BUCKET_NOTIFICATIONS = os.getenv('SUPABASE_STORAGE_BUCKET_NOTIFICATIONS', 'notifications')
+SUPABASE_STORAGE_BUCKET_BLOBS = os.getenv('SUPABASE_STORAGE_BUCKET_BLOBS', 'blobs')
+
+# Content-addressed blob store for uploaded files (see myapp/utils/blob_store.py)
+# 'local' keeps files under BLOB_STORE_ROOT; use 'supabase' on Railway where the disk is ephemeral
+BLOB_STORE_BACKEND = os.getenv('BLOB_STORE_BACKEND', 'local')
+BLOB_STORE_ROOT = Path(os.getenv('BLOB_STORE_ROOT', str(BASE_DIR / 'media' / 'blobs')))
+# Compression at rest: 'auto' (zstd if the zstandard package is installed, else zlib), 'zlib', 'zstd' or 'none'
+BLOB_STORE_COMPRESSION = os.getenv('BLOB_STORE_COMPRESSION', 'auto')
+
+# Shared cache. The analytics payload and fragment caches, their data-version counters, the
+# dashboard snapshots and the live event log all live here, and every worker process must see
+# the same entries (a per-process memory cache would serve stale data and lose events).
+# Set REDIS_URL in production: Redis increments atomically, which the event ids rely on.
+# Without it the database cache is used; its table is created by `manage.py createcachetable`.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+# Upper bound in seconds on reusing a cached analytics payload when no source table changed
+# (see myapp/utils/analytics_cache.py)
+ANALYTICS_CACHE_TIMEOUT = int(os.getenv('ANALYTICS_CACHE_TIMEOUT', '300'))
+
+# Live analytics event stream (see myapp/utils/live_events.py): seconds a published
+# delta stays readable, and seconds one stream stays open before the browser reconnects
+LIVE_EVENTS_TTL = int(os.getenv('LIVE_EVENTS_TTL', '600'))
+LIVE_STREAM_SECONDS = int(os.getenv('LIVE_STREAM_SECONDS', '300'))
+
+# Seconds before the admin dashboard's KPI snapshot is refreshed in the background
+# (see myapp/utils/snapshots.py); stale counts are served meanwhile
+DASHBOARD_SNAPSHOT_TTL = int(os.getenv('DASHBOARD_SNAPSHOT_TTL', '30'))
+
+# Upper bound in seconds on reusing a rendered template fragment when none of its source
+# tables changed (see myapp/utils/fragment_cache.py); the hit-rate panel follows DEBUG by default
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '600'))
+FRAGMENT_CACHE_REPORT = os.getenv('FRAGMENT_CACHE_REPORT', str(DEBUG)).lower() in ('1', 'true', 'yes', 'on')
@@ -5,9 +5,18 @@ class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
     def ready(self):
-        # Import signal handlers to register them. Keeps activity logging in-memory (cache) without migrations.
+        # Import signal handlers to register them. Logins and logouts go to the ActivityEvent log.
         try:
             from .utils import activity_signals  # noqa: F401
         except Exception:
             # Avoid breaking app startup if signals fail to import
             pass
+        # Daily analytics rollups, maintained from save/delete signals
+        from .utils import rollups
+        rollups.connect()
+        # Analytics payload cache, invalidated by per-model data versions
+        from .utils import analytics_cache
+        analytics_cache.connect()
+        # Notification attachments are released however the rows are deleted
+        from .utils import attachments
+        attachments.connect()
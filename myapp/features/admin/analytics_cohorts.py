@@ -0,0 +1,217 @@
+"""Cohort analytics for the admin analytics page.
+
+Three matrices over the last ``months`` calendar months, each computed in
+the database:
+
+* retention: patients by month of their first completed visit (rows) and
+  months since then (columns), plus the share who came back within 30/90
+  days of that first visit;
+* cancellations: appointments, cancellations and no-shows by the patient's
+  first-booking month and months since;
+* utilisation: per doctor and month, consultations, completed ones and
+  consultation minutes (the live session's duration when there was one),
+  with the doctor's rank and share of that month's minutes.
+
+The per-appointment columns (``ROW_NUMBER``, ``LAG``, cohort month via
+``MIN() OVER``) come from ORM window expressions; an outer ``GROUP BY`` in
+plain SQL aggregates them, so only the matrix cells come back to Python.
+"""
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Min, Q, Value, When, Window
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, Lag, RowNumber
+from django.utils import timezone
+
+from ...models import Appointment, Doctor
+from ...utils.timeseries import calendar_buckets, next_bucket
+
+# SQL for the number of days from date column ``b`` to date column ``a``
+DAYS_BETWEEN = {
+    'postgresql': '({a} - {b})',
+    'sqlite': '(julianday({a}) - julianday({b}))',
+    'mysql': 'DATEDIFF({a}, {b})',
+}
+
+# Doctors listed in the utilisation matrix, busiest first
+TOP_DOCTORS = 15
+
+
+def _month_index(field):
+    """``year * 12 + month - 1``: consecutive months are consecutive integers."""
+    return ExtractYear(field) * 12 + ExtractMonth(field) - 1
+
+
+def _label(index):
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def _rows(queryset, outer, params=()):
+    """Run ``outer`` (with ``{visits}`` standing for ``queryset``) and return its rows.
+
+    Month indexes may come back as ``Decimal`` (PostgreSQL's ``EXTRACT``);
+    callers convert them with ``int()``.
+    """
+    sql, inner_params = queryset.query.sql_with_params()
+    connection = connections[queryset.db]
+    days = DAYS_BETWEEN.get(connection.vendor, DAYS_BETWEEN['postgresql'])
+    outer = outer.format(visits=f'({sql}) visits', gap=days.format(a='consultation_date', b='prev_date'))
+    with connection.cursor() as cursor:
+        cursor.execute(outer, (*inner_params, *params))
+        return cursor.fetchall()
+
+
+def _visits(queryset):
+    """One row per appointment with its patient cohort columns."""
+    by_patient = {
+        'partition_by': [F('patient_id')],
+        'order_by': [F('consultation_date').asc(), F('consultation_id').asc()],
+    }
+    return queryset.annotate(
+        month_index=_month_index('consultation_date'),
+        first_month=Window(Min(_month_index('consultation_date')), partition_by=[F('patient_id')]),
+        visit_number=Window(RowNumber(), **by_patient),
+        prev_date=Window(Lag('consultation_date'), **by_patient),
+    ).values('patient_id', 'consultation_date', 'month_index', 'first_month', 'visit_number', 'prev_date')
+
+
+def retention(first_month):
+    visits = _visits(Appointment.objects.filter(status='Completed').order_by())
+    retained = _rows(visits, """
+        SELECT first_month, month_index - first_month, COUNT(DISTINCT patient_id)
+        FROM {visits}
+        WHERE first_month >= %s
+        GROUP BY first_month, month_index - first_month
+    """, [first_month])
+    returned = _rows(visits, """
+        SELECT first_month,
+               SUM(CASE WHEN {gap} BETWEEN 1 AND 30 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN {gap} BETWEEN 1 AND 90 THEN 1 ELSE 0 END)
+        FROM {visits}
+        WHERE first_month >= %s AND visit_number = 2
+        GROUP BY first_month
+    """, [first_month])
+    return retained, {int(cohort): (within_30, within_90) for cohort, within_30, within_90 in returned}
+
+
+def cancellations(first_month):
+    no_show = (
+        Q(status='Scheduled', approval_status='Approved', consultation_date__lt=timezone.localdate())
+        & (Q(live_session__isnull=True) | Q(live_session__started_at__isnull=True))
+    )
+    visits = _visits(Appointment.objects.order_by()).annotate(
+        outcome=Case(
+            When(status='Cancelled', then=Value(1)),
+            When(no_show, then=Value(2)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+    return _rows(visits, """
+        SELECT first_month, month_index - first_month, COUNT(*),
+               SUM(CASE WHEN outcome = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN outcome = 2 THEN 1 ELSE 0 END)
+        FROM {visits}
+        WHERE first_month >= %s
+        GROUP BY first_month, month_index - first_month
+    """, [first_month])
+
+
+def utilisation(start, end):
+    consultations = (
+        Appointment.objects
+        .exclude(status='Cancelled')
+        .filter(consultation_date__gte=start, consultation_date__lt=end)
+        .order_by()
+        .annotate(
+            month_index=_month_index('consultation_date'),
+            minutes=Coalesce('live_session__session_duration', 'duration_minutes'),
+            completed=Case(When(status='Completed', then=Value(1)), default=Value(0), output_field=IntegerField()),
+        )
+        .values('doctor_id', 'month_index', 'minutes', 'completed')
+    )
+    return _rows(consultations, """
+        SELECT doctor_id, month_index, COUNT(*), SUM(completed), SUM(minutes),
+               RANK() OVER (PARTITION BY month_index ORDER BY SUM(minutes) DESC),
+               -- NULL share (shown as 0) for months where nobody logged minutes, not a division error
+               SUM(minutes) * 1.0 / NULLIF(SUM(SUM(minutes)) OVER (PARTITION BY month_index), 0)
+        FROM {visits}
+        GROUP BY doctor_id, month_index
+    """)
+
+
+def _doctor_names(doctor_ids):
+    doctors = Doctor.objects.filter(pk__in=doctor_ids).select_related('user__userprofile')
+    return {
+        doctor.pk: (doctor.user.get_full_name() or doctor.user.username, doctor.specialization or 'Unknown')
+        for doctor in doctors
+    }
+
+
+def collect_cohorts(months=12):
+    """JSON-ready cohort matrices for the last ``months`` calendar months (oldest first)."""
+    buckets = calendar_buckets('month', timezone.localdate(), months)
+    start, end = min(buckets), next_bucket('month', max(buckets))
+    first = start.year * 12 + start.month - 1
+    indexes = list(range(first, first + months))
+
+    retained, returned = retention(first)
+    retention_rows = {}
+    for cohort, offset, patients in retained:
+        retention_rows.setdefault(int(cohort), {})[int(offset)] = patients
+    retention_cohorts = []
+    for cohort in indexes:
+        row = retention_rows.get(cohort, {})
+        size = row.get(0, 0)
+        within_30, within_90 = returned.get(cohort, (0, 0))
+        retention_cohorts.append({
+            'cohort': _label(cohort),
+            'patients': size,
+            'retained': [row.get(offset, 0) for offset in range(first + months - cohort)],
+            'returned_30': within_30 or 0,
+            'returned_90': within_90 or 0,
+            'return_rate_30': round((within_30 or 0) / size * 100, 1) if size else 0,
+            'return_rate_90': round((within_90 or 0) / size * 100, 1) if size else 0,
+        })
+
+    cancellation_rows = {}
+    for cohort, offset, total, cancelled, no_shows in cancellations(first):
+        cancellation_rows.setdefault(int(cohort), {})[int(offset)] = (total, cancelled or 0, no_shows or 0)
+    cancellation_cohorts = []
+    for cohort in indexes:
+        row = cancellation_rows.get(cohort, {})
+        cells = [row.get(offset, (0, 0, 0)) for offset in range(first + months - cohort)]
+        total = sum(cell[0] for cell in cells)
+        cancellation_cohorts.append({
+            'cohort': _label(cohort),
+            'appointments': [cell[0] for cell in cells],
+            'cancelled': [cell[1] for cell in cells],
+            'no_show': [cell[2] for cell in cells],
+            'cancellation_rate': round(sum(cell[1] for cell in cells) / total * 100, 1) if total else 0,
+            'no_show_rate': round(sum(cell[2] for cell in cells) / total * 100, 1) if total else 0,
+        })
+
+    per_doctor = {}
+    for doctor_id, month, consultations, completed, minutes, rank, share in utilisation(start, end):
+        per_doctor.setdefault(doctor_id, {})[int(month)] = (consultations, completed or 0, minutes or 0, rank, share or 0)
+    busiest = sorted(per_doctor, key=lambda pk: -sum(cell[2] for cell in per_doctor[pk].values()))[:TOP_DOCTORS]
+    names = _doctor_names(busiest)
+    doctors = []
+    for pk in busiest:
+        cells = [per_doctor[pk].get(month) for month in indexes]
+        name, specialization = names.get(pk, (f'Doctor #{pk}', 'Unknown'))
+        doctors.append({
+            'doctor_id': pk,
+            'name': name,
+            'specialization': specialization,
+            'consultations': [cell[0] if cell else 0 for cell in cells],
+            'completed': [cell[1] if cell else 0 for cell in cells],
+            'minutes': [cell[2] if cell else 0 for cell in cells],
+            'rank': [cell[3] if cell else None for cell in cells],
+            'share': [round(float(cell[4]) * 100, 1) if cell else 0 for cell in cells],
+        })
+
+    return {
+        'months': [_label(index) for index in indexes],
+        'retention': retention_cohorts,
+        'cancellations': cancellation_cohorts,
+        'utilisation': doctors,
+    }
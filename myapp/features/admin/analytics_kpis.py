@@ -0,0 +1,131 @@
+"""KPI counts shared by the admin analytics views.
+
+Every count the analytics page, its live-update API and the per-period
+statistics endpoint need is computed here with one conditional-aggregate
+query per table (see ``myapp.utils.aggregates``), so the number of
+round-trips stays fixed however many KPIs are added.
+
+``collect_rollup_kpis`` returns the same counts from the daily rollups plus
+a live count for today (see ``myapp.utils.rollups``), so the analytics page
+and its API never scan the source tables; its windows are whole days.
+"""
+from django.db.models import Q
+
+from ...models import Appointment, BookedService, Doctor, LabResult, Patient, Prescription, User
+from ...utils.aggregates import aggregate_counts, by_value, window
+from ...utils.rollups import rollup_counts, rollup_series, rollup_total
+
+ROLES = ['admin', 'doctor', 'nurse', 'lab_tech', 'patient']
+APPROVAL_STATUSES = ['Pending', 'Approved', 'Rejected']
+
+KPI_TABLES = (
+    'users', 'patients', 'doctors',
+    'appointments', 'booked_services', 'lab_results', 'prescriptions',
+)
+
+# Tables with a monthly trend series, read from the daily rollups
+TREND_TABLES = ('appointments', 'lab_results', 'prescriptions')
+
+
+def _table_specs(start, end):
+    """``{table: (queryset, spec)}`` for every KPI table."""
+    joined = window('date_joined', start, end)
+    created = window('created_at', start, end)
+    booked = window('booking_date', start.date(), end.date() if end is not None else None)
+    uploaded = window('upload_date', start, end)
+    return {
+        'users': (User.objects.all(), {
+            'total': None,
+            'active': Q(is_active=True),
+            'inactive': Q(is_active=False),
+            'in_window': joined,
+            'roles': by_value('role', ROLES),
+        }),
+        'patients': (Patient.objects.all(), {
+            'total': None,
+        }),
+        'doctors': (Doctor.objects.all(), {
+            'total': None,
+        }),
+        'appointments': (Appointment.objects.all(), {
+            'total': None,
+            'completed': Q(status='Completed'),
+            'in_window': created,
+            'completed_in_window': Q(status='Completed') & created,
+            'approval': by_value('approval_status', APPROVAL_STATUSES),
+        }),
+        'booked_services': (BookedService.objects.all(), {
+            'total': None,
+            'in_window': booked,
+        }),
+        'lab_results': (LabResult.objects.all(), {
+            'total': None,
+            'in_window': uploaded,
+        }),
+        'prescriptions': (Prescription.objects.all(), {
+            'total': None,
+            'in_window': created,
+        }),
+    }
+
+
+def collect_kpis(start, end=None, tables=KPI_TABLES, trend_buckets=(), trends=()):
+    """Return ``{table: counts}`` for each of ``tables``, one query per table.
+
+    ``*_in_window`` counts cover ``start <= t < end`` (``end=None`` means
+    open-ended). Each table in ``trends`` (a subset of ``TREND_TABLES``) also
+    gets a ``trend`` series over the calendar-month ``trend_buckets``, read
+    from the daily rollups plus a live count for today.
+    """
+    specs = _table_specs(start, end)
+    kpis = {}
+    for table in tables:
+        queryset, spec = specs[table]
+        kpis[table] = aggregate_counts(queryset, spec)
+    for table in trends:
+        kpis.setdefault(table, {})['trend'] = rollup_series(table, trend_buckets)
+    return kpis
+
+
+def _rollup_table_kpis(table, since):
+    """Counts of ``table`` for ``collect_rollup_kpis``."""
+    if table == 'users':
+        roles = rollup_counts('users', 'role')
+        active = rollup_counts('users', 'active')
+        return {
+            'total': sum(roles.values()),
+            'active': active.get('True', 0),
+            'inactive': active.get('False', 0),
+            'in_window': rollup_total('users', since),
+            'roles': {role: roles.get(role, 0) for role in ROLES},
+        }
+    if table == 'patients':
+        return {'total': Patient.objects.count()}
+    if table == 'doctors':
+        return {'total': Doctor.objects.count()}
+    if table == 'appointments':
+        statuses = rollup_counts('appointments', 'status')
+        in_window = rollup_counts('appointments', 'status', since)
+        approval = rollup_counts('appointments', 'approval_status')
+        return {
+            'total': sum(statuses.values()),
+            'completed': statuses.get('Completed', 0),
+            'in_window': sum(in_window.values()),
+            'completed_in_window': in_window.get('Completed', 0),
+            'approval': {status: approval.get(status, 0) for status in APPROVAL_STATUSES},
+        }
+    return {'total': rollup_total(table), 'in_window': rollup_total(table, since)}
+
+
+def collect_rollup_kpis(start, tables=KPI_TABLES, trend_buckets=(), trends=()):
+    """``collect_kpis(start, ...)`` read from the daily rollups.
+
+    ``*_in_window`` counts cover the rows since the calendar day of
+    ``start``. Patients and doctors have no rollups; their totals are plain
+    counts of those (small) tables.
+    """
+    since = start.date() if hasattr(start, 'date') else start
+    kpis = {table: _rollup_table_kpis(table, since) for table in tables}
+    for table in trends:
+        kpis.setdefault(table, {})['trend'] = rollup_series(table, trend_buckets)
+    return kpis
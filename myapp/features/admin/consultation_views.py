@@ -66,6 +66,7 @@ def mod_consultations(request):
         context = {
             "consultations": consultations,
             "admin": {"username": "Administrator"},
+            "today": today_date,
             "today_appointments_count": appt_counts['today'],
             "today_appointments": today_appointments,
             "week_appointments_count": appt_counts['week'],
@@ -104,6 +105,7 @@ def mod_consultations(request):
         context = {
             "consultations": consultations,
             "admin": admin_user,
+            "today": today_date,
             "today_appointments_count": appt_counts['today'],
             "today_appointments": today_appointments,
             "week_appointments_count": appt_counts['week'],
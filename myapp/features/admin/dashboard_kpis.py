@@ -0,0 +1,38 @@
+"""KPI tiles at the top of the admin dashboard.
+
+``dashboard_kpis`` serves the counts from a stale-while-revalidate snapshot
+(``utils.snapshots``), so a dashboard view costs no KPI queries while the
+snapshot is fresh and at most one background rebuild when it is not.
+``DASHBOARD_SNAPSHOT_TTL`` (seconds) bounds how stale the tiles can be.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from ...models import Appointment, BookedService, LabResult, Patient, Prescription, User, UserProfile
+from ...utils.aggregates import aggregate_counts
+from ...utils.snapshots import get_snapshot
+
+SOURCES = ('User', 'Patient', 'UserProfile', 'LabResult', 'Appointment', 'BookedService', 'Prescription')
+
+
+def build_kpis():
+    """Every tile's count; the booked-service totals share one query."""
+    bookings = aggregate_counts(BookedService.objects.all(), {
+        'total_booked_services': None,
+        'booked_services_pending': Q(status='Pending'),
+        'booked_services_confirmed': Q(status='Confirmed'),
+        'booked_services_completed': Q(status='Completed'),
+    })
+    return {
+        'total_users': User.objects.count(),
+        'total_patients': Patient.objects.count(),
+        'total_profiles': UserProfile.objects.count(),
+        'total_lab_results': LabResult.objects.count(),
+        'total_appointments': Appointment.objects.count(),
+        'total_prescriptions': Prescription.objects.count(),
+        **bookings,
+    }
+
+
+def dashboard_kpis():
+    return get_snapshot('dashboard_kpis', build_kpis, getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 30), SOURCES)
@@ -2,8 +2,12 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.utils import timezone
 from datetime import date, timedelta
-from ...models import User, UserProfile, Patient, LabResult, Appointment, BookedService, RolePermission, Prescription
-from django.core.cache import cache
+from ...models import User, LabResult, Appointment, BookedService, RolePermission, Prescription
+from .activity_feed import recent_activity
+from .dashboard_kpis import dashboard_kpis
+from .schedule import MAX_DAYS, summarise_schedule
+from ...utils import fragment_cache
+from ...utils.activity_signals import record_event
 from django.http import JsonResponse
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
@@ -12,37 +16,12 @@ import json
 import datetime
 
 
-def _display_name_of_user(user):
-    if not user:
-        return None
-    try:
-        full = getattr(user, 'get_full_name', None)
-        if callable(full):
-            name = full()
-            if name:
-                return name
-    except Exception:
-        pass
-    return getattr(user, 'username', str(user))
-
 def moddashboard(request):
     """Admin dashboard view"""
     if request.session.get("is_admin"):
         # For secret admin login
-        user_profiles = UserProfile.objects.select_related('user').all()
-        patients = Patient.objects.select_related('user').all()
-        
-        # Aggregate statistics
-        total_users = User.objects.count()
-        total_patients = Patient.objects.count()
-        total_profiles = UserProfile.objects.count()
-        total_lab_results = LabResult.objects.count()
-        total_appointments = Appointment.objects.count()
-        total_booked_services = BookedService.objects.count()
-        total_prescriptions = Prescription.objects.count()
-        booked_services_pending = BookedService.objects.filter(status='Pending').count()
-        booked_services_confirmed = BookedService.objects.filter(status='Confirmed').count()
-        booked_services_completed = BookedService.objects.filter(status='Completed').count()
+        # KPI tiles come from a cached snapshot refreshed in the background
+        kpis = dashboard_kpis()
         
         # Today's data
         today = date.today()
@@ -53,98 +32,12 @@ def moddashboard(request):
         latest_lab_results = LabResult.objects.select_related('user','uploaded_by').order_by('-upload_date')[:5]
         latest_appointments = Appointment.objects.select_related('doctor','doctor__user','patient','patient__userprofile').order_by('-created_at')[:5]
         latest_prescriptions = Prescription.objects.select_related('live_appointment__appointment__patient', 'doctor__user').order_by('-created_at')[:5]
-        # Collect cached auth events (login/logout) from in-memory cache
-        recent_activities = []
-        try:
-            cached_events = cache.get('site_recent_activity_events', [])
-            for ev in cached_events:
-                recent_activities.append({
-                    'type': 'Auth',
-                    'summary': ev.get('summary'),
-                    'detail': ev.get('detail'),
-                    'link': ev.get('link', 'mod_users'),
-                    'date': ev.get('date')
-                })
-        except Exception:
-            # cache may be unavailable in some environments
-            pass
-
-        # Build a unified recent activity list from appointments, lab results and booked services
-        for appt in latest_appointments:
-            try:
-                dt = getattr(appt, 'created_at', None)
-            except Exception:
-                dt = None
-            # Resolve doctor name safely
-            doctor_name = None
-            try:
-                if getattr(appt, 'doctor', None) and getattr(appt.doctor, 'user', None):
-                    doctor_name = _display_name_of_user(appt.doctor.user)
-            except Exception:
-                doctor_name = None
-            patient_name = None
-            try:
-                if getattr(appt, 'patient', None):
-                    patient_name = _display_name_of_user(appt.patient)
-            except Exception:
-                patient_name = None
-            summary = 'Appointment'
-            if doctor_name:
-                summary = f"Appointment: Dr. {doctor_name}"
-            elif patient_name:
-                summary = f"Appointment: {patient_name}"
-            recent_activities.append({
-                'type': 'Appointment',
-                'summary': summary,
-                'detail': getattr(appt, 'consultation_type', ''),
-                'link': 'mod_consultations',
-                'date': dt
-            })
-
-        for lr in latest_lab_results:
-            user_obj = getattr(lr, 'user', None)
-            user_name = _display_name_of_user(user_obj) if user_obj else ''
-            recent_activities.append({
-                'type': 'LabResult',
-                'summary': f"Lab: {getattr(lr, 'lab_type', 'Result')}",
-                'detail': user_name,
-                'link': 'mod_records',
-                'date': getattr(lr, 'upload_date', None)
-            })
-
-        latest_bookings = BookedService.objects.select_related('user').order_by('-created_at')[:5]
-        for b in latest_bookings:
-            user_name = _display_name_of_user(getattr(b, 'user', None))
-            recent_activities.append({
-                'type': 'ServiceBooking',
-                'summary': f"Service: {getattr(b, 'service_name', 'Service')} {f'({user_name})' if user_name else ''}",
-                'detail': getattr(b, 'status', ''),
-                'link': 'mod_consultations',
-                'date': getattr(b, 'created_at', None)
-            })
-
-        # Sort activities by date desc and take latest 8
-        recent_activities = sorted([r for r in recent_activities if r.get('date')], key=lambda x: x['date'], reverse=True)[:8]
+        # Activity log, appointments, lab results and bookings, newest first, in one query
+        recent_activities = recent_activity(8)
 
         # Build schedule summary for next 14 days (appointments and booked services counts)
-        schedule_summary = []
         try:
-            base = today
-            for i in range(0, 14):
-                d = base + timedelta(days=i)
-                appt_count = Appointment.objects.filter(consultation_date=d).count()
-                lab_count = BookedService.objects.filter(booking_date=d).count()
-                appt_link = reverse('mod_consultations') + f'?date={d.isoformat()}'
-                lab_link = reverse('labresults') + f'?date={d.isoformat()}'
-                schedule_summary.append({
-                    'date': d,
-                    'date_str': d.strftime('%a %b %d'),
-                    'iso': d.isoformat(),
-                    'appt_count': appt_count,
-                    'lab_count': lab_count,
-                    'appt_link': appt_link,
-                    'lab_link': lab_link,
-                })
+            schedule_summary = summarise_schedule(today)
         except Exception:
             schedule_summary = []
         
@@ -183,24 +76,12 @@ def moddashboard(request):
                 current_user = AdminUser()
         
         context = {
-            "user_profiles": user_profiles,
-            "patients": patients,
-            "total_users": total_users,
-            "total_patients": total_patients,
-            "total_profiles": total_profiles,
+            **kpis,
             "admin": {"username": "Administrator"},
             "user": current_user,  # Add user to context to prevent template errors
-            "total_lab_results": total_lab_results,
-            "total_appointments": total_appointments,
-            "total_booked_services": total_booked_services,
-            "total_prescriptions": total_prescriptions,
-            "booked_services_pending": booked_services_pending,
-            "booked_services_confirmed": booked_services_confirmed,
-            "booked_services_completed": booked_services_completed,
+            "today": today,
             "today_appointments": today_appointments,
-            "today_appointments_count": today_appointments.count(),
             "today_booked_services": today_booked_services,
-            "today_booked_services_count": today_booked_services.count(),
             "latest_accounts": latest_accounts,
             "latest_lab_results": latest_lab_results,
             "latest_appointments": latest_appointments,
@@ -219,20 +100,8 @@ def moddashboard(request):
     
     try:
         admin_user = User.objects.get(user_id=user_id, role="admin")
-        user_profiles = UserProfile.objects.select_related('user').all()
-        patients = Patient.objects.select_related('user').all()
-        
-        # Aggregate statistics
-        total_users = User.objects.count()
-        total_patients = Patient.objects.count()
-        total_profiles = UserProfile.objects.count()
-        total_lab_results = LabResult.objects.count()
-        total_appointments = Appointment.objects.count()
-        total_booked_services = BookedService.objects.count()
-        total_prescriptions = Prescription.objects.count()
-        booked_services_pending = BookedService.objects.filter(status='Pending').count()
-        booked_services_confirmed = BookedService.objects.filter(status='Confirmed').count()
-        booked_services_completed = BookedService.objects.filter(status='Completed').count()
+        # KPI tiles come from a cached snapshot refreshed in the background
+        kpis = dashboard_kpis()
         
         # Today's data
         today = date.today()
@@ -243,109 +112,21 @@ def moddashboard(request):
         latest_lab_results = LabResult.objects.select_related('user','uploaded_by').order_by('-upload_date')[:5]
         latest_appointments = Appointment.objects.select_related('doctor','doctor__user','patient','patient__userprofile').order_by('-created_at')[:5]
         latest_prescriptions = Prescription.objects.select_related('live_appointment__appointment__patient', 'doctor__user').order_by('-created_at')[:5]
-        # Include cached auth events for non-secret path as well
-        recent_activities = []
-        try:
-            cached_events = cache.get('site_recent_activity_events', [])
-            for ev in cached_events:
-                recent_activities.append({
-                    'type': 'Auth',
-                    'summary': ev.get('summary'),
-                    'detail': ev.get('detail'),
-                    'link': ev.get('link', 'mod_users'),
-                    'date': ev.get('date')
-                })
-        except Exception:
-            pass
-        for appt in latest_appointments:
-            doctor_name = None
-            try:
-                if getattr(appt, 'doctor', None) and getattr(appt.doctor, 'user', None):
-                    doctor_name = _display_name_of_user(appt.doctor.user)
-            except Exception:
-                doctor_name = None
-            patient_name = None
-            try:
-                if getattr(appt, 'patient', None):
-                    patient_name = _display_name_of_user(appt.patient)
-            except Exception:
-                patient_name = None
-            summary = 'Appointment'
-            if doctor_name:
-                summary = f"Appointment: Dr. {doctor_name}"
-            elif patient_name:
-                summary = f"Appointment: {patient_name}"
-            recent_activities.append({
-                'type': 'Appointment',
-                'summary': summary,
-                'detail': getattr(appt, 'consultation_type', ''),
-                'link': 'mod_consultations',
-                'date': getattr(appt, 'created_at', None)
-            })
-
-        for lr in latest_lab_results:
-            user_obj = getattr(lr, 'user', None)
-            user_name = _display_name_of_user(user_obj) if user_obj else ''
-            recent_activities.append({
-                'type': 'LabResult',
-                'summary': f"Lab: {getattr(lr, 'lab_type', 'Result')}",
-                'detail': user_name,
-                'link': 'mod_records',
-                'date': getattr(lr, 'upload_date', None)
-            })
-
-        latest_bookings = BookedService.objects.select_related('user').order_by('-created_at')[:5]
-        for b in latest_bookings:
-            user_name = _display_name_of_user(getattr(b, 'user', None))
-            recent_activities.append({
-                'type': 'ServiceBooking',
-                'summary': f"Service: {getattr(b, 'service_name', 'Service')} {f'({user_name})' if user_name else ''}",
-                'detail': getattr(b, 'status', ''),
-                'link': 'mod_consultations',
-                'date': getattr(b, 'created_at', None)
-            })
-        recent_activities = sorted([r for r in recent_activities if r.get('date')], key=lambda x: x['date'], reverse=True)[:8]
+        # Activity log, appointments, lab results and bookings, newest first, in one query
+        recent_activities = recent_activity(8)
         # Build schedule summary for next 14 days (appointments and booked services counts)
-        schedule_summary = []
         try:
-            base = today
-            for i in range(0, 14):
-                d = base + timedelta(days=i)
-                appt_count = Appointment.objects.filter(consultation_date=d).count()
-                lab_count = BookedService.objects.filter(booking_date=d).count()
-                appt_link = reverse('mod_consultations') + f'?date={d.isoformat()}'
-                lab_link = reverse('labresults') + f'?date={d.isoformat()}'
-                schedule_summary.append({
-                    'date': d,
-                    'date_str': d.strftime('%a %b %d'),
-                    'iso': d.isoformat(),
-                    'appt_count': appt_count,
-                    'lab_count': lab_count,
-                    'appt_link': appt_link,
-                    'lab_link': lab_link,
-                })
+            schedule_summary = summarise_schedule(today)
         except Exception:
             schedule_summary = []
 
         context = {
-            "user_profiles": user_profiles,
-            "patients": patients,
-            "total_users": total_users,
-            "total_patients": total_patients,
-            "total_profiles": total_profiles,
+            **kpis,
             "admin": admin_user,
             "user": admin_user,  # Add user to context to prevent template errors
-            "total_lab_results": total_lab_results,
-            "total_appointments": total_appointments,
-            "total_booked_services": total_booked_services,
-            "total_prescriptions": total_prescriptions,
-            "booked_services_pending": booked_services_pending,
-            "booked_services_confirmed": booked_services_confirmed,
-            "booked_services_completed": booked_services_completed,
+            "today": today,
             "today_appointments": today_appointments,
-            "today_appointments_count": today_appointments.count(),
             "today_booked_services": today_booked_services,
-            "today_booked_services_count": today_booked_services.count(),
             "latest_accounts": latest_accounts,
             "latest_lab_results": latest_lab_results,
             "latest_appointments": latest_appointments,
@@ -360,9 +141,37 @@ def moddashboard(request):
         return redirect("homepage2")
 
 
+@require_http_methods(["GET"])
+def schedule_summary_api(request):
+    """Per-day appointment and booked-service counts, e.g. ?days=90 for capacity planning"""
+    if not (request.session.get("is_admin") or
+            User.objects.filter(user_id=request.session.get("user"), role="admin").exists()):
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+
+    try:
+        days = min(max(int(request.GET.get('days', 14)), 1), MAX_DAYS)
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+    except ValueError:
+        return JsonResponse({"error": "days must be a number and start a YYYY-MM-DD date"}, status=400)
+
+    summary = summarise_schedule(start, days)
+    for day in summary:
+        del day['date']
+    return JsonResponse({'start': start.isoformat(), 'days': days, 'schedule': summary})
+
+
+@require_http_methods(["GET"])
+def fragment_cache_stats(request):
+    """Hit/miss counters of the cached template fragments"""
+    if not (request.session.get("is_admin") or
+            User.objects.filter(user_id=request.session.get("user"), role="admin").exists()):
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    return JsonResponse(fragment_cache.stats())
+
+
 def clear_recent_activity(request):
-    """Admin endpoint to clear cached recent activity events (POST).
-    This avoids DB migrations and provides a quick admin control.
+    """Admin endpoint to clear the login/logout entries from the recent activity feed (POST).
+    Appends a ``clear`` event to the activity log; entries before it are no longer shown.
     """
     # Only allow via POST and only for admins
     if request.method != 'POST':
@@ -382,7 +191,7 @@ def clear_recent_activity(request):
         return JsonResponse({'ok': False, 'error': 'Unauthorized'}, status=403)
 
     try:
-        cache.delete('site_recent_activity_events')
+        record_event('clear', 'Recent activity cleared')
         return JsonResponse({'ok': True})
     except Exception:
         return JsonResponse({'ok': False, 'error': 'Failed to clear'}, status=500)
@@ -439,24 +248,36 @@ def manage_permissions(request):
 def get_notification_file(request, notification_id):
     """Download notification file attachment"""
     try:
-        from django.core.files.storage import default_storage
-        from django.http import FileResponse
         from ...models import Notification
+        from ...utils.blob_store import BlobNotFound
+        from ...utils.downloads import EXTENSION_MAP, not_modified, stream_file
         
         notification = Notification.objects.get(notification_id=notification_id)
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, notification.file_key)
+        if cached:
+            return cached
         
-        if not notification.file:
+        if not notification.has_attachment:
             return JsonResponse({'error': 'No file attached'}, status=404)
         
-        # Get the file from storage
-        file_path = notification.file.name
-        if default_storage.exists(file_path):
-            file_obj = default_storage.open(file_path, 'rb')
-            response = FileResponse(file_obj, content_type='application/octet-stream')
-            response['Content-Disposition'] = f'attachment; filename="{file_path.split("/")[-1]}"'
-            return response
-        else:
+        # Blob store file, or a legacy base64 data URL decoded lazily while streaming
+        try:
+            mime_type, fh = notification.open_file()
+        except (ValueError, BlobNotFound):
             return JsonResponse({'error': 'File not found'}, status=404)
+
+        return stream_file(
+            request,
+            fh,
+            mime_type,
+            f"notification_{notification_id}{EXTENSION_MAP.get(mime_type, '')}",
+            size=notification.file_size,
+            blob_key=notification.file_key,
+        )
+    except Notification.DoesNotExist:
+        return JsonResponse({'error': 'Notification not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -7,6 +7,7 @@ from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 import json
 from ...models import User, UserProfile, Doctor, Appointment, Prescription, Patient
+from ...utils.thumbnails import save_profile_photo
 
 def mod_doctors(request):
     """Doctor management view"""
@@ -155,8 +156,7 @@ def get_doctor_details(request, doctor_id):
         doctor = Doctor.objects.select_related('user').get(doctor_id=doctor_id)
         try:
             profile = UserProfile.objects.get(user=doctor.user)
-            # photo_url is now a TextField with base64 data URL
-            photo_url = profile.photo_url if profile.photo_url else None
+            photo_url = profile.photo_thumbnail_url(160)
             first_name = profile.first_name
             last_name = profile.last_name
         except UserProfile.DoesNotExist:
@@ -210,7 +210,7 @@ def edit_doctor(request, doctor_id):
             profile, created = UserProfile.objects.get_or_create(user=doctor.user)
             if 'photo' in request.FILES:
                 uploaded = request.FILES['photo']
-                profile.photo_url = uploaded
+                save_profile_photo(profile, uploaded.read(), uploaded.content_type)
                 profile.save()
         except Exception:
             # Non-fatal: allow doctor update to continue even if profile save fails
@@ -246,6 +246,7 @@ def get_doctor_patients(request, doctor_id):
         appts = (
             Appointment.objects
             .select_related('patient', 'patient__userprofile')
+            .defer('patient__userprofile__photo_url')
             .filter(doctor=doctor)
         )
         seen = set()
@@ -255,8 +256,7 @@ def get_doctor_patients(request, doctor_id):
             if uid and uid not in seen:
                 seen.add(uid)
                 profile = getattr(appt.patient, 'userprofile', None)
-                # photo_url is now a TextField with base64 data URL
-                photo_url = profile.photo_url if (profile and profile.photo_url) else None
+                photo_url = profile.photo_thumbnail_url(64) if profile else None
                 patients.append({
                     'user_id': uid,
                     'name': appt.patient.get_full_name(),
@@ -286,7 +286,7 @@ def get_doctor_patients(request, doctor_id):
         prescriptions = []
         try:
             # Include prescriptions either directly linked to the doctor or via the appointment
-            pres_qs = Prescription.objects.select_related('live_appointment__appointment__patient').filter(
+            pres_qs = Prescription.objects.select_related('live_appointment__appointment__patient').with_blob_flags().filter(
                 Q(live_appointment__appointment__doctor=doctor) | Q(doctor=doctor)
             ).order_by('-created_at')
             for p in pres_qs:
@@ -302,7 +302,7 @@ def get_doctor_patients(request, doctor_id):
                     'patient_id': getattr(patient, 'user_id', None) if patient else None,
                     'status': p.status,
                     'created_at': getattr(p, 'created_at', None).isoformat() if getattr(p, 'created_at', None) else None,
-                    'has_file': bool(getattr(p, 'prescription_file', None)),
+                    'has_file': p.has_prescription_file,
                 })
         except Exception:
             prescriptions = []
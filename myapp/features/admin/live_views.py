@@ -0,0 +1,97 @@
+"""Server-sent event stream of live analytics deltas.
+
+``GET api/analytics/stream/`` keeps a ``text/event-stream`` response open
+and writes each event from ``utils.live_events`` as it is published::
+
+    id: 42
+    event: delta
+    data: {"id": 42, "metric": "appointments", "changes": [...]}
+
+The browser's ``EventSource`` applies the changes to the charts and, when a
+stream ends after ``LIVE_STREAM_SECONDS``, reconnects with ``Last-Event-ID``
+so nothing published in between is missed. Under ASGI (the production
+entry point, ``MEDISAFE_PBL.asgi`` on a uvicorn worker) the stream is an
+async generator and an open connection costs no thread; under WSGI
+(``runserver``) a plain generator is used instead.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+
+from ...models import User
+from ...utils import live_events
+
+POLL_SECONDS = 1
+KEEPALIVE_SECONDS = 15
+
+
+class _Cursor:
+    """Position in the event log plus the timers for one stream."""
+
+    def __init__(self, last_id):
+        self.last_id = last_id
+        self.started = self.last_write = time.monotonic()
+
+    @property
+    def expired(self):
+        return time.monotonic() - self.started >= getattr(settings, 'LIVE_STREAM_SECONDS', 300)
+
+    def read(self):
+        """Frames to write now: new events, or a keepalive comment when idle."""
+        frames = []
+        for event in live_events.events_since(self.last_id):
+            self.last_id = event['id']
+            frames.append(f"id: {event['id']}\nevent: delta\ndata: {json.dumps(event)}\n\n")
+        now = time.monotonic()
+        if frames:
+            self.last_write = now
+        elif now - self.last_write >= KEEPALIVE_SECONDS:
+            self.last_write = now
+            frames.append(': keepalive\n\n')
+        return frames
+
+
+def _sync_stream(cursor):
+    yield f'retry: {POLL_SECONDS * 1000}\n\n'
+    while not cursor.expired:
+        yield from cursor.read()
+        time.sleep(POLL_SECONDS)
+
+
+async def _async_stream(cursor):
+    yield f'retry: {POLL_SECONDS * 1000}\n\n'
+    while not cursor.expired:
+        # In the request's sync thread, so a database cache read reuses (and closes) its connection
+        for frame in await sync_to_async(cursor.read)():
+            yield frame
+        await asyncio.sleep(POLL_SECONDS)
+
+
+def _start_id(request):
+    """Resume after ``Last-Event-ID`` (or ``?last_id=``); new streams start at the newest event."""
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return live_events.last_id()
+
+
+@require_http_methods(["GET"])
+def analytics_stream(request):
+    """Push analytics deltas to the dashboard as server-sent events"""
+    if not (request.session.get("is_admin") or
+            User.objects.filter(user_id=request.session.get("user"), role="admin").exists()):
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+
+    cursor = _Cursor(_start_id(request))
+    stream = _async_stream(cursor) if isinstance(request, ASGIRequest) else _sync_stream(cursor)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -10,6 +10,8 @@ import json
 import random
 import base64
 from ...models import User, UserProfile, Patient, LabResult, BookedService, Prescription, Appointment, Notification
+from ...utils.blob_store import BlobTooLarge, get_blob_store
+from ...utils.downloads import EXTENSION_MAP, not_modified, stream_file
 
 def mod_patients(request):
     """Patient management view - also handles mod_records"""
@@ -185,16 +187,15 @@ def mod_patients(request):
                         except User.DoesNotExist:
                             pass
 
-                    # Read file content and convert to base64 for storage
-                    import base64
-                    file_content = lab_file.read()
-                    file_base64 = base64.b64encode(file_content).decode('utf-8')
+                    # Stream the file into the blob store chunk by chunk; the row keeps only its key
+                    file_key, file_size = get_blob_store().save_stream(lab_file.chunks(), lab_file.content_type)
                     
                     # Create lab result record
                     LabResult.objects.create(
                         user=patient,
                         lab_type=lab_type,
-                        result_file=file_base64,
+                        file_key=file_key,
+                        file_size=file_size,
                         file_type=lab_file.content_type,
                         file_name=lab_file.name,
                         uploaded_by=uploader,
@@ -204,6 +205,8 @@ def mod_patients(request):
                     messages.success(request, f"Lab result uploaded successfully for {patient.username}!")
                 except User.DoesNotExist:
                     messages.error(request, "Patient not found")
+                except BlobTooLarge as e:
+                    messages.error(request, str(e))
                 except Exception as e:
                     messages.error(request, f"Error uploading lab result: {str(e)}")
 
@@ -322,7 +325,7 @@ def mod_patients(request):
         
         # Get all users with patient role (not just Patient model records)
         # Filter out disabled accounts (User model has is_active and status fields, not is_deleted)
-        patients_query = User.objects.filter(role='patient', is_active=True, status=True).select_related('userprofile')
+        patients_query = User.objects.filter(role='patient', is_active=True, status=True)
         
         # Apply search filter if provided
         if search_query:
@@ -334,32 +337,24 @@ def mod_patients(request):
                 models.Q(userprofile__contact_number__icontains=search_query)
             )
         
-        patients = patients_query.all()
-        
-        # Get statistics
-        total_patients = patients.count()
-        active_patients = patients.filter(is_active=True).count()
+        # Get statistics; the patient, lab result and booking tables load
+        # their rows page by page from api/admin/tables/<table>/
+        total_patients = patients_query.count()
+        active_patients = patients_query.filter(is_active=True).count()
         total_lab_results = LabResult.objects.count()
         
-        # Get all lab results for the admin view
-        all_lab_results = LabResult.objects.select_related('user', 'uploaded_by', 'user__userprofile').order_by('-upload_date')
-        
-        # Get all booked services
-        all_booked_services = BookedService.objects.select_related('user', 'user__userprofile').order_by('-booking_date', '-booking_time')
         booked_services_total = BookedService.objects.count()
         booked_services_pending = BookedService.objects.filter(status='Pending').count()
         booked_services_confirmed = BookedService.objects.filter(status='Confirmed').count()
         booked_services_completed = BookedService.objects.filter(status='Completed').count()
         
         context = {
-            'patients': patients,
             'clients': clients,
             'total_count': total_patients,
             'active_count': active_patients,
             'inactive_count': total_lab_results,
+            'total_lab_results': total_lab_results,
             'search_query': search_query,
-            'all_lab_results': all_lab_results,
-            'all_booked_services': all_booked_services,
             'booked_services_total': booked_services_total,
             'booked_services_pending': booked_services_pending,
             'booked_services_confirmed': booked_services_confirmed,
@@ -549,16 +544,15 @@ def mod_patients(request):
                         except User.DoesNotExist:
                             pass
 
-                    # Read file content and convert to base64 for storage
-                    import base64
-                    file_content = lab_file.read()
-                    file_base64 = base64.b64encode(file_content).decode('utf-8')
+                    # Stream the file into the blob store chunk by chunk; the row keeps only its key
+                    file_key, file_size = get_blob_store().save_stream(lab_file.chunks(), lab_file.content_type)
                     
                     # Create lab result record
                     LabResult.objects.create(
                         user=patient,
                         lab_type=lab_type,
-                        result_file=file_base64,
+                        file_key=file_key,
+                        file_size=file_size,
                         file_type=lab_file.content_type,
                         file_name=lab_file.name,
                         uploaded_by=uploader,
@@ -568,6 +562,8 @@ def mod_patients(request):
                     messages.success(request, f"Lab result uploaded successfully for {patient.username}!")
                 except User.DoesNotExist:
                     messages.error(request, "Patient not found")
+                except BlobTooLarge as e:
+                    messages.error(request, str(e))
                 except Exception as e:
                     messages.error(request, f"Error uploading lab result: {str(e)}")
 
@@ -596,7 +592,7 @@ def mod_patients(request):
         
         # Get all users with patient role (not just Patient model records)
         # Filter out disabled accounts (User model has is_active and status fields, not is_deleted)
-        patients_query = User.objects.filter(role='patient', is_active=True, status=True).select_related('userprofile')
+        patients_query = User.objects.filter(role='patient', is_active=True, status=True)
         
         # Apply search filter if provided
         if search_query:
@@ -608,32 +604,24 @@ def mod_patients(request):
                 models.Q(userprofile__contact_number__icontains=search_query)
             )
         
-        patients = patients_query.all()
-        
-        # Get statistics
-        total_patients = patients.count()
-        active_patients = patients.filter(is_active=True).count()
+        # Get statistics; the patient, lab result and booking tables load
+        # their rows page by page from api/admin/tables/<table>/
+        total_patients = patients_query.count()
+        active_patients = patients_query.filter(is_active=True).count()
         total_lab_results = LabResult.objects.count()
         
-        # Get all lab results for the admin view
-        all_lab_results = LabResult.objects.select_related('user', 'uploaded_by', 'user__userprofile').order_by('-upload_date')
-        
-        # Get all booked services
-        all_booked_services = BookedService.objects.select_related('user', 'user__userprofile').order_by('-booking_date', '-booking_time')
         booked_services_total = BookedService.objects.count()
         booked_services_pending = BookedService.objects.filter(status='Pending').count()
         booked_services_confirmed = BookedService.objects.filter(status='Confirmed').count()
         booked_services_completed = BookedService.objects.filter(status='Completed').count()
         
         context = {
-            'patients': patients,
             'clients': clients,
             'total_count': total_patients,
             'active_count': active_patients,
             'inactive_count': total_lab_results,
+            'total_lab_results': total_lab_results,
             'search_query': search_query,
-            'all_lab_results': all_lab_results,
-            'all_booked_services': all_booked_services,
             'booked_services_total': booked_services_total,
             'booked_services_pending': booked_services_pending,
             'booked_services_confirmed': booked_services_confirmed,
@@ -761,43 +749,33 @@ def admin_prescription_download(request, prescription_id):
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
     try:
-        import base64
         prescription = Prescription.objects.get(prescription_id=prescription_id)
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, prescription.file_key)
+        if cached:
+            return cached
         
         # Check if prescription has a file
-        if not prescription.prescription_file:
+        if not prescription.has_file:
             return JsonResponse({
                 'error': 'No file attached to this prescription. Please upload a prescription file first.'
             }, status=404)
         
-        # prescription.prescription_file contains base64 data URL (data:application/pdf;base64,...)
-        # Extract the base64 part and decode it
+        # Blob store file, or a legacy base64 data URL decoded lazily while streaming
         try:
-            if prescription.prescription_file.startswith('data:'):
-                # Parse data URL: data:mime/type;base64,base64data
-                header, base64_data = prescription.prescription_file.split(',', 1)
-                mime_type = header.split(':')[1].split(';')[0]
-                
-                # Decode base64
-                file_content = base64.b64decode(base64_data)
-                
-                # Determine file extension from mime type
-                extension_map = {
-                    'application/pdf': '.pdf',
-                    'image/jpeg': '.jpg',
-                    'image/png': '.png',
-                    'image/gif': '.gif'
-                }
-                file_ext = extension_map.get(mime_type, '.pdf')
-                
-                # Create response
-                response = HttpResponse(file_content, content_type=mime_type)
-                response['Content-Disposition'] = f'attachment; filename="{prescription.prescription_number}{file_ext}"'
-                return response
-            else:
-                return JsonResponse({'error': 'Invalid file format in database'}, status=500)
-        except Exception as decode_err:
-            return JsonResponse({'error': f'Error decoding file: {str(decode_err)}'}, status=500)
+            mime_type, fh = prescription.open_prescription_file()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid file format in database'}, status=500)
+        
+        file_ext = EXTENSION_MAP.get(mime_type, '.pdf')
+        return stream_file(
+            request,
+            fh,
+            mime_type,
+            f"{prescription.prescription_number}{file_ext}",
+            blob_key=prescription.file_key,
+        )
         
     except Prescription.DoesNotExist:
         return JsonResponse({'error': 'Prescription not found'}, status=404)
@@ -822,7 +800,10 @@ def admin_prescription_details(request, prescription_id):
             'live_appointment__appointment__doctor',
             'live_appointment__appointment__doctor__user',
             'live_appointment__appointment__doctor__user__userprofile'
-        ).get(prescription_id=prescription_id)
+        ).defer(
+            'live_appointment__appointment__patient__userprofile__photo_url',
+            'live_appointment__appointment__doctor__user__userprofile__photo_url'
+        ).with_blob_flags().get(prescription_id=prescription_id)
         
         # Extract patient name
         patient = prescription.live_appointment.appointment.patient
@@ -858,7 +839,7 @@ def admin_prescription_details(request, prescription_id):
                 'patient_name': patient_name,
                 'doctor_name': doctor_name,
                 'status': prescription.status,
-                'has_file': bool(prescription.prescription_file),
+                'has_file': prescription.has_prescription_file,
                 'medicines_summary': medicines_summary,
                 'created_at': prescription.created_at.isoformat() if prescription.created_at else None,
                 'instructions': prescription.instructions or '',
@@ -924,18 +905,27 @@ def admin_lab_result_download(request, result_id):
 
     try:
         lab_result = LabResult.objects.get(lab_result_id=result_id)
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, lab_result.file_key)
+        if cached:
+            return cached
         
-        # Decode the base64 file content
+        # Open the file from the blob store (or the legacy base64 column)
         try:
-            file_content = base64.b64decode(lab_result.result_file)
+            fh = lab_result.open_result_file()
         except Exception as e:
-            return JsonResponse({"error": f"Error decoding file: {str(e)}"}, status=500)
-        
-        # Create HTTP response with file
-        response = HttpResponse(file_content, content_type=lab_result.file_type or 'application/octet-stream')
-        response['Content-Disposition'] = f'attachment; filename="{lab_result.file_name}"'
-        
-        return response
+            return JsonResponse({"error": f"Error reading file: {str(e)}"}, status=500)
+        
+        # Stream the file back in chunks
+        return stream_file(
+            request,
+            fh,
+            lab_result.file_type or 'application/octet-stream',
+            lab_result.file_name,
+            size=lab_result.file_size,
+            blob_key=lab_result.file_key,
+        )
         
     except LabResult.DoesNotExist:
         return JsonResponse({"error": "Lab result not found"}, status=404)
@@ -0,0 +1,42 @@
+"""Per-day appointment and booked-service counts for the admin dashboard.
+
+``summarise_schedule`` returns any window (the dashboard's next 14 days, or
+30/90 days for capacity planning) from two grouped queries, one per table,
+however many days it covers.
+"""
+from datetime import timedelta
+
+from django.urls import reverse
+
+from ...models import Appointment, BookedService
+from ...utils.aggregates import distribution
+
+# Longest window the schedule API will build
+MAX_DAYS = 366
+
+
+def summarise_schedule(start, days=14):
+    """One entry per day for ``start`` and the ``days - 1`` days after it."""
+    end = start + timedelta(days=days)
+    appointments = distribution(
+        Appointment, 'consultation_date', {'consultation_date__gte': start, 'consultation_date__lt': end},
+    )
+    bookings = distribution(
+        BookedService, 'booking_date', {'booking_date__gte': start, 'booking_date__lt': end},
+    )
+    appt_url = reverse('mod_consultations')
+    lab_url = reverse('labresults')
+
+    summary = []
+    for i in range(days):
+        d = start + timedelta(days=i)
+        summary.append({
+            'date': d,
+            'date_str': d.strftime('%a %b %d'),
+            'iso': d.isoformat(),
+            'appt_count': appointments.get(d, 0),
+            'lab_count': bookings.get(d, 0),
+            'appt_link': f'{appt_url}?date={d.isoformat()}',
+            'lab_link': f'{lab_url}?date={d.isoformat()}',
+        })
+    return summary
@@ -0,0 +1,129 @@
+"""Server-side data for the admin record tables.
+
+``GET api/admin/tables/<table>/`` returns one keyset page of a table (see
+``utils.tables``)::
+
+    ?sort=date-desc&search=santos&status=Pending&date_from=2026-01-01&limit=50&cursor=...
+
+The records page fetches the first page on load and the next one when
+"Load more" is clicked, so the page itself renders in constant time however
+many patients, lab results and bookings exist. ``count=1`` adds the total
+number of matching rows to the first page.
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from ...models import BookedService, LabResult, User
+from ...utils.tables import Table
+
+PATIENT_COLUMNS = {
+    'patient_id': 'user_id',
+    'username': 'user__username',
+    'email': 'user__email',
+    'first_name': 'user__userprofile__first_name',
+    'last_name': 'user__userprofile__last_name',
+}
+
+
+def _lab_result_summary(queryset):
+    month_start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return queryset.aggregate(
+        this_month=Count('pk', filter=Q(upload_date__gte=month_start)),
+        patients=Count('user', distinct=True),
+        types=Count('lab_type', distinct=True),
+    )
+
+
+TABLES = {
+    'patients': Table(
+        queryset=lambda: User.objects.filter(role='patient', is_active=True, status=True),
+        fields={
+            'id': 'user_id',
+            'username': 'username',
+            'email': 'email',
+            'first_name': 'userprofile__first_name',
+            'last_name': 'userprofile__last_name',
+            'contact': 'userprofile__contact_number',
+            'sex': 'userprofile__sex',
+            'address': 'userprofile__address',
+            'active': 'is_active',
+            'joined': 'date_joined',
+        },
+        sorts={
+            'username-asc': (('username',), False),
+            'joined-desc': (('date_joined',), True),
+        },
+        search=('username', 'email', 'userprofile__first_name', 'userprofile__last_name',
+                'userprofile__contact_number'),
+    ),
+    'lab_results': Table(
+        queryset=LabResult.objects.all,
+        fields={
+            'id': 'lab_result_id',
+            'date': 'upload_date',
+            **PATIENT_COLUMNS,
+            'type': 'lab_type',
+            'file_name': 'file_name',
+            'uploaded_by': 'uploaded_by__username',
+            'notes': 'notes',
+        },
+        sorts={
+            'date-desc': (('upload_date',), True),
+            'date-asc': (('upload_date',), False),
+            'type-asc': (('lab_type',), False),
+            'type-desc': (('lab_type',), True),
+            'patient-asc': (('user__username',), False),
+        },
+        search=('user__username', 'user__email', 'user__userprofile__first_name',
+                'user__userprofile__last_name', 'file_name', 'lab_type', 'uploaded_by__username'),
+        filters={'type': 'lab_type'},
+        date_field='upload_date',
+        summary=_lab_result_summary,
+    ),
+    'booked_services': Table(
+        queryset=BookedService.objects.all,
+        fields={
+            'id': 'booking_id',
+            'date': 'booking_date',
+            'time': 'booking_time',
+            **PATIENT_COLUMNS,
+            'service': 'service_name',
+            'status': 'status',
+            'notes': 'notes',
+            'created': 'created_at',
+        },
+        sorts={
+            'date-desc': (('booking_date', 'booking_time'), True),
+            'date-asc': (('booking_date', 'booking_time'), False),
+            'status-asc': (('status',), False),
+            'service-asc': (('service_name',), False),
+            'patient-asc': (('user__username',), False),
+        },
+        search=('user__username', 'user__email', 'user__userprofile__first_name',
+                'user__userprofile__last_name', 'service_name', 'notes'),
+        filters={'status': 'status'},
+        date_field='booking_date',
+    ),
+}
+
+
+@require_http_methods(["GET"])
+def table_data(request, table):
+    """One page of an admin record table as JSON"""
+    if not (request.session.get("is_admin") or
+            User.objects.filter(user_id=request.session.get("user"), role="admin").exists()):
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    if table not in TABLES:
+        return JsonResponse({"error": f"Unknown table '{table}'"}, status=404)
+
+    try:
+        page = TABLES[table].page(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ValidationError:
+        # A cursor whose values do not fit the sort columns
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return JsonResponse(page)
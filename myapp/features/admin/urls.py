@@ -1,10 +1,12 @@
 from django.urls import path
-from . import dashboard_views, analytics_views, patient_views, user_views, account_views, doctor_views, consultation_views
+from . import dashboard_views, analytics_views, export_views, live_views, patient_views, table_views, user_views, account_views, doctor_views, consultation_views
 
 urlpatterns = [
     # Admin Dashboard
     path('moddashboard/', dashboard_views.moddashboard, name='moddashboard'),
     path('moddashboard/clear-activity/', dashboard_views.clear_recent_activity, name='clear_recent_activity'),
+    path('moddashboard/schedule-summary/', dashboard_views.schedule_summary_api, name='schedule_summary_api'),
+    path('api/admin/fragment-cache-stats/', dashboard_views.fragment_cache_stats, name='fragment_cache_stats'),
     path('get_notification_file/<int:notification_id>/', dashboard_views.get_notification_file, name='get_notification_file'),
     path('api/admin/password-reset-notifications/', dashboard_views.get_password_reset_notifications, name='get_password_reset_notifications'),
     path('api/admin/mark-password-reset-read/<int:notification_id>/', dashboard_views.mark_password_reset_read, name='mark_password_reset_read'),
@@ -14,9 +16,14 @@ urlpatterns = [
     path('analytics/', analytics_views.analytics, name='mod_analytics'),
     path('api/analytics/', analytics_views.analytics_api, name='analytics_api'),
     path('api/analytics/dynamic-stats/', analytics_views.get_dynamic_statistics, name='get_dynamic_statistics'),
+    path('api/analytics/cohorts/', analytics_views.analytics_cohorts, name='analytics_cohorts'),
+    path('api/analytics/cache-stats/', analytics_views.analytics_cache_stats, name='analytics_cache_stats'),
+    path('api/analytics/export/<str:dataset>/', export_views.analytics_export, name='analytics_export'),
+    path('api/analytics/stream/', live_views.analytics_stream, name='analytics_stream'),
     
     # Patient Records Management (formerly mod_patients)
     path('manage/patients/', patient_views.mod_patients, name='mod_records'),
+    path('api/admin/tables/<str:table>/', table_views.table_data, name='admin_table_data'),
     
     # User Management
     path('manage/users/', user_views.mod_users, name='mod_users'),
@@ -4,7 +4,9 @@ from django.http import JsonResponse, FileResponse, HttpResponse
 from django.db import IntegrityError, models
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.urls import reverse
 from ...models import User, UserProfile, Notification
+from ...utils.downloads import EXTENSION_MAP, not_modified, stream_file, versioned_url
 import json
 import os
 import base64
@@ -175,7 +177,7 @@ def mod_users(request):
         
         if is_super_admin:
             # Super admin sees all users and accounts including deleted ones
-            users = User.objects.all().select_related('userprofile').order_by('username')
+            users = User.objects.all().select_related('userprofile').defer('userprofile__photo_url').order_by('username')
             all_accounts = User.objects.order_by('-date_joined')
             # Get deleted accounts (username starts with deleted_)
             deleted_accounts = User.objects.filter(
@@ -186,7 +188,7 @@ def mod_users(request):
             # Regular admin only sees non-deleted users and accounts
             users = User.objects.exclude(
                 username__startswith="deleted_"
-            ).select_related('userprofile').order_by('username')
+            ).select_related('userprofile').defer('userprofile__photo_url').order_by('username')
             all_accounts = User.objects.exclude(
                 username__startswith="deleted_"
             ).order_by('-date_joined')
@@ -238,7 +240,7 @@ def mod_users(request):
         
         if is_super_admin:
             # Super admin sees all users and accounts including deleted ones
-            users = User.objects.exclude(user_id=user_id).select_related('userprofile').order_by('username')
+            users = User.objects.exclude(user_id=user_id).select_related('userprofile').defer('userprofile__photo_url').order_by('username')
             all_accounts = User.objects.order_by('-date_joined')
             # Get deleted accounts (username starts with deleted_)
             deleted_accounts = User.objects.filter(
@@ -249,7 +251,7 @@ def mod_users(request):
             # Regular admin only sees non-deleted users and accounts
             users = User.objects.exclude(user_id=user_id).exclude(
                 username__startswith="deleted_"
-            ).select_related('userprofile').order_by('username')
+            ).select_related('userprofile').defer('userprofile__photo_url').order_by('username')
             all_accounts = User.objects.exclude(
                 username__startswith="deleted_"
             ).order_by('-date_joined')
@@ -319,37 +321,32 @@ def download_password_reset_file(request, notification_id):
     
     try:
         notification = Notification.objects.get(notification_id=notification_id)
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, notification.file_key)
+        if cached:
+            return cached
         
-        if not notification.file:
+        if not notification.has_attachment:
             return JsonResponse({"error": "No file attached to this notification"}, status=404)
         
-        # Notification.file contains base64 data URL (data:image/jpeg;base64,...)
-        # Extract the base64 part and decode it
+        # Blob store file, or a legacy base64 data URL decoded lazily while streaming
         try:
-            if notification.file.startswith('data:'):
-                # Parse data URL: data:mime/type;base64,base64data
-                header, base64_data = notification.file.split(',', 1)
-                mime_type = header.split(':')[1].split(';')[0]
-                
-                # Decode base64
-                file_content = base64.b64decode(base64_data)
-                
-                # Determine file extension from mime type
-                extension_map = {
-                    'image/jpeg': '.jpg',
-                    'image/png': '.png',
-                    'image/gif': '.gif'
-                }
-                file_ext = extension_map.get(mime_type, '.jpg')
-                
-                # Create response
-                response = HttpResponse(file_content, content_type=mime_type)
-                response['Content-Disposition'] = f'attachment; filename="id_photo_{notification_id}{file_ext}"'
-                return response
-            else:
-                return JsonResponse({"error": "Invalid file format"}, status=400)
-        except Exception as decode_error:
-            return JsonResponse({"error": f"Error decoding file: {str(decode_error)}"}, status=500)
+            mime_type, fh = notification.open_file()
+        except ValueError:
+            return JsonResponse({"error": "Invalid file format"}, status=400)
+        
+        file_ext = EXTENSION_MAP.get(mime_type, '.jpg')
+        mode = request.GET.get('mode', 'download')
+        return stream_file(
+            request,
+            fh,
+            mime_type,
+            f"id_photo_{notification_id}{file_ext}",
+            as_attachment=(mode != 'preview'),
+            size=notification.file_size,
+            blob_key=notification.file_key,
+        )
         
     except Notification.DoesNotExist:
         return JsonResponse({"error": "Notification not found"}, status=404)
@@ -374,7 +371,7 @@ def get_password_reset_requests(request, user_id):
         notifications = Notification.objects.filter(
             notification_type='password_reset',
             related_id=user_id
-        ).exclude(user=user).select_related('user').order_by('-created_at')
+        ).exclude(user=user).select_related('user').with_blob_flags().order_by('-created_at')
         
         data = {
             "success": True,
@@ -393,9 +390,15 @@ def get_password_reset_requests(request, user_id):
                 "created_at": notification.created_at.isoformat(),
                 "is_read": notification.is_read,
                 "priority": notification.priority,
-                "has_file": bool(notification.file),
-                "file_name": f"id_photo_{notification.notification_id}" if notification.file else None,
-                "file_url": notification.file if notification.file else None  # Direct base64 data URL
+                "has_file": notification.has_file,
+                "file_name": f"id_photo_{notification.notification_id}" if notification.has_file else None,
+                "file_url": (
+                    versioned_url(
+                        f"{reverse('download_password_reset_file', args=[notification.notification_id])}?mode=preview",
+                        notification.file_key,
+                    )
+                    if notification.has_file else None
+                )
             }
             data["requests"].append(request_data)
         
@@ -17,6 +17,8 @@ import uuid
 from supabase import create_client, Client
 
 from ...models import User, UserProfile, Patient, Notification
+from ...utils.attachments import acquire_attachment, release_attachments
+from ...utils.thumbnails import save_profile_photo
 
 logger = logging.getLogger(__name__)
 
@@ -135,27 +137,17 @@ def signup(request):
                 role = request.POST.get("role", "patient")
                 photo_file = request.FILES.get("photo_url")
                 
-                # Store photo as base64 in database if provided
-                photo_url = None
+                # Keep the uploaded photo; it is stored with its thumbnails once the profile exists
+                photo = None
                 if photo_file:
                     try:
-                        import base64
-                        
-                        # Read file content
-                        file_content = photo_file.read()
-                        
-                        # Encode to base64
-                        file_base64 = base64.b64encode(file_content).decode('utf-8')
-                        
-                        # Create data URL
-                        photo_url = f"data:{photo_file.content_type};base64,{file_base64}"
-                        logger.info(f"Photo encoded to base64")
+                        photo = (photo_file.read(), photo_file.content_type)
                     except Exception as e:
-                        logger.error(f"Failed to encode photo: {str(e)}")
+                        logger.error(f"Failed to read photo: {str(e)}")
                         import traceback
                         logger.error(traceback.format_exc())
-                        # Continue without photo if encoding fails
-                        photo_url = None
+                        # Continue without photo if reading fails
+                        photo = None
             else:
                 # Handle JSON data (backward compatibility)
                 data = json.loads(request.body)
@@ -176,7 +168,7 @@ def signup(request):
                 phone_type = data.get("phone_type", "")
                 data_privacy_consent = data.get("data_privacy_consent", False)
                 role = data.get("role", "patient")
-                photo_url = None
+                photo = None
 
             # Normalize the email address
             email = email.lower().strip()
@@ -233,8 +225,8 @@ def signup(request):
                             logger.error(f"Invalid birthday format: {birthday}")
                             birthday_date = None
                     
-                    # Create associated profile with all fields including photo
-                    UserProfile.objects.create(
+                    # Create associated profile with all fields
+                    profile = UserProfile.objects.create(
                         user=user,
                         first_name=first_name,
                         last_name=last_name,
@@ -248,10 +240,18 @@ def signup(request):
                         contact_number=contact_number if contact_number else None,
                         phone_number=phone_number if phone_number else None,
                         phone_type=phone_type if phone_type else None,
-                        photo_url=photo_url if photo_url else None,  # Save uploaded photo
                         data_privacy_consent=data_privacy_consent,
                         consent_date=timezone.now() if data_privacy_consent else None
                     )
+
+                    # Save uploaded photo and its thumbnails
+                    if photo:
+                        try:
+                            save_profile_photo(profile, *photo)
+                            profile.save(update_fields=['photo_variants', 'photo_url'])
+                        except ValueError as e:
+                            # Continue without photo if it is not a readable image
+                            logger.error(f"Failed to process photo: {str(e)}")
                     
                     # Note: Don't create Patient record - it's optional and causes database errors
                     # if role == "patient":
@@ -561,11 +561,6 @@ def forgot_password(request):
                 "success": True
             })
         
-        # Store the file temporarily to be used for multiple notifications
-        from django.core.files.base import ContentFile
-        file_content = id_photo.read()
-        file_name = id_photo.name
-        
         # Prepare contact method display (locked to SMS for now)
         contact_method_map = {
             'sms': 'SMS (Mobile Message)',
@@ -601,17 +596,15 @@ def forgot_password(request):
         
         client_success_message = "Password reset request submitted successfully! Expect a confirmation text message once we verify your ID."
 
-        # Convert ID photo to base64 (same as lab results)
-        file_url = None
+        # Store the ID photo once; every admin's notification references the same attachment
+        admin_users = list(admin_users)
+        attachment = None
         try:
-            import base64
-            file_base64 = base64.b64encode(file_content).decode('utf-8')
-            # Create data URL with correct content type
-            file_url = f"data:{id_photo.content_type};base64,{file_base64}"
-            logger.info(f"Encoded ID photo to base64 for {id_photo.content_type}")
+            attachment = acquire_attachment(id_photo, references=len(admin_users))
+            logger.info(f"Stored ID photo {attachment.key[:12]} for {len(admin_users)} admin(s)")
         except Exception as upload_err:
-            logger.error(f"Error encoding ID photo: {str(upload_err)}")
-            # Continue with notification creation even if encoding fails
+            logger.error(f"Error storing ID photo: {str(upload_err)}")
+            # Continue with notification creation even if storing fails
         
         # Create notification for each admin
         notification_count = 0
@@ -623,7 +616,9 @@ def forgot_password(request):
                     message=notification_message,
                     notification_type='password_reset',
                     priority='high',
-                    file=file_url,  # Store data URL with base64
+                    file_key=attachment.key if attachment else None,
+                    file_size=attachment.size if attachment else None,
+                    file_type=attachment.content_type if attachment else None,
                     related_id=user.user_id  # Store the requesting user's ID
                 )
                 notification_count += 1
@@ -631,6 +626,10 @@ def forgot_password(request):
             except Exception as e:
                 logger.error(f"Error creating notification for admin {admin_user.user_id}: {str(e)}")
                 continue
+
+        # Give back the references of notifications that could not be created
+        if attachment and notification_count < len(admin_users):
+            release_attachments([attachment.key] * (len(admin_users) - notification_count))
         
         logger.info(f"Successfully created {notification_count} notification(s) for password reset request from user {user.user_id}")
         
@@ -22,15 +22,20 @@ def consultations(request):
     
     try:
         # Get all doctors with their user profiles and appointment counts
-        doctors = Doctor.objects.select_related(
+        doctors = list(Doctor.objects.select_related(
             'user',
             'user__userprofile'
-        ).all().annotate(
+        ).defer(
+            'user__userprofile__photo_url'
+        ).annotate(
             first_name=F('user__userprofile__first_name'),
             last_name=F('user__userprofile__last_name'),
-            photo_url=F('user__userprofile__photo_url'),
             appointment_count=Count('doctor_consultations')
-        )
+        ))
+        # Doctor cards link the resized photo instead of embedding the upload
+        for doctor in doctors:
+            profile = getattr(doctor.user, 'userprofile', None)
+            doctor.photo_url = profile.photo_thumbnail_url(512) if profile else None
         
         if is_logged_in:
             # User is logged in - show full functionality
@@ -5,7 +5,7 @@ from .views import (
     restart_live_consultation, update_consultation_data, complete_consultation, 
     create_prescription, sign_prescription, generate_prescription_pdf, upload_prescription_file,
     get_all_prescriptions, prescription_details, download_prescription
-    , mark_notification_read
+    , mark_notification_read, doctor_signature_image
 )
 
 urlpatterns = [
@@ -28,6 +28,7 @@ urlpatterns = [
     path('api/get-all-prescriptions/', get_all_prescriptions, name='get_all_prescriptions'),
     path('doctors/prescription-details/<int:prescription_id>/', prescription_details, name='prescription_details'),
     path('doctors/download-prescription/<int:prescription_id>/', download_prescription, name='download_prescription'),
+    path('doctors/signature/<int:signature_id>/', doctor_signature_image, name='doctor_signature_image'),
     path('doctors/api/mark-notification-read/', mark_notification_read, name='doctor_mark_notification_read'),
 ]
 
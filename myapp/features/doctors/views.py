@@ -2,16 +2,21 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
 import base64
+import binascii
 import json
 import os
 import uuid
 from supabase import create_client, Client
 
-from ...models import User, UserProfile, Doctor, Appointment, LabResult, LiveAppointment, Prescription
+from ...models import User, UserProfile, Doctor, DoctorSignature, Appointment, LabResult, LiveAppointment, Prescription
+from ...utils.blob_store import BlobTooLarge, get_blob_store
+from ...utils.downloads import EXTENSION_MAP, not_modified, open_data_url, stream_file
+from ...utils.thumbnails import save_profile_photo
 
 # Initialize Supabase client with service_role key for backend operations
 supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
@@ -49,6 +54,7 @@ def doctor_panel(request):
                 'doctor__user',
                 'patient__userprofile'
             )
+            .defer('patient__userprofile__photo_url')
             .filter(doctor=doctor)
             .order_by('-consultation_date', '-consultation_time')
         )
@@ -69,14 +75,11 @@ def doctor_panel(request):
             pid = getattr(appt.patient, 'user_id', None)
             if pid and pid not in seen_patient_ids:
                 seen_patient_ids.add(pid)
-                try:
-                    p_profile = UserProfile.objects.get(user=appt.patient)
-                except UserProfile.DoesNotExist:
-                    p_profile = None
+                p_profile = getattr(appt.patient, 'userprofile', None)
                 patients_compiled.append({
                     'user': appt.patient,
                     'profile': p_profile,
-                    'photo_url': getattr(p_profile, 'photo_url', None) if p_profile else None,
+                    'photo_url': p_profile.photo_thumbnail_url(160) if p_profile else None,
                 })
         patients = patients_compiled
 
@@ -84,6 +87,7 @@ def doctor_panel(request):
     latest_lab_results = (
         LabResult.objects
         .select_related('user', 'user__userprofile', 'uploaded_by')
+        .defer('user__userprofile__photo_url')
         .order_by('-upload_date')[:20]  # Get latest 20 lab results
     )
 
@@ -98,6 +102,7 @@ def doctor_panel(request):
                 'live_appointment__appointment__patient',
                 'live_appointment__appointment__patient__userprofile'
             )
+            .defer('live_appointment__appointment__patient__userprofile__photo_url')
             .filter(live_appointment__appointment__doctor=doctor)
             .order_by('-created_at')[:50]  # Get latest 50 prescriptions
         )
@@ -112,6 +117,7 @@ def doctor_panel(request):
         'latest_lab_results': latest_lab_results,
         'prescriptions': doctor_prescriptions,
         'today_appointments': today_appointments,
+        'today': timezone.now().date(),
         'notifications': Notification.objects.filter(user=user).order_by('-created_at')[:20],
         'notif_unread_count': Notification.objects.filter(user=user, is_read=False).count(),
     }
@@ -154,7 +160,7 @@ def update_doctor_profile(request):
     try:
         profile, _ = UserProfile.objects.get_or_create(user=user)
 
-        # Handle profile photo upload - store as base64 in database
+        # Handle profile photo upload - store photo and thumbnails in the blob store
         if 'profile_photo' in request.FILES:
             uploaded = request.FILES['profile_photo']
             allowed_types = ['image/jpeg', 'image/png', 'image/gif']
@@ -162,14 +168,7 @@ def update_doctor_profile(request):
                 return JsonResponse({"success": False, "message": "Invalid file type"}, status=400)
             
             try:
-                file_content = uploaded.read()
-                
-                # Encode to base64
-                file_base64 = base64.b64encode(file_content).decode('utf-8')
-                
-                # Create data URL
-                photo_url = f"data:{uploaded.content_type};base64,{file_base64}"
-                profile.photo_url = photo_url
+                save_profile_photo(profile, uploaded.read(), uploaded.content_type)
             except Exception as upload_err:
                 return JsonResponse({"success": False, "message": f"Photo upload failed: {str(upload_err)}"}, status=400)
 
@@ -317,15 +316,21 @@ def download_lab_result(request, result_id):
     try:
         # Get the lab result
         lab_result = LabResult.objects.get(lab_result_id=result_id)
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, lab_result.file_key)
+        if cached:
+            return cached
         
-        # Decode the base64 file content
-        file_content = base64.b64decode(lab_result.result_file)
-        
-        # Create HTTP response with file
-        response = HttpResponse(file_content, content_type=lab_result.file_type)
-        response['Content-Disposition'] = f'attachment; filename="{lab_result.file_name}"'
-        
-        return response
+        # Stream the file from the blob store (or the legacy base64 column)
+        return stream_file(
+            request,
+            lab_result.open_result_file(),
+            lab_result.file_type or 'application/octet-stream',
+            lab_result.file_name,
+            size=lab_result.file_size,
+            blob_key=lab_result.file_key,
+        )
         
     except LabResult.DoesNotExist:
         return JsonResponse({"error": "Lab result not found"}, status=404)
@@ -697,7 +702,19 @@ def sign_prescription(request, prescription_id):
         except (json.JSONDecodeError, AttributeError):
             data = request.POST
         
-        prescription.doctor_signature = data.get('signature')
+        # Reuse the doctor's stored signature asset; a changed image becomes a new version
+        try:
+            mime_type, fh = open_data_url(data.get('signature') or '')
+            with fh:
+                signature_content = fh.read()
+        except (ValueError, binascii.Error):
+            return JsonResponse({'error': 'Invalid signature image'}, status=400)
+        doctor = Doctor.objects.get(user=user)
+        signature = DoctorSignature.objects.record(doctor, signature_content, mime_type)
+
+        prescription.signature = signature
+        prescription.doctor_signature = None
+        prescription.signature_key = None
         prescription.signature_date = timezone.now()
         prescription.status = 'signed'
         prescription.save()
@@ -771,25 +788,28 @@ def upload_prescription_file(request, prescription_id):
         if file.size > max_size:
             return JsonResponse({'error': 'File size exceeds 10MB limit'}, status=400)
 
-        # Convert to base64 (same as lab results)
+        # Stream the file into the blob store chunk by chunk (same as lab results)
         try:
-            import base64
-            file_content = file.read()
-            file_base64 = base64.b64encode(file_content).decode('utf-8')
-            
-            # Create data URL
-            file_url = f"data:{file.content_type};base64,{file_base64}"
-            prescription.prescription_file = file_url
-            prescription.save()
+            file_key, file_size = get_blob_store().save_stream(file.chunks(), file.content_type, max_size=max_size)
+            prescription.file_key = file_key
+            prescription.file_size = file_size
+            prescription.file_type = file.content_type
+            prescription.file_name = file.name
+            prescription.prescription_file = None
+            prescription.save(update_fields=[
+                'file_key', 'file_size', 'file_type', 'file_name', 'prescription_file', 'updated_at',
+            ])
 
             return JsonResponse({
                 'success': True,
                 'message': 'Prescription file uploaded successfully',
                 'file_name': file.name,
-                'file_url': file_url
+                'file_url': reverse('download_prescription', args=[prescription.prescription_id])
             })
+        except BlobTooLarge:
+            return JsonResponse({'error': 'File size exceeds 10MB limit'}, status=400)
         except Exception as upload_err:
-            return JsonResponse({'error': f'Failed to encode file: {str(upload_err)}'}, status=500)
+            return JsonResponse({'error': f'Failed to store file: {str(upload_err)}'}, status=500)
         
     except Prescription.DoesNotExist:
         return JsonResponse({'error': 'Prescription not found'}, status=404)
@@ -823,7 +843,10 @@ def get_all_prescriptions(request):
             'live_appointment__appointment__doctor',
             'live_appointment__appointment__doctor__user',
             'live_appointment__appointment__doctor__user__userprofile'
-        ).all().order_by('-created_at')
+        ).defer(
+            'live_appointment__appointment__patient__userprofile__photo_url',
+            'live_appointment__appointment__doctor__user__userprofile__photo_url'
+        ).with_blob_flags().order_by('-created_at')
 
         prescriptions_data = []
         for rx in prescriptions:
@@ -862,7 +885,7 @@ def get_all_prescriptions(request):
                     'doctor_name': doctor_name,
                     'created_at': rx.created_at.isoformat() if rx.created_at else None,
                     'status': rx.status,
-                    'has_file': bool(rx.prescription_file),
+                    'has_file': rx.has_prescription_file,
                     'medicines_summary': medicines_summary[:100],  # Limit to 100 chars
                 })
             except Exception as e:
@@ -900,7 +923,10 @@ def prescription_details(request, prescription_id):
             'live_appointment__appointment__doctor',
             'live_appointment__appointment__doctor__user',
             'live_appointment__appointment__doctor__user__userprofile'
-        ).get(
+        ).defer(
+            'live_appointment__appointment__patient__userprofile__photo_url',
+            'live_appointment__appointment__doctor__user__userprofile__photo_url'
+        ).with_blob_flags().get(
             prescription_id=prescription_id,
             live_appointment__appointment__doctor=doctor
         )
@@ -931,7 +957,7 @@ def prescription_details(request, prescription_id):
                 'patient_name': patient_name,
                 'doctor_name': doctor_name,
                 'status': prescription.status,
-                'has_file': bool(prescription.prescription_file),
+                'has_file': prescription.has_prescription_file,
                 'medicines': prescription.medicines if prescription.medicines else [],
                 'created_at': prescription.created_at.isoformat() if prescription.created_at else None,
                 'instructions': prescription.instructions or '',
@@ -946,6 +972,46 @@ def prescription_details(request, prescription_id):
         return JsonResponse({'error': f'Error fetching details: {str(e)}'}, status=500)
 
 
+def _can_view_signature(request, signature):
+    """The signing doctor, admins, and patients holding a prescription signed with it."""
+    if request.session.get("is_admin"):
+        return True
+    user_id = request.session.get("user_id") or request.session.get("user")
+    viewer = request.user if request.user.is_authenticated else User.objects.filter(user_id=user_id).first()
+    if viewer is None:
+        return False
+    if viewer.role == 'admin' or signature.doctor.user_id == viewer.user_id:
+        return True
+    return Prescription.objects.filter(
+        signature=signature, live_appointment__appointment__patient=viewer,
+    ).exists()
+
+
+def doctor_signature_image(request, signature_id):
+    """Serve a version of a doctor's signature for printed prescriptions.
+
+    Versions never change, so versioned URLs are cached as immutable.
+    """
+    signature = DoctorSignature.objects.select_related('doctor').filter(signature_id=signature_id).first()
+    # Not found rather than forbidden, so signature ids cannot be probed
+    if signature is None or not _can_view_signature(request, signature):
+        return JsonResponse({'error': 'Signature not found'}, status=404)
+
+    cached = not_modified(request, signature.key)
+    if cached:
+        return cached
+
+    return stream_file(
+        request,
+        get_blob_store().open(signature.key),
+        signature.content_type,
+        f"signature_{signature_id}",
+        as_attachment=False,
+        size=signature.size,
+        blob_key=signature.key,
+    )
+
+
 @login_required(login_url='homepage2')
 def download_prescription(request, prescription_id):
     """Download prescription file"""
@@ -959,38 +1025,29 @@ def download_prescription(request, prescription_id):
             prescription_id=prescription_id,
             live_appointment__appointment__doctor=doctor
         )
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, prescription.file_key)
+        if cached:
+            return cached
         
-        if not prescription.prescription_file:
+        if not prescription.has_file:
             return JsonResponse({'error': 'Prescription file not found'}, status=404)
         
-        # prescription.prescription_file contains base64 data URL (data:application/pdf;base64,...)
-        # Extract the base64 part and decode it
+        # Blob store file, or a legacy base64 data URL decoded lazily while streaming
         try:
-            if prescription.prescription_file.startswith('data:'):
-                # Parse data URL: data:mime/type;base64,base64data
-                header, base64_data = prescription.prescription_file.split(',', 1)
-                mime_type = header.split(':')[1].split(';')[0]
-                
-                # Decode base64
-                file_content = base64.b64decode(base64_data)
-                
-                # Determine file extension from mime type
-                extension_map = {
-                    'application/pdf': '.pdf',
-                    'image/jpeg': '.jpg',
-                    'image/png': '.png',
-                    'image/gif': '.gif'
-                }
-                file_ext = extension_map.get(mime_type, '.pdf')
-                
-                # Create response
-                response = HttpResponse(file_content, content_type=mime_type)
-                response['Content-Disposition'] = f'attachment; filename="prescription_{prescription.prescription_number}{file_ext}"'
-                return response
-            else:
-                return JsonResponse({'error': 'Invalid file format in database'}, status=500)
-        except Exception as decode_err:
-            return JsonResponse({'error': f'Error decoding file: {str(decode_err)}'}, status=500)
+            mime_type, fh = prescription.open_prescription_file()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid file format in database'}, status=500)
+        
+        file_ext = EXTENSION_MAP.get(mime_type, '.pdf')
+        return stream_file(
+            request,
+            fh,
+            mime_type,
+            f"prescription_{prescription.prescription_number}{file_ext}",
+            blob_key=prescription.file_key,
+        )
         
     except Prescription.DoesNotExist:
         return JsonResponse({'error': 'Prescription not found'}, status=404)
@@ -12,6 +12,8 @@ import json
 import mimetypes
 import logging
 
+from ...utils.downloads import EXTENSION_MAP, not_modified, stream_file, versioned_url
+
 logger = logging.getLogger(__name__)
 
 @csrf_protect
@@ -281,15 +283,21 @@ def download_lab_result(request, result_id):
         from ...models import User, LabResult
         user = User.objects.get(user_id=user_id)
         lab_result = LabResult.objects.get(lab_result_id=result_id, user=user)
-        
-        # Decode the base64 file content
-        file_content = base64.b64decode(lab_result.result_file)
-        
-        # Create HTTP response with file
-        response = HttpResponse(file_content, content_type=lab_result.file_type)
-        response['Content-Disposition'] = f'attachment; filename="{lab_result.file_name}"'
-        
-        return response
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, lab_result.file_key)
+        if cached:
+            return cached
+        
+        # Stream the file from the blob store (or the legacy base64 column)
+        return stream_file(
+            request,
+            lab_result.open_result_file(),
+            lab_result.file_type or 'application/octet-stream',
+            lab_result.file_name,
+            size=lab_result.file_size,
+            blob_key=lab_result.file_key,
+        )
         
     except LabResult.DoesNotExist:
         messages.error(request, "Lab result not found or access denied")
@@ -338,7 +346,7 @@ def vitals(request):
     try:
         from ...models import User, UserProfile, Appointment, Doctor
         user = User.objects.get(user_id=user_id)
-        user_profile = UserProfile.objects.get(user=user)
+        user_profile = UserProfile.objects.with_blobs().get(user=user)
         
         # Get distinct doctors the user has had appointments with
         user_doctors = Doctor.objects.filter(
@@ -617,7 +625,10 @@ def prescriptions(request):
             live_appointment__appointment__patient=user
         ).select_related(
             'live_appointment',
-            'live_appointment__appointment'
+            'live_appointment__appointment',
+            'live_appointment__appointment__doctor__user__userprofile'
+        ).defer(
+            'live_appointment__appointment__doctor__user__userprofile__photo_url'
         ).order_by('-created_at')
         
         # Get consultation_id from query parameter for highlighting
@@ -662,7 +673,7 @@ def prescription_print(request, prescription_id):
     try:
         from ...models import User, Prescription, LiveAppointment, Appointment
         user = User.objects.get(user_id=user_id)
-        prescription = Prescription.objects.get(
+        prescription = Prescription.objects.select_related('signature').get(
             prescription_id=prescription_id,
             live_appointment__appointment__patient=user
         )
@@ -673,6 +684,7 @@ def prescription_print(request, prescription_id):
         patient_profile = getattr(patient, 'userprofile', None)
         patient_dob = patient_profile.birth_date if (patient_profile and getattr(patient_profile, 'birth_date', None)) else 'N/A'
         patient_contact = patient_profile.contact_number if (patient_profile and getattr(patient_profile, 'contact_number', None)) else 'N/A'
+        signature_url = prescription.signature_src()
 
         html_content = f"""
         <div class="prescription-header">
@@ -717,7 +729,7 @@ def prescription_print(request, prescription_id):
         
         <div class="signature">
             <p>Doctor's Signature:</p>
-            {(f'<div class="doctor-signature"><img src="data:image/png;base64,{prescription.doctor_signature}" alt="Doctor Signature" style="max-width:300px;max-height:120px;"/></div>') if getattr(prescription, 'doctor_signature', None) else '<p>_________________________</p>'}
+            {(f'<div class="doctor-signature"><img src="{signature_url}" alt="Doctor Signature" style="max-width:300px;max-height:120px;"/></div>') if signature_url else '<p>_________________________</p>'}
             <div class="date">
                 Date: {prescription.signature_date.strftime('%B %d, %Y') if getattr(prescription, 'signature_date', None) else prescription.created_at.strftime('%B %d, %Y')}
             </div>
@@ -906,7 +918,7 @@ def prescription_details(request, prescription_id):
     try:
         from ...models import User, Prescription, LiveAppointment, Appointment
         user = User.objects.get(user_id=user_id)
-        prescription = Prescription.objects.get(
+        prescription = Prescription.objects.select_related('signature').get(
             prescription_id=prescription_id,
             live_appointment__appointment__patient=user
         )
@@ -921,8 +933,12 @@ def prescription_details(request, prescription_id):
         doctor_name = doctor.user.get_full_name() if doctor else 'Unknown Doctor'
 
         preview_url = None
-        if prescription.prescription_file:
-            preview_url = f"{reverse('prescription_download', args=[prescription_id])}?mode=preview"
+        if prescription.has_file:
+            preview_url = versioned_url(
+                f"{reverse('prescription_download', args=[prescription_id])}?mode=preview",
+                prescription.file_key,
+            )
+        signature_url = prescription.signature_src()
 
         medicine_html = ''.join([
             f"""
@@ -996,7 +1012,7 @@ def prescription_details(request, prescription_id):
                 </div>
                 <div class="signature">
                     <p class="label">Doctor's Signature</p>
-                    {(f'<div class="doctor-signature"><img src="data:image/png;base64,{prescription.doctor_signature}" alt="Doctor Signature" /></div>') if getattr(prescription, 'doctor_signature', None) else '<div class="doctor-signature blank">_________________________</div>'}
+                    {(f'<div class="doctor-signature"><img src="{signature_url}" alt="Doctor Signature" /></div>') if signature_url else '<div class="doctor-signature blank">_________________________</div>'}
                     <div class="date">
                         Signed on: {prescription.signature_date.strftime('%B %d, %Y') if getattr(prescription, 'signature_date', None) else prescription.created_at.strftime('%B %d, %Y')}
                     </div>
@@ -1033,44 +1049,34 @@ def prescription_download(request, prescription_id):
             prescription_id=prescription_id,
             live_appointment__appointment__patient=user
         )
+
+        # Repeat views revalidate against the content hash without reading the blob
+        cached = not_modified(request, prescription.file_key)
+        if cached:
+            return cached
         
         # Check if prescription has a file
-        if not prescription.prescription_file:
+        if not prescription.has_file:
             return JsonResponse({
                 'error': 'No file attached to this prescription. Please ask your doctor to upload a prescription file.'
             }, status=404)
         
-        # prescription.prescription_file contains base64 data URL (data:application/pdf;base64,...)
-        # Extract the base64 part and decode it
+        # Blob store file, or a legacy base64 data URL decoded lazily while streaming
         try:
-            if prescription.prescription_file.startswith('data:'):
-                # Parse data URL: data:mime/type;base64,base64data
-                header, base64_data = prescription.prescription_file.split(',', 1)
-                mime_type = header.split(':')[1].split(';')[0]
-                
-                # Decode base64
-                file_content = base64.b64decode(base64_data)
-                
-                # Determine file extension from mime type
-                extension_map = {
-                    'application/pdf': '.pdf',
-                    'image/jpeg': '.jpg',
-                    'image/png': '.png',
-                    'image/gif': '.gif'
-                }
-                file_ext = extension_map.get(mime_type, '.pdf')
-                
-                # Create response
-                mode = request.GET.get('mode', 'download')
-                disposition = 'inline' if mode == 'preview' else 'attachment'
-                
-                response = HttpResponse(file_content, content_type=mime_type)
-                response['Content-Disposition'] = f'{disposition}; filename="{smart_str(prescription.prescription_number)}{file_ext}"'
-                return response
-            else:
-                return JsonResponse({'error': 'Invalid file format'}, status=400)
-        except Exception as decode_error:
-            return JsonResponse({'error': f'Error decoding file: {str(decode_error)}'}, status=500)
+            mime_type, fh = prescription.open_prescription_file()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid file format'}, status=400)
+        
+        file_ext = EXTENSION_MAP.get(mime_type, '.pdf')
+        mode = request.GET.get('mode', 'download')
+        return stream_file(
+            request,
+            fh,
+            mime_type,
+            f"{smart_str(prescription.prescription_number)}{file_ext}",
+            as_attachment=(mode != 'preview'),
+            blob_key=prescription.file_key,
+        )
         
     except Prescription.DoesNotExist:
         return JsonResponse({'error': 'Prescription not found'}, status=404)
@@ -1164,15 +1170,18 @@ def get_password_reset_notifications(request):
             user=user,
             notification_type='password_reset',
             is_read=False
-        ).order_by('-created_at')
+        ).with_blob_flags().order_by('-created_at')
         
         notif_list = []
         for n in password_reset_notifs:
             file_url = None
             file_name = None
-            if n.file:
-                file_url = n.file.url
-                file_name = n.file.name.split('/')[-1]  # Get just the filename
+            if n.has_file:
+                file_url = versioned_url(
+                    f"{reverse('download_password_reset_file', args=[n.notification_id])}?mode=preview",
+                    n.file_key,
+                )
+                file_name = f"id_photo_{n.notification_id}"
             
             notif_list.append({
                 'notification_id': n.notification_id,
@@ -8,4 +8,5 @@ urlpatterns = [
     path('api/update-profile/', views.update_profile, name='update_profile'),
     path('api/update-profile-photo-legacy/', views.update_profile_photo_legacy, name='update_profile_photo_legacy'),
     path('api/send-message-to-admin/', views.send_message_to_admin, name='send_message_to_admin'),
+    path('profile-photo/<int:profile_id>/<int:size>/', views.profile_photo_thumbnail, name='profile_photo_thumbnail'),
 ]
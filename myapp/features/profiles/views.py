@@ -16,6 +16,7 @@ from ...models import (
     User,
     UserProfile,
     Patient,
+    Doctor,
     Appointment,
     Prescription,
     Notification,
@@ -23,6 +24,14 @@ from ...models import (
 )
 from datetime import date
 
+from ...utils.blob_store import get_blob_store
+from ...utils.downloads import not_modified, stream_file
+from ...utils.thumbnails import (
+    THUMBNAIL_SIZES,
+    save_profile_photo,
+    thumbnail_mime_type,
+)
+
 # Initialize Supabase client with service_role key for backend operations
 supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
 
@@ -34,7 +43,7 @@ def userprofile(request):
     
     try:
         user = User.objects.get(user_id=user_id)
-        user_profile = UserProfile.objects.get(user=user)
+        user_profile = UserProfile.objects.with_blobs().get(user=user)
         patient_record = Patient.objects.filter(user=user).first()
 
         appointments_qs = Appointment.objects.filter(patient=user).select_related('doctor__user').order_by('-consultation_date', '-consultation_time')
@@ -128,21 +137,12 @@ def update_profile_photo(request):
         if uploaded.content_type not in allowed_types:
             return JsonResponse({'success': False, 'error': 'Invalid file type. Please upload a JPEG, PNG, or GIF image.'}, status=400)
 
-        # Store photo as base64 in database (same as prescriptions and lab results)
+        # Store the photo and its thumbnails in the blob store
         try:
-            import base64
-            
-            # Read file content
-            file_content = uploaded.read()
-            
-            # Encode to base64
-            file_base64 = base64.b64encode(file_content).decode('utf-8')
-            
-            # Create data URL
-            photo_url = f"data:{uploaded.content_type};base64,{file_base64}"
-            
-            # Update profile URL
-            user_profile.photo_url = photo_url
+            try:
+                photo_url = save_profile_photo(user_profile, uploaded.read(), uploaded.content_type)
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'The uploaded file is not a valid image.'}, status=400)
             user_profile.save()
 
             # Create notification
@@ -234,7 +234,7 @@ def update_profile(request):
         user = get_object_or_404(User, user_id=user_id)
         user_profile = get_object_or_404(UserProfile, user=user)
         
-        # Handle profile photo upload - store as base64 in database
+        # Handle profile photo upload - store photo and thumbnails in the blob store
         if 'photo' in request.FILES:
             uploaded = request.FILES.get('photo')
             if uploaded:
@@ -242,14 +242,7 @@ def update_profile(request):
                 allowed_types = ['image/jpeg', 'image/png', 'image/gif']
                 if uploaded.content_type in allowed_types:
                     try:
-                        file_content = uploaded.read()
-                        
-                        # Encode to base64
-                        file_base64 = base64.b64encode(file_content).decode('utf-8')
-                        
-                        # Create data URL
-                        photo_url = f"data:{uploaded.content_type};base64,{file_base64}"
-                        user_profile.photo_url = photo_url
+                        save_profile_photo(user_profile, uploaded.read(), uploaded.content_type)
                     except Exception as upload_err:
                         return JsonResponse({"success": False, "message": f"Photo upload failed: {str(upload_err)}"}, status=400)
         
@@ -442,3 +435,53 @@ def send_message_to_admin(request):
         error_details = traceback.format_exc()
         print(f"Error sending message to admin: {error_details}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+def _can_view_photo(request, profile):
+    """Owners, admins, anyone signed in for a doctor's photo, and doctors for their own patients."""
+    if request.session.get("is_admin"):
+        return True
+    user_id = request.session.get("user_id") or request.session.get("user")
+    viewer = request.user if request.user.is_authenticated else User.objects.filter(user_id=user_id).first()
+    if viewer is None:
+        return False
+    if viewer.user_id == profile.user_id or viewer.role == 'admin':
+        return True
+    if Doctor.objects.filter(user_id=profile.user_id).exists():
+        # Patients pick doctors by photo when booking
+        return True
+    return viewer.role == 'doctor' and Appointment.objects.filter(
+        doctor__user=viewer, patient_id=profile.user_id,
+    ).exists()
+
+
+@require_http_methods(["GET"])
+def profile_photo_thumbnail(request, profile_id, size):
+    """Serve a resized profile photo.
+
+    Versioned URLs (``?v=<key>``) are content-addressed and cached for a year.
+    Thumbnails are built on upload and by ``migrate_blobs``; profiles without
+    them are not found here.
+    """
+    if size not in THUMBNAIL_SIZES:
+        return JsonResponse({'error': 'Unsupported size'}, status=404)
+
+    profile = UserProfile.objects.filter(profile_id=profile_id).first()
+    # Hidden and missing photos look the same, so IDs cannot be probed
+    if profile is None or not _can_view_photo(request, profile):
+        return JsonResponse({'error': 'Profile not found'}, status=404)
+
+    key = profile.photo_variants.get(str(size))
+    if not key:
+        return JsonResponse({'error': 'No photo'}, status=404)
+
+    cached = not_modified(request, key)
+    if cached:
+        return cached
+
+    fh = get_blob_store().open(key)
+    content_type = thumbnail_mime_type(fh.read(12))
+    fh.seek(0)
+    return stream_file(
+        request, fh, content_type, f"profile_{profile_id}_{size}", as_attachment=False, blob_key=key,
+    )
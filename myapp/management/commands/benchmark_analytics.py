@@ -0,0 +1,132 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from myapp.models import Appointment, BookedService, LabResult, LiveAppointment, Prescription, User
+from myapp.utils import analytics_cache
+
+# name -> (url name, query string)
+ENDPOINTS = {
+    'analytics': ('mod_analytics', {'timeframe': 'month'}),
+    'analytics_api': ('analytics_api', {'timeframe': 'month'}),
+    'analytics_api_by_specialization': ('analytics_api', {'timeframe': 'month', 'doctor_sort': 'specialization'}),
+    'dynamic_statistics_monthly': ('get_dynamic_statistics', {'period_type': 'monthly'}),
+    'dynamic_statistics_daily': ('get_dynamic_statistics', {'period_type': 'daily'}),
+}
+
+COUNTED_MODELS = (User, Appointment, LiveAppointment, Prescription, LabResult, BookedService)
+
+
+def _invalidate_analytics():
+    """Make the next request rebuild its analytics payload.
+
+    Bumps the source model versions the payload keys are built from instead
+    of clearing the cache, which is shared with sessions and other workers.
+    """
+    for model_name in analytics_cache.SOURCE_MODELS:
+        analytics_cache.bump(model_name)
+
+
+def _measure(client, url, params):
+    """``(seconds, queries, peak bytes, status)`` for one GET."""
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, len(queries), peak, response.status_code
+
+
+class Command(BaseCommand):
+    help = 'Time the analytics endpoints through the test client and report wall time, queries and peak memory as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            choices=sorted(ENDPOINTS),
+            help='Endpoint to benchmark; repeat for several (default: all)',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per endpoint and mode (default: 3)')
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Also measure warm runs served from the analytics cache',
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        now = timezone.localtime()
+        query = {'year': now.year, 'month': now.month, 'day': now.day}
+
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            client = Client()
+            session = client.session
+            session['is_admin'] = True
+            session.save()
+
+            results = {}
+            try:
+                for name in options['endpoint'] or ENDPOINTS:
+                    url_name, params = ENDPOINTS[name]
+                    params = dict(params, **query) if url_name == 'get_dynamic_statistics' else params
+                    url = reverse(url_name)
+                    modes = {'cold': []}
+                    for _ in range(options['repeat']):
+                        _invalidate_analytics()  # analytics payloads are cached; a cold run rebuilds them
+                        modes['cold'].append(_measure(client, url, params))
+                    if options['warm']:
+                        modes['warm'] = [_measure(client, url, params) for _ in range(options['repeat'])]
+                    results[name] = {mode: self.summarise(runs) for mode, runs in modes.items()}
+                    self.stderr.write(f"{name}: {results[name]['cold']['median_ms']} ms, {results[name]['cold']['queries']} queries")
+            finally:
+                # The admin session is real; do not leave it behind in the session store
+                client.logout()
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+            },
+            'rows': {model.__name__: model._base_manager.count() for model in COUNTED_MODELS},
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def summarise(runs):
+        seconds = [run[0] for run in runs]
+        return {
+            'status': runs[-1][3],
+            'median_ms': round(statistics.median(seconds) * 1000, 1),
+            'min_ms': round(min(seconds) * 1000, 1),
+            'max_ms': round(max(seconds) * 1000, 1),
+            'queries': runs[-1][1],
+            'peak_memory_kb': round(max(run[2] for run in runs) / 1024, 1),
+        }
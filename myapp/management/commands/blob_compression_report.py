@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from myapp.models import Attachment, DoctorSignature, LabResult, Notification, Prescription, UserProfile
+from myapp.utils.blob_store import BlobNotFound, get_blob_store
+
+
+def _keys(queryset, field):
+    return queryset.filter(**{f'{field}__isnull': False}).values_list(field, flat=True).distinct().iterator()
+
+
+def _profile_photo_keys():
+    for variants in UserProfile.objects.exclude(photo_variants={}).values_list('photo_variants', flat=True).iterator():
+        yield from (variants or {}).values()
+
+
+# name -> (blob keys, model and column still holding base64 in the database)
+TABLES = {
+    'lab_results': (lambda: _keys(LabResult.objects.all(), 'file_key'), LabResult, 'result_file'),
+    'prescriptions.file': (lambda: _keys(Prescription.objects.all(), 'file_key'), Prescription, 'prescription_file'),
+    'prescriptions.signature': (lambda: _keys(Prescription.objects.all(), 'signature_key'), Prescription, 'doctor_signature'),
+    'doctor_signatures': (lambda: _keys(DoctorSignature.objects.all(), 'key'), None, None),
+    'notifications': (lambda: _keys(Attachment.objects.all(), 'key'), Notification, 'file'),
+    'user_profiles': (_profile_photo_keys, UserProfile, 'photo_url'),
+}
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.2f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Report how well stored files compress, per table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            action='append',
+            choices=list(TABLES),
+            help='Only report this table (can be given more than once)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Inspect at most this many blobs per table (the Supabase backend downloads each one)',
+        )
+
+    def handle(self, *args, **options):
+        store = get_blob_store()
+        limit = options['limit']
+        total_original = total_stored = total_in_db = 0
+
+        for name in options['table'] or TABLES:
+            keys, model, column = TABLES[name]
+            blobs = compressed = original = stored = missing = 0
+            codecs = set()
+            for key in keys():
+                if limit is not None and blobs >= limit:
+                    break
+                try:
+                    codec, original_size, stored_size = store.stat(key)
+                except BlobNotFound:
+                    missing += 1
+                    continue
+                blobs += 1
+                original += original_size
+                stored += stored_size
+                if codec:
+                    compressed += 1
+                    codecs.add(codec)
+
+            # Base64 still kept in the table itself (run migrate_blobs to move it out)
+            in_db = model._base_manager.aggregate(total=Sum(Length(column)))['total'] or 0 if model else 0
+
+            ratio = f'{original / stored:.2f}x' if stored else 'n/a'
+            self.stdout.write(
+                f'{name}: {blobs} blobs ({compressed} compressed{", " + "/".join(sorted(codecs)) if codecs else ""}), '
+                f'{_mb(original)} -> {_mb(stored)} stored, ratio {ratio}; '
+                f'{_mb(in_db)} base64 still in the database'
+            )
+            if missing:
+                self.stdout.write(self.style.WARNING(f'{name}: {missing} referenced blob(s) missing from the store'))
+            total_original += original
+            total_stored += stored
+            total_in_db += in_db
+
+        ratio = f'{total_original / total_stored:.2f}x' if total_stored else 'n/a'
+        self.stdout.write(self.style.SUCCESS(
+            f'Total: {_mb(total_original)} -> {_mb(total_stored)} stored (ratio {ratio}), '
+            f'{_mb(total_in_db)} base64 in the database'
+        ))
@@ -2,7 +2,6 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from myapp.models import Notification
-import os
 
 
 class Command(BaseCommand):
@@ -45,25 +44,15 @@ class Command(BaseCommand):
                 self.stdout.write(f'  ... and {count - 5} more')
             return
         
-        # Delete associated files first
-        deleted_files = 0
-        for notification in old_notifications:
-            if notification.file:
-                try:
-                    file_path = notification.file.path
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        deleted_files += 1
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'Could not delete file for notification {notification.notification_id}: {e}'))
-        
-        # Delete notifications
+        # Attachments are shared between notifications; deleting releases their
+        # references and frees the files no remaining notification points at
+        released = old_notifications.filter(file_key__isnull=False).count()
         old_notifications.delete()
         
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully deleted {count} notification(s) older than {days} days. '
-                f'Removed {deleted_files} associated file(s).'
+                f'Released {released} attachment reference(s).'
             )
         )
 
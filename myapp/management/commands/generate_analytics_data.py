@@ -0,0 +1,270 @@
+import random
+from contextlib import contextmanager
+from datetime import time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.models import (
+    Appointment, BookedService, Doctor, LabResult, LiveAppointment, Patient, Prescription, User, UserProfile,
+)
+from myapp.utils import analytics_cache
+from myapp.utils.rollups import rebuild
+
+SPECIALIZATIONS = [
+    'General Medicine', 'Pediatrics', 'Cardiology', 'Dermatology', 'Obstetrics and Gynecology',
+    'Orthopedics', 'Neurology', 'Ophthalmology', 'ENT', 'Psychiatry',
+]
+SERVICES = [
+    'Complete Blood Count', 'Urinalysis', 'X-ray', 'Ultrasound', 'ECG', 'Lipid Profile',
+    'Fasting Blood Sugar', 'MRI', 'CT Scan', 'Vaccination', 'Dental Cleaning', 'Physical Therapy',
+]
+LAB_TYPES = ['Blood Test', 'Urinalysis', 'X-ray', 'Ultrasound', 'ECG', 'Lipid Profile', 'Stool Exam']
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Grace', 'Paolo', 'Andrea', 'Miguel', 'Kristine', 'Carlo', 'Bea']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos', 'Villanueva']
+BLOOD_TYPES = ['O+', 'O+', 'O+', 'A+', 'A+', 'B+', 'B+', 'AB+', 'O-', 'A-', 'B-', 'AB-']
+
+# (value, weight) pairs for the categorical columns
+APPOINTMENT_STATUSES = [('Completed', 60), ('Scheduled', 25), ('Cancelled', 15)]
+APPROVAL_STATUSES = [('Approved', 75), ('Pending', 18), ('Rejected', 7)]
+PRESCRIPTION_STATUSES = [('signed', 55), ('printed', 30), ('draft', 10), ('cancelled', 5)]
+BOOKING_STATUSES = [('Completed', 45), ('Confirmed', 25), ('Pending', 20), ('Cancelled', 10)]
+
+
+def _pick(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+@contextmanager
+def _backdated(*fields):
+    """Let ``bulk_create`` keep the given ``auto_now``/``auto_now_add`` timestamps."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field, _, _ in saved:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _timestamps(*models):
+    return [field for model in models for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate synthetic users, appointments, prescriptions, lab results and bookings for load testing analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=100000, help='Appointments to create (default: 100000)')
+        parser.add_argument('--patients', type=int, default=None, help='Patients to create (default: appointments / 10)')
+        parser.add_argument('--doctors', type=int, default=None, help='Doctors to create (default: patients / 50, at least 5)')
+        parser.add_argument('--months', type=int, default=12, help='Spread the rows over the last N months (default: 12)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create (default: 5000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, so runs are repeatable (default: 0)')
+        parser.add_argument(
+            '--prefix',
+            default='synth',
+            help='Username/number prefix marking generated rows (default: synth)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete rows generated earlier with the same prefix before generating',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.days = options['months'] * 30
+        self.now = timezone.now()
+        appointments = options['appointments']
+        patients = options['patients'] or max(appointments // 10, 1)
+        doctors = options['doctors'] or max(patients // 50, 5)
+        if min(appointments, patients, doctors, self.days, self.batch_size) < 1:
+            raise CommandError('--appointments, --patients, --doctors, --months and --batch-size must be positive')
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            if not options['clear']:
+                raise CommandError(f"Rows with prefix '{self.prefix}' already exist; pass --clear or another --prefix")
+            deleted, _ = User.objects.filter(username__startswith=f'{self.prefix}_').delete()
+            self.stdout.write(f'Deleted {deleted} previously generated row(s)')
+
+        self.password = make_password(None)  # unusable: generated accounts cannot sign in
+        timestamps = _timestamps(User, Patient, Appointment, LiveAppointment, Prescription, LabResult, BookedService)
+        with _backdated(*timestamps):
+            doctor_rows = self.create_doctors(doctors)
+            patient_ids = self.create_patients(patients)
+            self.create_appointments(appointments, patient_ids, doctor_rows)
+            self.create_lab_results(patients * 2, patient_ids)
+            self.create_bookings(patients * 3, patient_ids)
+
+        # bulk_create skips the signals that keep rollups and cached analytics current
+        start = (self.now - timedelta(days=self.days + 30)).date()
+        rebuild(start=start)
+        for name in analytics_cache.SOURCE_MODELS:
+            analytics_cache.bump(name)
+        self.stdout.write(self.style.SUCCESS('Synthetic analytics data generated.'))
+
+    # ---- helpers -------------------------------------------------------------
+
+    def moment(self):
+        """A timestamp within the window, weighted toward recent days (steady growth)."""
+        back = self.days * self.rng.random() ** 1.3
+        return self.now - timedelta(days=back, seconds=self.rng.randrange(86400))
+
+    def bulk(self, model, rows):
+        """``bulk_create`` ``rows`` in batches; returns the created objects."""
+        created = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                created += model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            created += model.objects.bulk_create(batch)
+        self.stdout.write(f'{model.__name__}: {len(created)} row(s)')
+        return created
+
+    def create_users(self, role, count):
+        offset = User.objects.filter(username__startswith=f'{self.prefix}_{role}_').count()
+        users = self.bulk(User, (
+            User(
+                username=f'{self.prefix}_{role}_{offset + i}',
+                email=f'{self.prefix}_{role}_{offset + i}@example.invalid',
+                password=self.password,
+                role=role,
+                date_joined=self.moment(),
+            )
+            for i in range(count)
+        ))
+        self.bulk(UserProfile, (
+            UserProfile(
+                user=user,
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                sex=self.rng.choice(['male', 'female']),
+                birthday=(self.now - timedelta(days=self.rng.randrange(18 * 365, 80 * 365))).date(),
+            )
+            for user in users
+        ))
+        return users
+
+    @transaction.atomic
+    def create_doctors(self, count):
+        users = self.create_users('doctor', count)
+        return self.bulk(Doctor, (
+            Doctor(
+                user=user,
+                specialization=self.rng.choice(SPECIALIZATIONS),
+                license_number=f'{self.prefix.upper()}-LIC-{user.pk}',
+                years_of_experience=self.rng.randrange(1, 35),
+                availability={},
+                contact_info='',
+            )
+            for user in users
+        ))
+
+    @transaction.atomic
+    def create_patients(self, count):
+        users = self.create_users('patient', count)
+        self.bulk(Patient, (
+            Patient(
+                user=user,
+                medical_record_number=f'{self.prefix.upper()}-MRN-{user.pk}',
+                gender=self.rng.choice(['M', 'F']),
+                blood_type=self.rng.choice(BLOOD_TYPES),
+                created_at=user.date_joined,
+                updated_at=user.date_joined,
+            )
+            for user in users
+        ))
+        return [user.pk for user in users]
+
+    def create_appointments(self, count, patient_ids, doctors):
+        made = 0
+        while made < count:
+            size = min(self.batch_size, count - made)
+            with transaction.atomic():
+                appointments = []
+                for i in range(made, made + size):
+                    created = self.moment()
+                    status = _pick(self.rng, APPOINTMENT_STATUSES)
+                    approval = 'Approved' if status == 'Completed' else _pick(self.rng, APPROVAL_STATUSES)
+                    appointments.append(Appointment(
+                        appointment_number=f'{self.prefix.upper()}-{i + 1:08d}',
+                        patient_id=self.rng.choice(patient_ids),
+                        doctor=self.rng.choice(doctors),
+                        consultation_type=self.rng.choice(['F2F', 'F2F', 'Tele']),
+                        consultation_date=(created + timedelta(days=self.rng.randrange(15))).date(),
+                        consultation_time=time(self.rng.randrange(8, 17), self.rng.choice([0, 30])),
+                        approval_status=approval,
+                        approved_at=created + timedelta(hours=self.rng.randrange(1, 48)) if approval == 'Approved' else None,
+                        status=status,
+                        created_at=created,
+                        updated_at=created,
+                    ))
+                appointments = Appointment.objects.bulk_create(appointments)
+
+                sessions = LiveAppointment.objects.bulk_create([
+                    LiveAppointment(
+                        appointment=appointment,
+                        live_appointment_number=appointment.appointment_number,
+                        status='completed',
+                        started_at=appointment.created_at,
+                        completed_at=appointment.created_at + timedelta(minutes=30),
+                        session_duration=30,
+                        created_at=appointment.created_at,
+                        updated_at=appointment.created_at,
+                    )
+                    for appointment in appointments if appointment.status == 'Completed'
+                ])
+
+                Prescription.objects.bulk_create([
+                    Prescription(
+                        live_appointment=session,
+                        prescription_number=f'{session.live_appointment_number}-RX',
+                        doctor_id=session.appointment.doctor_id,
+                        medicines=[{'name': 'Paracetamol', 'dosage': '500mg', 'frequency': 'every 6 hours'}],
+                        status=_pick(self.rng, PRESCRIPTION_STATUSES),
+                        created_at=session.created_at,
+                        updated_at=session.created_at,
+                    )
+                    for session in sessions if self.rng.random() < 0.7
+                ])
+            made += size
+            self.stdout.write(f'Appointment: {made}/{count} row(s)')
+
+    def create_lab_results(self, count, patient_ids):
+        def rows():
+            for i in range(count):
+                lab_type = self.rng.choice(LAB_TYPES)
+                yield LabResult(
+                    user_id=self.rng.choice(patient_ids),
+                    lab_type=lab_type,
+                    file_type='application/pdf',
+                    file_name=f"{lab_type.lower().replace(' ', '_')}_{i}.pdf",
+                    file_size=self.rng.randrange(20_000, 2_000_000),
+                    upload_date=self.moment(),
+                )
+        self.bulk(LabResult, rows())
+
+    def create_bookings(self, count, patient_ids):
+        def rows():
+            for _ in range(count):
+                created = self.moment()
+                yield BookedService(
+                    user_id=self.rng.choice(patient_ids),
+                    service_name=self.rng.choice(SERVICES),
+                    booking_date=(created + timedelta(days=self.rng.randrange(30))).date(),
+                    booking_time=time(self.rng.randrange(8, 17), self.rng.choice([0, 30])),
+                    status=_pick(self.rng, BOOKING_STATUSES),
+                    created_at=created,
+                    updated_at=created,
+                )
+        self.bulk(BookedService, rows())
@@ -0,0 +1,238 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from myapp.models import DoctorSignature, LabResult, Notification, Prescription, UserProfile
+from myapp.utils.attachments import add_references
+from myapp.utils.blob_store import get_blob_store
+from myapp.utils.downloads import Base64Reader, DEFAULT_CHUNK_SIZE, open_data_url
+from myapp.utils.thumbnails import build_missing_thumbnails
+
+
+def _open_base64(value, default_type):
+    """Return ``(mime_type, reader)`` for a data URL or bare base64 string."""
+    if value.startswith('data:'):
+        return open_data_url(value)
+    return default_type, Base64Reader.open(value)
+
+
+def _store(store, fh, content_type, dry_run):
+    """Copy ``fh`` into the blob store chunk by chunk; return ``(key, size)``."""
+    with fh:
+        chunks = iter(lambda: fh.read(DEFAULT_CHUNK_SIZE), b'')
+        if dry_run:
+            return None, sum(len(chunk) for chunk in chunks)
+        return store.save_stream(chunks, content_type, max_size=None)
+
+
+def _migrate_lab_result(store, pk, dry_run):
+    row = LabResult.objects.with_blobs().only('result_file', 'file_type').get(pk=pk)
+    mime_type, fh = _open_base64(row.result_file, row.file_type or 'application/octet-stream')
+    key, size = _store(store, fh, mime_type, dry_run)
+    if not dry_run:
+        LabResult.objects.filter(pk=pk).update(file_key=key, file_size=size, result_file='')
+    return size
+
+
+def _migrate_prescription_file(store, pk, dry_run):
+    row = Prescription.objects.with_blobs().only('prescription_file').get(pk=pk)
+    mime_type, fh = _open_base64(row.prescription_file, 'application/pdf')
+    key, size = _store(store, fh, mime_type, dry_run)
+    if not dry_run:
+        Prescription.objects.filter(pk=pk).update(
+            file_key=key, file_size=size, file_type=mime_type, prescription_file=None,
+        )
+    return size
+
+
+def _migrate_signature(store, pk, dry_run):
+    row = Prescription.objects.with_blobs().only('doctor_signature', 'doctor').get(pk=pk)
+    mime_type, fh = _open_base64(row.doctor_signature, 'image/png')
+    if dry_run or row.doctor_id is None:
+        key, size = _store(store, fh, mime_type, dry_run)
+        if not dry_run:
+            Prescription.objects.filter(pk=pk).update(signature_key=key, doctor_signature=None)
+        return size
+    # Collapse the per-prescription copies into versions of the doctor's signature asset
+    with fh:
+        content = fh.read()
+    signature = DoctorSignature.objects.record(row.doctor, content, mime_type)
+    Prescription.objects.filter(pk=pk).update(signature=signature, doctor_signature=None)
+    return len(content)
+
+
+def _migrate_notification_file(store, pk, dry_run):
+    row = Notification.objects.with_blobs().only('file').get(pk=pk)
+    mime_type, fh = _open_base64(row.file, 'application/octet-stream')
+    key, size = _store(store, fh, mime_type, dry_run)
+    if not dry_run:
+        with transaction.atomic():
+            Notification.objects.filter(pk=pk).update(
+                file_key=key, file_size=size, file_type=mime_type, file=None,
+            )
+            add_references(key, mime_type, size)
+    return size
+
+
+def _migrate_profile_photo(store, pk, dry_run):
+    row = UserProfile.objects.with_blobs().only('photo_url', 'photo_variants').get(pk=pk)
+    if dry_run:
+        _, fh = open_data_url(row.photo_url)
+        return _store(store, fh, None, dry_run=True)[1]
+    size = Base64Reader(row.photo_url.split(',', 1)[1]).size
+    build_missing_thumbnails(row)
+    return size
+
+
+def _not_empty(column):
+    return Q(**{f'{column}__isnull': False}) & ~Q(**{column: ''})
+
+
+# name -> (model, filter for rows still holding base64, migrate function)
+TABLES = {
+    'lab_results.result_file': (
+        LabResult, Q(file_key__isnull=True) & _not_empty('result_file'), _migrate_lab_result,
+    ),
+    'prescriptions.prescription_file': (
+        Prescription, Q(file_key__isnull=True) & _not_empty('prescription_file'), _migrate_prescription_file,
+    ),
+    'prescriptions.doctor_signature': (
+        Prescription,
+        Q(signature__isnull=True, signature_key__isnull=True) & _not_empty('doctor_signature'),
+        _migrate_signature,
+    ),
+    'notifications.file': (
+        Notification, Q(file_key__isnull=True) & _not_empty('file'), _migrate_notification_file,
+    ),
+    'user_profiles.photo_url': (
+        UserProfile, Q(photo_url__startswith='data:'), _migrate_profile_photo,
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Move base64 file columns out of the database into the blob store (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of rows to fetch per keyset page (default: 100)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Decode and measure the blobs without writing anything',
+        )
+        parser.add_argument(
+            '--table',
+            action='append',
+            choices=list(TABLES),
+            help='Only migrate this column (can be given more than once)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, 'migrate_blobs.checkpoint.json'),
+            help='File that records the last migrated primary key and the failed keys per column',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Ignore the checkpoint and start every column from the beginning',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checkpoint_path = options['checkpoint']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        checkpoint = {}
+        if not options['reset'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as fh:
+                checkpoint = json.load(fh)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN: nothing will be written.'))
+
+        store = get_blob_store()
+        failures = checkpoint.setdefault('failed', {})
+        for name in options['table'] or TABLES:
+            model, pending, migrate = TABLES[name]
+            last_pk = checkpoint.get(name, 0)
+            if last_pk:
+                self.stdout.write(f'{name}: resuming after pk {last_pk}')
+            else:
+                self.stdout.write(f'{name}: starting')
+
+            rows = moved = 0
+            failed_pks = []
+            started = time.monotonic()
+
+            def migrate_page(page):
+                nonlocal rows, moved
+                for pk in page:
+                    try:
+                        moved += migrate(store, pk, dry_run)
+                        rows += 1
+                    except Exception as e:
+                        failed_pks.append(pk)
+                        self.stderr.write(f'{name}: pk {pk} failed: {e}')
+
+            # Rows that failed last time sit behind the checkpoint; retry the ones still pending
+            retry = failures.get(name, [])
+            if retry:
+                self.stdout.write(f'{name}: retrying {len(retry)} rows that failed before')
+                migrate_page(model.objects.filter(pending, pk__in=retry).order_by('pk').values_list('pk', flat=True))
+
+            while True:
+                # Keyset page over primary keys only; each blob is fetched on its own
+                page = list(
+                    model.objects.filter(pending, pk__gt=last_pk)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not page:
+                    break
+                migrate_page(page)
+                last_pk = page[-1]
+
+                if not dry_run:
+                    checkpoint[name] = last_pk
+                    failures[name] = failed_pks
+                    self._save_checkpoint(checkpoint_path, checkpoint)
+
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'{name}: {rows} rows, {moved / (1024 * 1024):.1f} MB '
+                    f'({rows / elapsed:.1f} rows/s, {moved / (1024 * 1024) / elapsed:.2f} MB/s), '
+                    f'last pk {last_pk}'
+                )
+
+            if not dry_run and failures.get(name) != failed_pks:
+                failures[name] = failed_pks
+                self._save_checkpoint(checkpoint_path, checkpoint)
+
+            summary = f'{name}: {rows} rows, {moved / (1024 * 1024):.1f} MB {"measured" if dry_run else "moved"}'
+            if failed_pks:
+                self.stdout.write(self.style.WARNING(
+                    f'{summary}, {len(failed_pks)} failed (retried on the next run): pks {failed_pks}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(summary))
+
+        self.stdout.write(self.style.SUCCESS('Blob migration complete.'))
+
+    def _save_checkpoint(self, path, checkpoint):
+        # Write then rename so an interrupted run never leaves a truncated file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(checkpoint, fh)
+        os.replace(tmp_path, path)
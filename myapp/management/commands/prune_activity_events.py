@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.models import ActivityEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete activity log entries (logins, logouts, feed clears) older than 90 days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Number of days of activity to keep (default: 90)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without actually deleting',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        cutoff = timezone.now() - timedelta(days=days)
+
+        # created_at is indexed, so this is a range delete however large the log grows
+        old_events = ActivityEvent.objects.filter(created_at__lt=cutoff)
+        if options['dry_run']:
+            count = old_events.count()
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Would delete {count} activity event(s) older than {days} days.'))
+            return
+
+        deleted, _ = old_events.delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} activity event(s) older than {days} days.'))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp.utils.rollups import METRICS, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily analytics rollups from the source tables (run nightly to reconcile)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Only rebuild the last N days, today included (default: all history)',
+        )
+        parser.add_argument(
+            '--metric',
+            action='append',
+            choices=sorted(METRICS),
+            help='Metric to rebuild; repeat for several (default: all)',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is not None and days < 1:
+            raise CommandError('--days must be at least 1')
+        start = timezone.localdate() - timedelta(days=days - 1) if days else None
+
+        written = rebuild(metrics=options['metric'], start=start)
+
+        scope = f'since {start}' if start else 'for all history'
+        for metric, rows in written.items():
+            self.stdout.write(f'{metric}: {rows} rollup row(s) {scope}')
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt.'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_change_photo_url_to_textfield'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labresult',
+            name='file_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='labresult',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='labresult',
+            name='result_file',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0023_prescription_blob_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='file_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='file_type',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='signature_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0025_attachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSignature',
+            fields=[
+                ('signature_id', models.AutoField(primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField()),
+                ('key', models.CharField(max_length=64)),
+                ('content_type', models.CharField(default='image/png', max_length=50)),
+                ('size', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signatures', to='myapp.doctor')),
+            ],
+            options={
+                'db_table': 'doctor_signatures',
+                'ordering': ['doctor', '-version'],
+                'unique_together': {('doctor', 'version')},
+            },
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='signature',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prescriptions', to='myapp.doctorsignature'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:14
+
+from django.db import migrations, models
+
+
+def remind_rebuild(apps, schema_editor):
+    # The backfill lives in app code that changes after this migration; the
+    # command does it against the current schema instead
+    print('\n  Run "python manage.py rebuild_rollups" to fill analytics_daily_rollups from existing rows.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0026_doctor_signature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(max_length=30)),
+                ('dimension', models.CharField(max_length=30)),
+                ('value', models.CharField(blank=True, default='', max_length=150)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'analytics_daily_rollups',
+                'unique_together': {('metric', 'dimension', 'day', 'value')},
+            },
+        ),
+        migrations.RunPython(remind_rebuild, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0027_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=30)),
+                ('summary', models.CharField(max_length=255)),
+                ('detail', models.CharField(blank=True, default='', max_length=255)),
+                ('link', models.CharField(default='mod_users', max_length=50)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, db_column='user_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'activity_events',
+                'indexes': [models.Index(fields=['-created_at'], name='activity_recent_idx'), models.Index(fields=['action', '-created_at'], name='activity_action_recent_idx')],
+            },
+        ),
+        # The activity feed reads each source newest first
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['-created_at'], name='appointment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookedservice',
+            index=models.Index(fields=['-created_at'], name='booking_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labresult',
+            index=models.Index(fields=['-upload_date'], name='lab_result_uploaded_idx'),
+        ),
+    ]
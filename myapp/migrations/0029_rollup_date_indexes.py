@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+def remind_rebuild(apps, schema_editor):
+    # Users gained the 'active' rollup dimension; past days need a backfill
+    print('\n  Run "python manage.py rebuild_rollups --metric users" to fill the new users/active rollups.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0028_activity_event'),
+    ]
+
+    operations = [
+        # Rollup readers count today's rows live by these date columns
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined'], name='user_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookedservice',
+            index=models.Index(fields=['-booking_date'], name='booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['-created_at'], name='prescription_created_idx'),
+        ),
+        migrations.RunPython(remind_rebuild, migrations.RunPython.noop),
+    ]
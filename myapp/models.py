@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
@@ -24,6 +24,63 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('status', True)
         return self.create_user(username, email, password, **extra_fields)
 
+class BlobDeferringQuerySet(models.QuerySet):
+    """QuerySet that leaves large file/base64 columns out of the SELECT.
+
+    Subclasses list their heavy columns in ``blob_fields``. The manager built
+    from this queryset defers them by default; call ``with_blobs()`` when the
+    file content is actually needed (downloads, previews).
+
+    ``blob_key_fields`` maps a blob column to the blob store key column that
+    replaces it for new uploads, so ``has_<field>`` is true for either.
+    """
+    blob_fields = ()
+    blob_key_fields = {}
+
+    def without_blobs(self):
+        return self.defer(*self.blob_fields)
+
+    def with_blobs(self):
+        """Load every column, including the blob columns."""
+        return self.defer(None)
+
+    def with_blob_flags(self):
+        """Annotate ``has_<field>`` booleans so callers can tell whether a
+        file is attached without loading it."""
+        flags = {}
+        for name in self.blob_fields:
+            present = models.Q(**{f'{name}__isnull': False}) & ~models.Q(**{name: ''})
+            key_field = self.blob_key_fields.get(name)
+            if key_field:
+                present |= models.Q(**{f'{key_field}__isnull': False})
+            flags[f'has_{name}'] = models.ExpressionWrapper(present, output_field=models.BooleanField())
+        return self.annotate(**flags)
+
+
+class BlobDeferringManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().without_blobs()
+
+
+class UserProfileQuerySet(BlobDeferringQuerySet):
+    blob_fields = ('photo_url',)
+
+
+class NotificationQuerySet(BlobDeferringQuerySet):
+    blob_fields = ('file',)
+    blob_key_fields = {'file': 'file_key'}
+
+
+class LabResultQuerySet(BlobDeferringQuerySet):
+    blob_fields = ('result_file',)
+    blob_key_fields = {'result_file': 'file_key'}
+
+
+class PrescriptionQuerySet(BlobDeferringQuerySet):
+    blob_fields = ('doctor_signature', 'prescription_file')
+    blob_key_fields = {'doctor_signature': 'signature_key', 'prescription_file': 'file_key'}
+
+
 class Doctor(models.Model):
     doctor_id = models.AutoField(primary_key=True)
     user = models.OneToOneField('User', on_delete=models.CASCADE)
@@ -92,6 +149,7 @@ class User(AbstractBaseUser):
 
     class Meta:
         db_table = 'users'  # Specify the table name in MySQL
+        indexes = [models.Index(fields=['-date_joined'], name='user_joined_idx')]
 
 
 
@@ -127,7 +185,8 @@ class UserProfile(models.Model):
     contact_person = models.CharField(max_length=100, null=True, blank=True)
     relationship_to_patient = models.CharField(max_length=50, null=True, blank=True)
     contact_number = models.CharField(max_length=20, null=True, blank=True)
-    photo_url = models.TextField(null=True, blank=True)  # Stores base64 data URL (data:image/jpeg;base64,...)
+    photo_url = models.TextField(null=True, blank=True)  # Thumbnail URL, or a legacy base64 data URL (data:image/jpeg;base64,...)
+    photo_variants = models.JSONField(default=dict, blank=True)  # Blob store keys of the resized photos, by size
     phone_number = models.CharField(max_length=20, null=True, blank=True)
     phone_type = models.CharField(
         max_length=10,
@@ -143,6 +202,8 @@ class UserProfile(models.Model):
     data_privacy_consent = models.BooleanField(default=False)
     consent_date = models.DateTimeField(null=True, blank=True)
 
+    objects = BlobDeferringManager.from_queryset(UserProfileQuerySet)()
+
     class Meta:
         db_table = 'user_profiles'  # Specify the table name in MySQL
 
@@ -154,6 +215,43 @@ class UserProfile(models.Model):
         """
         return self.birthday
 
+    def photo_thumbnail_url(self, size=160):
+        """URL of the profile photo resized to ``size`` px, or None if there is no photo."""
+        from .utils.thumbnails import photo_thumbnail_url
+        if self.photo_variants.get(str(size)):
+            return photo_thumbnail_url(self.profile_id, self.photo_variants, size)
+        # Uploaded before thumbnails existed (migrate_blobs builds them on deploy).
+        # Listings defer photo_url, and a legacy base64 upload must not be
+        # inlined into the page, so neither is loaded here
+        if 'photo_url' in self.get_deferred_fields():
+            return None
+        photo = self.photo_url
+        return photo if photo and not photo.startswith('data:') else None
+
+    @property
+    def photo_thumb_url(self):
+        """Small avatar-sized photo URL for templates."""
+        return self.photo_thumbnail_url(64)
+
+class Attachment(models.Model):
+    """A blob store file shared by several rows.
+
+    A password reset ID photo is fanned out to every admin as one
+    notification each; the photo is stored once and ``ref_count`` tracks how
+    many notifications point at it through ``Notification.file_key``.
+    """
+    key = models.CharField(max_length=64, primary_key=True)  # SHA-256 blob store key
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'attachments'
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.ref_count} refs)"
+
 class Notification(models.Model):
     notification_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -175,10 +273,15 @@ class Notification(models.Model):
         ('urgent', 'Urgent')
     ], default='medium')
     related_id = models.IntegerField(null=True, blank=True)  # ID of related appointment, lab result, etc.
-    file = models.TextField(null=True, blank=True)  # Stores base64 data URL for attachments
+    file = models.TextField(null=True, blank=True)  # Legacy base64 data URL; new attachments live in the blob store
+    file_key = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # SHA-256 blob store key
+    file_size = models.BigIntegerField(null=True, blank=True)  # Size in bytes of the stored file
+    file_type = models.CharField(max_length=50, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BlobDeferringManager.from_queryset(NotificationQuerySet)()
+
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
@@ -186,6 +289,23 @@ class Notification(models.Model):
     def __str__(self):
         return f"{self.notification_type}: {self.title} - {self.user.username}"
 
+    @property
+    def has_attachment(self):
+        return bool(self.file_key or self.file)
+
+    def open_file(self):
+        """Return ``(mime_type, file_object)`` for the attachment.
+
+        Reads from the blob store when the row has a ``file_key`` and falls
+        back to the legacy base64 data URL in ``file`` otherwise. Raises
+        ``ValueError`` if the legacy column is not a data URL.
+        """
+        if self.file_key:
+            from .utils.blob_store import get_blob_store
+            return self.file_type or 'application/octet-stream', get_blob_store().open(self.file_key)
+        from .utils.downloads import open_data_url
+        return open_data_url(self.file)
+
 class Patient(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='patient_profile')
     client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='patients', limit_choices_to={'role': 'client'}, null=True, blank=True)
@@ -261,6 +381,7 @@ class Appointment(models.Model):
 
     class Meta:
         db_table = 'appointments'
+        indexes = [models.Index(fields=['-created_at'], name='appointment_created_idx')]
 
     def __str__(self):
         return f"{self.consultation_type} - {self.doctor.get_full_name()} with {self.patient.get_full_name()}"
@@ -275,7 +396,9 @@ class LabResult(models.Model):
         related_name='lab_results'
     )
     lab_type = models.CharField(max_length=100)
-    result_file = models.TextField()  # Store file path or base64 data
+    result_file = models.TextField(blank=True, default='')  # Legacy base64 data; new uploads live in the blob store
+    file_key = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # SHA-256 blob store key
+    file_size = models.BigIntegerField(null=True, blank=True)  # Size in bytes of the stored file
     file_type = models.CharField(max_length=50)
     file_name = models.CharField(max_length=255)
     uploaded_by = models.ForeignKey(
@@ -290,13 +413,28 @@ class LabResult(models.Model):
     upload_date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(null=True, blank=True)
 
+    objects = BlobDeferringManager.from_queryset(LabResultQuerySet)()
+
     class Meta:
         db_table = 'lab_results'
         ordering = ['-upload_date']
+        indexes = [models.Index(fields=['-upload_date'], name='lab_result_uploaded_idx')]
 
     def __str__(self):
         return f"{self.lab_type} - {self.user.username} ({self.upload_date.strftime('%Y-%m-%d')})"
 
+    def open_result_file(self):
+        """Return a binary file object for the result file.
+
+        Reads from the blob store when the row has a ``file_key`` and falls
+        back to decoding the legacy base64 ``result_file`` column otherwise.
+        """
+        if self.file_key:
+            from .utils.blob_store import get_blob_store
+            return get_blob_store().open(self.file_key)
+        from .utils.downloads import Base64Reader
+        return Base64Reader.open(self.result_file)
+
 class LiveAppointment(models.Model):
     """Live consultation session linked to an appointment"""
     live_appointment_id = models.AutoField(primary_key=True)
@@ -374,12 +512,24 @@ class Prescription(models.Model):
     follow_up_date = models.DateField(null=True, blank=True)
     follow_up_instructions = models.TextField(null=True, blank=True)
     
-    # Digital signature
-    doctor_signature = models.TextField(null=True, blank=True)  # Base64 encoded signature
+    # Digital signature: a version of the doctor's signature asset (content-addressed, so it cannot change)
+    signature = models.ForeignKey(
+        'DoctorSignature',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='prescriptions'
+    )
+    doctor_signature = models.TextField(null=True, blank=True)  # Legacy base64 signature; migrated ones live in the blob store
+    signature_key = models.CharField(max_length=64, null=True, blank=True)  # SHA-256 blob store key of the PNG
     signature_date = models.DateTimeField(null=True, blank=True)
     
-    # Prescription file (PDF, image, etc. uploaded by doctor) - stored as base64 data URL
-    prescription_file = models.TextField(null=True, blank=True)
+    # Prescription file (PDF, image, etc. uploaded by doctor)
+    prescription_file = models.TextField(null=True, blank=True)  # Legacy base64 data URL; new uploads live in the blob store
+    file_key = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # SHA-256 blob store key
+    file_size = models.BigIntegerField(null=True, blank=True)  # Size in bytes of the stored file
+    file_type = models.CharField(max_length=50, null=True, blank=True)
+    file_name = models.CharField(max_length=255, null=True, blank=True)
     # Direct reference to the prescribing doctor for easier queries
     doctor = models.ForeignKey(
         'Doctor',
@@ -407,9 +557,12 @@ class Prescription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = BlobDeferringManager.from_queryset(PrescriptionQuerySet)()
+    
     class Meta:
         db_table = 'prescriptions'
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at'], name='prescription_created_idx')]
     
     def __str__(self):
         return f"Prescription #{self.prescription_number} - {self.live_appointment.appointment.patient.get_full_name()}"
@@ -427,6 +580,46 @@ class Prescription(models.Model):
             self.prescription_number = self.generate_prescription_number()
         super().save(*args, **kwargs)
 
+    @property
+    def has_file(self):
+        return bool(self.file_key or self.prescription_file)
+
+    def signature_src(self):
+        """Return the ``src`` for the signature image, or None when unsigned.
+
+        Signature assets are served from a cacheable, versioned URL.
+        """
+        if self.signature_id:
+            return self.signature.url()
+        return self.signature_data_url()
+
+    def signature_data_url(self):
+        """Return a legacy per-prescription signature as a ``data:`` URL, or
+        None when there is none."""
+        if self.signature_key:
+            import base64
+            from .utils.blob_store import get_blob_store
+            content = get_blob_store().read(self.signature_key)
+            return f"data:image/png;base64,{base64.b64encode(content).decode('ascii')}"
+        if not self.doctor_signature:
+            return None
+        if self.doctor_signature.startswith('data:'):
+            return self.doctor_signature
+        return f"data:image/png;base64,{self.doctor_signature}"
+
+    def open_prescription_file(self):
+        """Return ``(mime_type, file_object)`` for the uploaded prescription file.
+
+        Reads from the blob store when the row has a ``file_key`` and falls
+        back to the legacy base64 data URL in ``prescription_file`` otherwise.
+        Raises ``ValueError`` if the legacy column is not a data URL.
+        """
+        if self.file_key:
+            from .utils.blob_store import get_blob_store
+            return self.file_type or 'application/octet-stream', get_blob_store().open(self.file_key)
+        from .utils.downloads import open_data_url
+        return open_data_url(self.prescription_file)
+
 
 class BookedService(models.Model):
     booking_id = models.AutoField(primary_key=True)
@@ -457,6 +650,10 @@ class BookedService(models.Model):
     class Meta:
         db_table = 'booked_services'
         ordering = ['-booking_date', '-booking_time']
+        indexes = [
+            models.Index(fields=['-created_at'], name='booking_created_idx'),
+            models.Index(fields=['-booking_date'], name='booking_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.service_name} on {self.booking_date} at {self.booking_time} - {self.user.username}"
@@ -483,6 +680,54 @@ class RolePermission(models.Model):
         return f"{self.role}: {'Enabled' if self.is_enabled else 'Disabled'}"
 
 
+class DoctorSignatureManager(models.Manager):
+    def record(self, doctor, content: bytes, content_type='image/png'):
+        """Return the doctor's signature version for ``content``.
+
+        The current version is reused when the image is unchanged; otherwise
+        the image is stored once in the blob store as a new version.
+        """
+        from .utils.blob_store import get_blob_store
+        key = get_blob_store().save(content, content_type)
+        with transaction.atomic():
+            current = self.select_for_update().filter(doctor=doctor).order_by('-version').first()
+            if current and current.key == key:
+                return current
+            return self.create(
+                doctor=doctor,
+                version=(current.version + 1) if current else 1,
+                key=key,
+                content_type=content_type,
+                size=len(content),
+            )
+
+class DoctorSignature(models.Model):
+    """A version of a doctor's signature image, stored once in the blob store
+    and referenced by every prescription signed with it."""
+    signature_id = models.AutoField(primary_key=True)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='signatures')
+    version = models.PositiveIntegerField()
+    key = models.CharField(max_length=64)  # SHA-256 blob store key
+    content_type = models.CharField(max_length=50, default='image/png')
+    size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = DoctorSignatureManager()
+
+    class Meta:
+        db_table = 'doctor_signatures'
+        ordering = ['doctor', '-version']
+        unique_together = [('doctor', 'version')]
+
+    def __str__(self):
+        return f"Signature v{self.version} - {self.doctor}"
+
+    def url(self):
+        """Versioned URL of the image; safe to cache as immutable."""
+        from django.urls import reverse
+        from .utils.downloads import versioned_url
+        return versioned_url(reverse('doctor_signature_image', args=[self.signature_id]), self.key)
+
 class WatchVitals(models.Model):
     """Model for smartwatch vital signs data"""
     id = models.AutoField(primary_key=True)
@@ -514,3 +759,60 @@ class WatchVitals(models.Model):
 
     def __str__(self):
         return f"Vitals for {self.user.username} - {self.captured_at.strftime('%Y-%m-%d %H:%M:%S') if self.captured_at else 'No timestamp'}"
+
+
+class DailyRollup(models.Model):
+    """Count of one analytics metric for one day and dimension value.
+
+    ``dimension='all'`` (with an empty ``value``) holds the day's total; the
+    other dimensions split it by status, type, doctor and so on. Maintained
+    incrementally by ``myapp.utils.rollups`` and reconciled by
+    ``manage.py rebuild_rollups``.
+    """
+    day = models.DateField()
+    metric = models.CharField(max_length=30)  # e.g. 'appointments', 'lab_results'
+    dimension = models.CharField(max_length=30)  # e.g. 'all', 'status', 'doctor'
+    value = models.CharField(max_length=150, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'analytics_daily_rollups'
+        unique_together = [('metric', 'dimension', 'day', 'value')]
+
+    def __str__(self):
+        return f"{self.day} {self.metric}/{self.dimension}={self.value}: {self.count}"
+
+
+class ActivityEvent(models.Model):
+    """One entry in the site activity log (logins, logouts, ...).
+
+    Rows are only ever inserted, one per event, by
+    ``myapp.utils.activity_signals``; the admin dashboard reads the newest
+    through the ``created_at`` index and ``manage.py prune_activity_events``
+    deletes old ones. Clearing the dashboard feed appends a ``clear`` event
+    that hides everything before it rather than deleting rows.
+    """
+    action = models.CharField(max_length=30)  # 'login', 'logout', 'clear'
+    summary = models.CharField(max_length=255)
+    detail = models.CharField(max_length=255, blank=True, default='')
+    link = models.CharField(max_length=50, default='mod_users')  # URL name the feed links to
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column='user_id',
+        to_field='user_id',
+        related_name='activity_events'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'activity_events'
+        indexes = [
+            models.Index(fields=['-created_at'], name='activity_recent_idx'),
+            models.Index(fields=['action', '-created_at'], name='activity_action_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} {self.summary}"
@@ -0,0 +1,75 @@
+"""Versioned fragment caching in templates (see ``utils.fragment_cache``).
+
+    {% load fragments %}
+    {% cachefragment "dashboard_today_appointments" "Appointment,Doctor,User,UserProfile" today %}
+      ...
+    {% endcachefragment %}
+
+The first argument names the fragment and the second lists the models the
+block reads, from ``analytics_cache.SOURCE_MODELS``; the block is rendered
+again only after one of them changes. Any further arguments are values the
+output varies on (the date, the signed-in doctor, a permission flag).
+
+``{% fragment_report %}`` renders a panel listing this request's fragments
+and every fragment's hit rate when ``FRAGMENT_CACHE_REPORT`` is on.
+"""
+from django import template
+from django.conf import settings
+
+from ..utils import fragment_cache
+from ..utils.analytics_cache import SOURCE_MODELS
+
+register = template.Library()
+
+
+def _literal(bit, tag, what):
+    if len(bit) < 2 or bit[0] != bit[-1] or bit[0] not in '"\'':
+        raise template.TemplateSyntaxError(f"'{tag}' {what} must be a quoted string")
+    return bit[1:-1]
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, sources, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.sources = sources
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return fragment_cache.cached_fragment(
+            self.name, self.sources, vary_on, lambda: self.nodelist.render(context), context.get('request'),
+        )
+
+
+@register.tag
+def cachefragment(parser, token):
+    bits = token.split_contents()
+    tag = bits[0]
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{tag}' takes a fragment name, its source models and optional vary-on values")
+    name = _literal(bits[1], tag, 'name')
+    sources = tuple(source.strip() for source in _literal(bits[2], tag, 'sources').split(','))
+    unknown = [source for source in sources if source not in SOURCE_MODELS]
+    if unknown:
+        raise template.TemplateSyntaxError(f"'{tag}' has no version counter for {', '.join(unknown)}")
+    vary_on = [parser.compile_filter(bit) for bit in bits[3:]]
+    nodelist = parser.parse((f'end{tag}',))
+    parser.delete_first_token()
+    return CacheFragmentNode(nodelist, name, sources, vary_on)
+
+
+@register.inclusion_tag('components/fragment_report.html', takes_context=True)
+def fragment_report(context):
+    """This request's fragment renders and the overall hit rates, when enabled."""
+    if not getattr(settings, 'FRAGMENT_CACHE_REPORT', settings.DEBUG):
+        return {'enabled': False}
+    request = context.get('request')
+    renders = fragment_cache.request_log(request) if request is not None else []
+    return {
+        'enabled': True,
+        'renders': renders,
+        'page_hits': sum(1 for entry in renders if entry['hit']),
+        'page_ms': round(sum(entry['ms'] for entry in renders), 2),
+        'stats': fragment_cache.stats(),
+    }
@@ -0,0 +1,1288 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import httpx
+from asgiref.sync import async_to_sync
+from PIL import Image
+
+from django.apps import apps
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .features.admin.activity_feed import recent_activity
+from .features.admin.analytics_cohorts import collect_cohorts
+from .features.admin.analytics_kpis import KPI_TABLES, collect_kpis
+from .features.admin.analytics_views import _analytics_context
+from .features.admin.dashboard_kpis import dashboard_kpis
+from .features.admin.schedule import summarise_schedule
+from .management.commands.migrate_blobs import TABLES
+from .models import (
+    ActivityEvent, Appointment, Attachment, BlobDeferringQuerySet, BookedService, Doctor, DoctorSignature, LabResult,
+    LiveAppointment, Notification, Prescription, User, UserProfile,
+)
+from .utils import analytics_cache, blob_codecs, fragment_cache, live_events
+from .utils.activity_signals import record_event
+from .utils.attachments import acquire_attachment, release_attachments
+from .utils.aggregates import aggregate_counts, by_value, distribution
+from .utils.blob_store import READ_CHUNK_SIZE, BlobTooLarge, SupabaseBlobStore, compute_key, get_blob_store
+from .utils.downloads import stream_file, streaming_body
+from .utils.rollups import rebuild, rollup_counts, rollup_total
+from .utils.series_stats import describe
+from .utils.thumbnails import THUMBNAIL_SIZES, save_profile_photo
+from .utils.timeseries import calendar_buckets, next_bucket
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Blob column guard: listing views must not SELECT the deferred base64 columns.
+# Blob columns that only appear inside expressions (the has_<field> flags of
+# with_blob_flags()) are allowed.
+_COLUMN_RE = re.compile(r'^"(?P<table>[^"]+)"\."(?P<column>[^"]+)"(\s+AS\s+"[^"]+")?$', re.IGNORECASE)
+_ALIAS_RE = re.compile(r'^T\d+$')
+
+
+def blob_columns():
+    """Return ``{(db_table, column), ...}`` for every deferred blob column."""
+    columns = set()
+    for model in apps.get_app_config('myapp').get_models():
+        qs_class = getattr(model._default_manager, '_queryset_class', None)
+        if not (qs_class and issubclass(qs_class, BlobDeferringQuerySet)):
+            continue
+        for name in qs_class.blob_fields:
+            columns.add((model._meta.db_table, model._meta.get_field(name).column))
+    return columns
+
+
+def _split_select_list(sql):
+    """Return the top-level items of the SELECT list of ``sql``."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return []
+    body = sql.lstrip()[len('SELECT'):]
+    items, depth, start = [], 0, 0
+    upper = body.upper()
+    i = 0
+    while i < len(body):
+        ch = body[i]
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif depth == 0 and ch == ',':
+            items.append(body[start:i].strip())
+            start = i + 1
+        elif depth == 0 and upper.startswith(' FROM ', i):
+            break
+        i += 1
+    items.append(body[start:i].strip())
+    return items
+
+
+def selected_blob_columns(sql, columns=None):
+    """Return the blob columns that ``sql`` selects directly."""
+    columns = blob_columns() if columns is None else columns
+    column_names = {column for _, column in columns}
+    found = []
+    for item in _split_select_list(sql):
+        match = _COLUMN_RE.match(item)
+        if not match:
+            continue
+        table, column = match.group('table'), match.group('column')
+        # Repeated joins are aliased T1, T2, ... instead of using the table name
+        if (table, column) in columns or (_ALIAS_RE.match(table) and column in column_names):
+            found.append(f"{table}.{column}")
+    return found
+
+
+@contextmanager
+def assert_no_blob_columns(using=DEFAULT_DB_ALIAS):
+    """Fail if a query run inside the block selects a blob column."""
+    columns = blob_columns()
+    with CaptureQueriesContext(connections[using]) as ctx:
+        yield ctx
+    offenders = []
+    for query in ctx.captured_queries:
+        found = selected_blob_columns(query['sql'], columns)
+        if found:
+            offenders.append(f"{', '.join(found)} <- {query['sql'][:200]}")
+    if offenders:
+        raise AssertionError(
+            "Blob columns were selected; defer them or use with_blob_flags():\n  "
+            + "\n  ".join(offenders)
+        )
+
+
+
+class BlobColumnTests(TestCase):
+    LEGACY_FILE = 'data:application/pdf;base64,JVBERi0xLjQgbGVnYWN5'
+
+    def setUp(self):
+        self.patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        UserProfile.objects.create(
+            user=self.patient, first_name='Ana', last_name='Cruz', photo_url='data:image/png;base64,iVBORw0KGgo=',
+        )
+        doctor_user = User.objects.create(username='doctor1', email='doctor1@example.com', role='doctor')
+        doctor = Doctor.objects.create(
+            user=doctor_user, specialization='GP', license_number='L-1', years_of_experience=3, contact_info='-',
+        )
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=doctor, consultation_type='F2F', consultation_date=date(2026, 1, 5),
+            consultation_time='09:00',
+        )
+        Prescription.objects.create(
+            live_appointment=LiveAppointment.objects.create(appointment=appointment), prescription_number='RX-LIST',
+            prescription_file=self.LEGACY_FILE, doctor_signature='iVBORw0KGgo=',
+        )
+        LabResult.objects.create(
+            user=self.patient, lab_type='Urinalysis', result_file='JVBERi0xLjQgbGVnYWN5', file_type='application/pdf',
+            file_name='u.pdf',
+        )
+        Notification.objects.create(
+            user=self.patient, title='Results ready', message='-', notification_type='lab_result', file=self.LEGACY_FILE,
+        )
+
+    def sign_in(self, **values):
+        session = self.client.session
+        session.update(values)
+        session.save()
+
+    def assert_lists_without_blobs(self, url, expected):
+        with assert_no_blob_columns():
+            response = self.client.get(url)
+        self.assertContains(response, expected)
+
+    def test_patient_listings(self):
+        self.sign_in(user=self.patient.user_id)
+        self.assert_lists_without_blobs('/labresults/', 'Urinalysis')
+        self.assert_lists_without_blobs('/prescriptions/', 'RX-LIST')
+        self.assert_lists_without_blobs('/alertnotification/', 'Results ready')
+
+    def test_admin_profile_listings(self):
+        self.sign_in(is_admin=True)
+        self.assert_lists_without_blobs('/manage/users/', 'patient1')
+        self.assert_lists_without_blobs('/manage/accounts/', 'patient1')
+
+    def test_guard_flags_selected_blob_columns(self):
+        with self.assertRaises(AssertionError):
+            with assert_no_blob_columns():
+                list(LabResult.objects.with_blobs())
+        with assert_no_blob_columns():
+            self.assertTrue(LabResult.objects.with_blob_flags().get().has_result_file)
+
+class BlobStoreTestCase(TestCase):
+    """Runs against a local blob store in a temporary directory."""
+
+    def setUp(self):
+        self.root = root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        overrides = override_settings(BLOB_STORE_BACKEND='local', BLOB_STORE_ROOT=root, BLOB_STORE_COMPRESSION='zlib')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch('myapp.utils.blob_store._store', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = get_blob_store()
+        self.patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+
+
+class BlobStoreTests(BlobStoreTestCase):
+    def test_content_addressed_round_trip(self):
+        content = b'result,value\n' * 1000
+        key = self.store.save(content, 'text/csv')
+        self.assertEqual(key, compute_key(content))
+        self.assertEqual(self.store.save(content, 'text/csv'), key)  # stored once
+        self.assertEqual(self.store.read(key), content)
+        codec, size, stored = self.store.stat(key)
+        self.assertEqual((codec, size), ('zlib', len(content)))
+        self.assertLess(stored, size)
+
+    def test_precompressed_content_is_stored_as_is(self):
+        content = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 8
+        key = self.store.save(content, 'image/png')
+        self.assertEqual(self.store.stat(key), (None, len(content), len(content)))
+        self.assertEqual(self.store.read(key), content)
+
+    def test_stream_larger_than_limit_is_rejected(self):
+        with self.assertRaises(BlobTooLarge):
+            self.store.save_stream([b'x' * 10, b'x' * 10], max_size=15)
+
+    def test_codec_header_round_trip(self):
+        header = blob_codecs.pack_header(blob_codecs.CODEC_ZLIB, 1234)
+        self.assertEqual(len(header), blob_codecs.HEADER_SIZE)
+        self.assertIsNone(blob_codecs.default_codec('none'))
+        with self.assertRaises(ValueError):
+            blob_codecs.default_codec('lzma')
+
+    def test_lab_result_reads_blob_or_legacy_base64(self):
+        key = self.store.save(b'%PDF-1.4 report', 'application/pdf')
+        stored = LabResult.objects.create(
+            user=self.patient, lab_type='CBC', file_key=key, file_size=15, file_type='application/pdf', file_name='a.pdf',
+        )
+        legacy = LabResult.objects.create(
+            user=self.patient, lab_type='CBC', result_file='JVBERi0xLjQgbGVnYWN5', file_type='application/pdf',
+            file_name='b.pdf',
+        )
+        with stored.open_result_file() as fh:
+            self.assertEqual(fh.read(), b'%PDF-1.4 report')
+        with legacy.open_result_file() as fh:
+            self.assertEqual(fh.read(), b'%PDF-1.4 legacy')
+
+    def test_compressed_blob_decodes_in_chunks(self):
+        content = bytes(range(200)) * 500
+        key = self.store.save(content, 'application/pdf')
+        with self.store.open(key) as fh:
+            chunks = list(iter(lambda: fh.read(4096), b''))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), content)
+
+    def test_compression_report(self):
+        text, png = b'result,value\n' * 1000, png_bytes()
+        for name, content, file_type in (('a.csv', text, 'text/csv'), ('b.png', png, 'image/png')):
+            LabResult.objects.create(
+                user=self.patient, lab_type='CBC', file_key=self.store.save(content, file_type), file_size=len(content),
+                file_type=file_type, file_name=name,
+            )
+        LabResult.objects.create(
+            user=self.patient, lab_type='CBC', result_file='JVBERi0xLjQgbGVnYWN5', file_type='application/pdf',
+            file_name='c.pdf',
+        )
+        LabResult.objects.create(
+            user=self.patient, lab_type='CBC', file_key='0' * 64, file_size=1, file_type='text/plain', file_name='d.txt',
+        )
+        out = StringIO()
+        call_command('blob_compression_report', '--table', 'lab_results', stdout=out)
+        report = out.getvalue()
+        self.assertIn('lab_results: 2 blobs (1 compressed, zlib)', report)
+        self.assertIn('lab_results: 1 referenced blob(s) missing from the store', report)
+        stored = sum(self.store.stat(key)[2] for key in LabResult.objects.exclude(file_name='d.txt').exclude(
+            file_key__isnull=True).values_list('file_key', flat=True))
+        ratio = (len(text) + len(png)) / stored
+        self.assertIn(f'ratio {ratio:.2f}x', report)
+        self.assertIn('0.00 MB base64 still in the database', report)
+
+
+
+class SupabaseBlobStoreTests(BlobStoreTestCase):
+    """Reads go through a signed URL with Range requests, never ``download()``."""
+
+    def setUp(self):
+        super().setUp()
+        self.objects, self.served, self.ranges = {}, [], []
+        self.remote = SupabaseBlobStore('blobs', url='https://example.supabase.co', service_key='key')
+        self.remote._client = mock.Mock()
+        storage = self.remote._client.storage.from_.return_value
+        storage.create_signed_url.side_effect = lambda path, ttl: {'signedURL': f'https://signed.example/{path}'}
+        storage.download.side_effect = AssertionError('download() reads the whole blob into memory')
+        patcher = mock.patch.object(
+            SupabaseBlobStore, '_http_client', lambda store: httpx.Client(transport=httpx.MockTransport(self.serve)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, request):
+        stored = self.objects[request.url.path.split('/')[-1]]
+        start = int(request.headers['Range'][len('bytes='):-1])
+        self.ranges.append(start)
+        if start >= len(stored):
+            return httpx.Response(416, headers={'Content-Range': f'bytes */{len(stored)}'})
+
+        def body():
+            for offset in range(start, len(stored), 8192):
+                self.served.append(offset)
+                yield stored[offset:offset + 8192]
+        headers = {'Content-Range': f'bytes {start}-{len(stored) - 1}/{len(stored)}'}
+        return httpx.Response(206, headers=headers, content=body())
+
+    def put(self, key):
+        with open(self.store.path(key), 'rb') as fh:
+            self.objects[key] = fh.read()
+
+    def test_read_fetches_only_the_chunks_it_needs(self):
+        content = os.urandom(1024 * 1024)
+        key = self.store.save(content, 'application/octet-stream')
+        self.put(key)
+        with self.remote.open(key) as fh:
+            self.assertEqual(fh.read(100), content[:100])
+            self.assertLessEqual(len(self.served), READ_CHUNK_SIZE // 8192)
+            fh.seek(900000)
+            self.assertEqual(fh.read(10), content[900000:900010])
+        self.assertEqual(self.ranges, [0, 900000])
+        self.assertLess(len(self.served), len(content) // 8192)
+
+    def test_compressed_blob_round_trip_and_stat(self):
+        content = b'result,value\n' * 20000
+        key = self.store.save(content, 'text/csv')
+        self.put(key)
+        with self.remote.open(key) as fh:
+            self.assertEqual(fh.read(), content)
+        self.assertEqual(self.remote.stat(key), self.store.stat(key))
+
+    def test_range_download_starts_at_the_requested_offset(self):
+        content = os.urandom(1024 * 1024)
+        key = self.store.save(content, 'application/octet-stream')
+        self.put(key)
+        request = RequestFactory().get('/', HTTP_RANGE='bytes=500000-500099')
+        response = stream_file(request, self.remote.open(key), 'application/octet-stream', 'a.bin')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), content[500000:500100])
+        self.assertEqual(self.ranges, [0, 500000])
+        # One read chunk for the codec header, one for the range
+        self.assertLessEqual(len(self.served), 2 * READ_CHUNK_SIZE // 8192)
+
+
+class StreamingUploadTests(BlobStoreTestCase):
+    def test_chunks_are_hashed_and_written_as_they_arrive(self):
+        chunks = [b'a' * 4096, b'b' * 4096, b'c' * 100]
+        key, size = self.store.save_stream(iter(chunks), 'text/plain')
+        self.assertEqual((key, size), (compute_key(b''.join(chunks)), 8292))
+        self.assertEqual(self.store.read(key), b''.join(chunks))
+
+    def test_oversized_stream_stops_early_and_leaves_no_partial_file(self):
+        consumed = []
+
+        def chunks():
+            for i in range(10):
+                consumed.append(i)
+                yield b'x' * 10
+
+        with self.assertRaises(BlobTooLarge):
+            self.store.save_stream(chunks(), max_size=25)
+        self.assertEqual(consumed, [0, 1, 2])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'tmp')), [])
+
+    def test_prescription_upload_is_stored_as_a_blob(self):
+        doctor_user = User.objects.create(username='doctor1', email='doctor1@example.com', role='doctor')
+        doctor = Doctor.objects.create(
+            user=doctor_user, specialization='GP', license_number='L-1', years_of_experience=3, contact_info='-',
+        )
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=doctor, consultation_type='F2F', consultation_date=date(2026, 1, 5),
+            consultation_time='09:00',
+        )
+        prescription = Prescription.objects.create(
+            live_appointment=LiveAppointment.objects.create(appointment=appointment), prescription_number='RX-1',
+        )
+        self.client.force_login(doctor_user)
+        content = b'%PDF-1.4 ' + b'0' * 70000
+        response = self.client.post(
+            f'/doctors/upload-prescription-file/{prescription.pk}/',
+            {'prescription_file': SimpleUploadedFile('rx.pdf', content, 'application/pdf')},
+        )
+        self.assertEqual(response.status_code, 200)
+        prescription = Prescription.objects.with_blobs().get(pk=prescription.pk)
+        self.assertEqual((prescription.file_key, prescription.file_size), (compute_key(content), len(content)))
+        self.assertIsNone(prescription.prescription_file)
+        self.assertEqual(self.store.read(prescription.file_key), content)
+
+
+
+class AsgiStreamingTests(TestCase):
+    """Under ASGI a synchronous iterator would be buffered whole before sending."""
+
+    def consume(self, response):
+        async def read():
+            return [part async for part in response.streaming_content]
+        return async_to_sync(read)()
+
+    def test_streaming_body_reads_in_batches(self):
+        produced = []
+
+        def parts():
+            for i in range(100):
+                produced.append(i)
+                yield f'{i:03d}\n'
+
+        body = streaming_body(AsyncRequestFactory().get('/'), parts(), batch_size=40)
+
+        async def first():
+            return await body.__anext__()
+        self.assertEqual(async_to_sync(first)(), ''.join(f'{i:03d}\n' for i in range(10)).encode())
+        self.assertEqual(len(produced), 10)
+
+        response = StreamingHttpResponse(streaming_body(AsyncRequestFactory().get('/'), parts(), batch_size=40))
+        self.assertEqual(len(self.consume(response)), 10)
+        wsgi_parts = iter([b'x'])
+        self.assertIs(streaming_body(RequestFactory().get('/'), wsgi_parts), wsgi_parts)
+
+    def test_stream_file_is_async_under_asgi(self):
+        content = b'0123456789abcdef' * 64
+        response = stream_file(
+            AsyncRequestFactory().get('/'), BytesIO(content), 'text/plain', 'a.txt', chunk_size=256,
+        )
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(len(content)))
+        parts = self.consume(response)
+        self.assertEqual((len(parts), b''.join(parts)), (4, content))
+
+        response = stream_file(
+            AsyncRequestFactory().get('/', headers={'range': 'bytes=16-31'}), BytesIO(content), 'text/plain', 'a.txt',
+        )
+        self.assertEqual((response.status_code, self.consume(response)), (206, [content[16:32]]))
+
+class MigrateBlobsTests(BlobStoreTestCase):
+    TABLE = 'lab_results.result_file'
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.root, 'checkpoint.json')
+        self.results = [
+            LabResult.objects.create(
+                user=self.patient, lab_type='CBC', result_file='JVBERi0xLjQgbGVnYWN5', file_type='application/pdf',
+                file_name=f'{i}.pdf',
+            )
+            for i in range(3)
+        ]
+
+    def migrate(self, *args):
+        call_command(
+            'migrate_blobs', '--table', self.TABLE, '--checkpoint', self.checkpoint, '--batch-size', '2', *args,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(self.checkpoint) as fh:
+            return json.load(fh)
+
+    def keys(self):
+        return list(LabResult.objects.order_by('pk').values_list('file_key', flat=True))
+
+    def test_failed_rows_are_recorded_and_retried_on_resume(self):
+        model, pending, migrate = TABLES[self.TABLE]
+        broken = self.results[1].pk
+
+        def flaky(store, pk, dry_run):
+            if pk == broken:
+                raise OSError('storage unavailable')
+            return migrate(store, pk, dry_run)
+
+        with mock.patch.dict(TABLES, {self.TABLE: (model, pending, flaky)}):
+            checkpoint = self.migrate()
+        self.assertEqual(checkpoint[self.TABLE], self.results[2].pk)
+        self.assertEqual(checkpoint['failed'][self.TABLE], [broken])
+        key = compute_key(b'%PDF-1.4 legacy')
+        self.assertEqual(self.keys(), [key, None, key])
+
+        checkpoint = self.migrate()
+        self.assertEqual(checkpoint['failed'][self.TABLE], [])
+        self.assertEqual(self.keys(), [key] * 3)
+        self.assertEqual(self.store.read(key), b'%PDF-1.4 legacy')
+
+    def test_dry_run_writes_nothing(self):
+        call_command(
+            'migrate_blobs', '--table', self.TABLE, '--checkpoint', self.checkpoint, '--dry-run',
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(self.keys(), [None] * 3)
+
+class FileDownloadTests(BlobStoreTestCase):
+    CONTENT = b'0123456789abcdef' * 64
+
+    def setUp(self):
+        super().setUp()
+        key = self.store.save(self.CONTENT, 'text/plain')
+        self.result = LabResult.objects.create(
+            user=self.patient, lab_type='CBC', file_key=key, file_size=len(self.CONTENT), file_type='text/plain',
+            file_name='cbc.txt',
+        )
+        session = self.client.session
+        session['user'] = self.patient.user_id
+        session.save()
+
+    def download(self, result=None, data=None, **headers):
+        return self.client.get(f'/labresults/download/{(result or self.result).pk}/', data, headers=headers)
+
+    def test_full_file_is_streamed(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENT)))
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+
+    def test_range_requests(self):
+        response = self.download(range='bytes=16-31')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 16-31/{len(self.CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[16:32])
+
+        response = self.download(range='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), b'cdef')
+
+        response = self.download(range=f'bytes={len(self.CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENT)}')
+
+    def test_range_of_legacy_base64_file(self):
+        legacy = LabResult.objects.create(
+            user=self.patient, lab_type='CBC', result_file='JVBERi0xLjQgbGVnYWN5', file_type='application/pdf',
+            file_name='legacy.pdf',
+        )
+        response = self.download(legacy, range='bytes=9-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'legacy')
+
+    def test_etag_and_cache_control(self):
+        etag = f'"{self.result.file_key}"'
+        response = self.download()
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.download(data={'v': self.result.file_key[:16]})
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+
+        response = self.download(data={'v': 'stale'})
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_matching_if_none_match_skips_the_blob(self):
+        with mock.patch.object(type(self.store), 'open_stored') as open_stored, assert_no_blob_columns():
+            response = self.download(if_none_match=f'W/"{self.result.file_key}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"{self.result.file_key}"')
+        open_stored.assert_not_called()
+
+        response = self.download(if_none_match='"something-else"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_legacy_file_has_no_etag(self):
+        legacy = LabResult.objects.create(
+            user=self.patient, lab_type='CBC', result_file='JVBERi0xLjQgbGVnYWN5', file_type='application/pdf',
+            file_name='legacy.pdf',
+        )
+        response = self.download(legacy, if_none_match='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+
+class AttachmentTests(BlobStoreTestCase):
+    def attach(self, content, copies):
+        attachment = acquire_attachment(SimpleUploadedFile('id.txt', content, 'text/plain'), references=copies)
+        for i in range(copies):
+            Notification.objects.create(
+                user=self.patient, title=f'Reset {i}', message='-', notification_type='password_reset',
+                file_key=attachment.key, file_size=attachment.size, file_type='text/plain',
+            )
+        return attachment.key
+
+    def ref_count(self, key):
+        return Attachment.objects.filter(key=key).values_list('ref_count', flat=True).first()
+
+    def test_blob_is_freed_with_its_last_reference(self):
+        key = self.attach(b'shared id photo', 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(title='Reset 0').get().delete()
+            Notification.objects.filter(title='Reset 1').delete()
+        self.assertEqual(self.ref_count(key), 1)
+        self.assertTrue(self.store.exists(key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.all().delete()
+        self.assertIsNone(self.ref_count(key))
+        self.assertFalse(self.store.exists(key))
+
+    def test_cascade_from_user_releases_references(self):
+        key = self.attach(b'cascaded id photo', 2)
+        # The cascade also visits the unmanaged watch_vitals table, which tests do not create
+        sql, params = connection.schema_editor().table_sql(apps.get_model('myapp', 'WatchVitals'))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.delete()
+        self.assertIsNone(self.ref_count(key))
+        self.assertFalse(self.store.exists(key))
+
+    def test_blob_used_as_a_profile_photo_is_kept(self):
+        key = self.attach(b'photo bytes', 1)
+        UserProfile.objects.create(
+            user=User.objects.create(username='patient2', email='patient2@example.com', role='patient'),
+            first_name='Bo', last_name='Lim', photo_variants={'original': key},
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.all().delete()
+        self.assertIsNone(self.ref_count(key))
+        self.assertTrue(self.store.exists(key))
+
+    def test_freed_keys_are_checked_in_one_query_per_table(self):
+        keys = [self.attach(f'id photo {i}'.encode(), 1) for i in range(5)]
+        UserProfile.objects.create(
+            user=User.objects.create(username='patient2', email='patient2@example.com', role='patient'),
+            first_name='Bo', last_name='Lim', photo_variants={'original': keys[0], '64': keys[1]},
+        )
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            release_attachments(keys)
+        selects = [q['sql'] for q in queries if 'user_profiles' in q['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual([self.store.exists(key) for key in keys], [True, True, False, False, False])
+
+
+class SignatureImageTests(BlobStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        doctor_user = User.objects.create(username='doctor1', email='doctor1@example.com', role='doctor')
+        self.doctor = Doctor.objects.create(
+            user=doctor_user, specialization='GP', license_number='L-1', years_of_experience=3, contact_info='-',
+        )
+        self.signature = DoctorSignature.objects.record(self.doctor, png_bytes(color='black'))
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, consultation_type='F2F', consultation_date=date(2026, 1, 5),
+            consultation_time='09:00',
+        )
+        Prescription.objects.create(
+            live_appointment=LiveAppointment.objects.create(appointment=appointment), prescription_number='RX-1',
+            signature=self.signature,
+        )
+        self.url = f'/doctors/signature/{self.signature.pk}/'
+
+    def sign_in(self, **values):
+        session = self.client.session
+        session.update(values)
+        session.save()
+
+    def test_signing_doctor_and_prescription_holder_can_view(self):
+        self.sign_in(user=self.patient.user_id)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.store.read(self.signature.key))
+
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_admin_can_view(self):
+        self.sign_in(user=self.patient.user_id, is_admin=True)
+        Prescription.objects.all().delete()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_everyone_else_gets_not_found(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        stranger = User.objects.create(username='patient2', email='patient2@example.com', role='patient')
+        self.sign_in(user=stranger.user_id)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        other_doctor = User.objects.create(username='doctor2', email='doctor2@example.com', role='doctor')
+        self.client.force_login(other_doctor)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+def png_bytes(size=(40, 30), color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ProfilePhotoTests(BlobStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile = UserProfile.objects.create(user=self.patient, first_name='Ana', last_name='Cruz')
+        save_profile_photo(self.profile, png_bytes(), 'image/png')
+        self.profile.save()
+        self.url = f'/profile-photo/{self.profile.profile_id}/64/'
+
+    def sign_in(self, user):
+        session = self.client.session
+        session['user'] = user.user_id
+        session.save()
+
+    def make_doctor(self, username):
+        user = User.objects.create(username=username, email=f'{username}@example.com', role='doctor')
+        return Doctor.objects.create(
+            user=user, specialization='GP', license_number=username, years_of_experience=3, contact_info='-',
+        )
+
+    def test_upload_builds_every_size(self):
+        self.assertEqual(set(self.profile.photo_variants), {'original', *map(str, THUMBNAIL_SIZES)})
+        with Image.open(self.store.open(self.profile.photo_variants['160'])) as image:
+            self.assertEqual(image.size, (160, 160))
+        self.assertIn('?v=', self.profile.photo_thumbnail_url(64))
+
+    def test_only_owner_admins_and_treating_doctors_see_a_patient_photo(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        stranger = User.objects.create(username='patient2', email='patient2@example.com', role='patient')
+        self.sign_in(stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        doctor = self.make_doctor('doctor1')
+        self.sign_in(doctor.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        Appointment.objects.create(
+            patient=self.patient, doctor=doctor, consultation_type='F2F', consultation_date=date(2026, 1, 5),
+            consultation_time='09:00',
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.sign_in(self.patient)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_doctor_photos_are_visible_to_signed_in_users(self):
+        doctor = self.make_doctor('doctor1')
+        profile = UserProfile.objects.create(user=doctor.user, first_name='Jo', last_name='Reyes')
+        save_profile_photo(profile, png_bytes(color='blue'), 'image/png')
+        profile.save()
+        self.sign_in(self.patient)
+        self.assertEqual(self.client.get(f'/profile-photo/{profile.profile_id}/160/').status_code, 200)
+
+    def test_legacy_photo_is_not_converted_on_request(self):
+        legacy = UserProfile.objects.with_blobs().get(pk=self.profile.pk)
+        legacy.photo_url, legacy.photo_variants = 'data:image/png;base64,iVBORw0KGgo=', {}
+        legacy.save()
+        self.sign_in(self.patient)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.photo_variants, {})
+        self.assertIsNone(legacy.photo_thumbnail_url(64))
+
+    def test_listing_queries_stay_flat_for_profiles_without_thumbnails(self):
+        def list_doctors():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/consultations/').status_code, 200)
+            return len(queries)
+
+        def add_doctor(username, photo_url=None):
+            doctor = self.make_doctor(username)
+            UserProfile.objects.create(user=doctor.user, first_name='Jo', last_name=username, photo_url=photo_url)
+
+        add_doctor('doctor1')
+        baseline = list_doctors()
+        add_doctor('doctor2', photo_url='data:image/png;base64,iVBORw0KGgo=')
+        add_doctor('doctor3')
+        add_doctor('doctor4', photo_url='data:image/png;base64,iVBORw0KGgo=')
+        self.assertEqual(list_doctors(), baseline)
+        self.assertNotContains(self.client.get('/consultations/'), 'data:image/png;base64')
+
+class DistributionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+
+    def book(self, service_name, status='Pending'):
+        BookedService.objects.create(
+            user=self.user, service_name=service_name, status=status,
+            booking_date=date(2026, 1, 5), booking_time='09:00',
+        )
+
+    def test_zero_fills_choices_in_one_query(self):
+        self.book('X-ray', status='Confirmed')
+        with self.assertNumQueries(1):
+            counts = distribution(BookedService, 'status')
+        self.assertEqual(counts, {'Pending': 0, 'Confirmed': 1, 'Completed': 0, 'Cancelled': 0})
+
+    def test_open_ended_values_are_counted_most_frequent_first(self):
+        for name in ['MRI', 'X-ray', 'X-ray']:
+            self.book(name)
+        self.assertEqual(list(distribution(BookedService, 'service_name').items()), [('X-ray', 2), ('MRI', 1)])
+        self.assertEqual(distribution(BookedService, 'service_name', {'service_name': 'MRI'}), {'MRI': 1})
+
+
+
+class KpiTests(TestCase):
+    def setUp(self):
+        for i, (role, active) in enumerate([('patient', True), ('patient', False), ('doctor', True)]):
+            User.objects.create(username=f'user{i}', email=f'user{i}@example.com', role=role, is_active=active)
+
+    def test_all_counts_for_a_table_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = aggregate_counts(User.objects.all(), {
+                'total': None,
+                'active': Q(is_active=True),
+                'roles': by_value('role', ['patient', 'doctor', 'admin'], Q(is_active=True)),
+            })
+        self.assertEqual(counts, {'total': 3, 'active': 2, 'roles': {'patient': 1, 'doctor': 1, 'admin': 0}})
+
+    def test_collect_kpis_runs_one_query_per_table(self):
+        User.objects.filter(username='user0').update(date_joined=timezone.now() - timedelta(days=40))
+        start = timezone.now() - timedelta(days=30)
+        with self.assertNumQueries(len(KPI_TABLES)):
+            kpis = collect_kpis(start)
+        self.assertEqual(
+            {key: kpis['users'][key] for key in ('total', 'active', 'inactive', 'in_window')},
+            {'total': 3, 'active': 2, 'inactive': 1, 'in_window': 2},
+        )
+        self.assertEqual(kpis['users']['roles']['patient'], 2)
+        self.assertEqual(kpis['prescriptions'], {'total': 0, 'in_window': 0})
+
+
+class TimeSeriesTests(TestCase):
+    def test_calendar_buckets(self):
+        self.assertEqual(
+            calendar_buckets('month', date(2026, 2, 15), 4),
+            [date(2026, 2, 1), date(2026, 1, 1), date(2025, 12, 1), date(2025, 11, 1)],
+        )
+        self.assertEqual(calendar_buckets('week', date(2026, 1, 1), 2), [date(2025, 12, 29), date(2025, 12, 22)])
+        self.assertEqual(next_bucket('month', date(2025, 12, 1)), date(2026, 1, 1))
+
+    def test_monthly_trend_is_zero_filled_by_calendar_month(self):
+        user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        buckets = calendar_buckets('month', timezone.localdate(), 4)
+        for month, copies in ((buckets[1], 1), (buckets[3], 2)):
+            LabResult.objects.bulk_create([LabResult(user=user, lab_type='CBC') for _ in range(copies)])
+            LabResult.objects.filter(upload_date__date=timezone.localdate()).update(
+                upload_date=timezone.make_aware(datetime.combine(month.replace(day=28), time(12))),
+            )
+        LabResult.objects.create(user=user, lab_type='CBC')
+        call_command('rebuild_rollups', stdout=StringIO())
+        trend = collect_kpis(timezone.now(), tables=(), trend_buckets=buckets, trends=('lab_results',))
+        self.assertEqual(trend['lab_results']['trend'], [
+            {'month': start.strftime('%Y-%m'), 'count': count} for start, count in zip(buckets, [1, 1, 0, 2])
+        ])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        self.day = date(2026, 1, 5)
+
+    def book(self, status='Pending'):
+        return BookedService.objects.create(
+            user=self.user, service_name='MRI', status=status, booking_date=self.day, booking_time='09:00',
+        )
+
+    def counts(self):
+        return rollup_counts('booked_services', 'status', self.day, self.day + timedelta(days=1))
+
+    def test_signals_keep_rollups_current(self):
+        first = self.book()
+        self.book()
+        self.assertEqual(self.counts(), {'Pending': 2})
+        first.status = 'Completed'
+        first.save()
+        self.assertEqual(self.counts(), {'Pending': 1, 'Completed': 1})
+        first.delete()
+        self.assertEqual(self.counts(), {'Pending': 1})
+        self.assertEqual(rollup_total('booked_services', self.day), 1)
+
+    def test_rebuild_reconciles_bulk_updates(self):
+        self.book()
+        BookedService.objects.update(status='Cancelled')  # no signals
+        self.assertEqual(self.counts(), {'Pending': 1})
+        rebuild(['booked_services'])
+        self.assertEqual(self.counts(), {'Cancelled': 1})
+
+    def test_failed_update_is_logged_and_leaves_the_transaction_usable(self):
+        with mock.patch('myapp.utils.rollups._bump', side_effect=DatabaseError('boom')), \
+                self.assertLogs('myapp.utils.rollups', 'ERROR') as logs:
+            self.book()
+        self.assertIn('rebuild_rollups will reconcile', logs.output[0])
+        self.assertEqual(BookedService.objects.count(), 1)
+        self.assertEqual(self.counts(), {})
+
+
+class SeriesStatsTests(TestCase):
+    def test_describe_series(self):
+        stats = describe([4, 0, 5, 30], series=True)
+        self.assertEqual((stats['count'], stats['mean'], stats['median'], stats['min']), (4, 9.75, 4.5, 0))
+        self.assertEqual(stats['growth_rates'], [-100.0, None, 500.0])
+        self.assertEqual(stats['moving_average'], [3.0, 11.67])
+        self.assertEqual(describe([]), {})
+
+    def test_prescription_series_keeps_empty_months(self):
+        doctor_user = User.objects.create(username='doctor1', email='doctor1@example.com', role='doctor')
+        doctor = Doctor.objects.create(
+            user=doctor_user, specialization='GP', license_number='L-1', years_of_experience=3, contact_info='-',
+        )
+        patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, consultation_type='F2F', consultation_date=date(2026, 1, 5),
+            consultation_time='09:00',
+        )
+        Prescription.objects.create(
+            live_appointment=LiveAppointment.objects.create(appointment=appointment), prescription_number='RX-1',
+        )
+        stats = _analytics_context('month', None, 'consultations')['prescriptions_stats']
+        self.assertEqual((stats['count'], stats['total'], stats['max']), (6, 1, 1))
+        self.assertEqual(stats['growth_rates'], [None] * 5)
+
+class AnalyticsApiQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+
+    def count_queries(self):
+        cache.clear()  # analytics payloads are cached; measure a cold build
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/analytics/')
+        self.assertEqual(response.status_code, 200)
+        self.captured = queries.captured_queries
+        return len(queries)
+
+    def assert_no_rollup_source_scans(self, queries):
+        """None of ``queries`` reads a whole table the daily rollups cover."""
+        sources = ('users', 'appointments', 'booked_services', 'lab_results', 'prescriptions')
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+                for table in sources:
+                    self.assertNotRegex(plan, rf'\bSCAN (TABLE )?{table}\b', query['sql'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads the SQLite query plan')
+    def test_page_and_api_read_rollups_instead_of_scanning(self):
+        doctor = Doctor.objects.create(
+            user=User.objects.create(username='doctor1', email='doctor1@example.com', role='doctor'),
+            specialization='GP', license_number='L-1', years_of_experience=3, contact_info='-',
+        )
+        appointment = Appointment.objects.create(
+            patient=self.user, doctor=doctor, consultation_type='F2F', consultation_date=date(2026, 1, 5),
+            consultation_time='09:00', status='Completed',
+        )
+        Prescription.objects.create(
+            live_appointment=LiveAppointment.objects.create(appointment=appointment), prescription_number='RX-1',
+            doctor=doctor,
+        )
+        LabResult.objects.create(user=self.user, lab_type='CBC', file_type='text/plain', file_name='a.txt')
+        BookedService.objects.create(user=self.user, service_name='MRI', booking_date=date(2026, 1, 5), booking_time='09:00')
+
+        self.count_queries()
+        self.assert_no_rollup_source_scans(self.captured)
+        for doctor_sort in ('consultations', 'specialization'):
+            with CaptureQueriesContext(connection) as queries:
+                context = _analytics_context('month', 'month', doctor_sort)
+            self.assert_no_rollup_source_scans(queries.captured_queries)
+        self.assertEqual(
+            (context['total_users'], context['active_users'], context['total_consultations'],
+             context['total_completed_consultations']),
+            (2, 2, 1, 1),
+        )
+        self.assertEqual(json.loads(context['lab_results_type_distribution']), {'CBC': 1})
+        self.assertEqual(json.loads(context['prescriptions_doctor_distribution'])[0]['count'], 1)
+        self.assertEqual(json.loads(context['fields_distribution']), {'GP': 1})
+
+    def test_query_count_does_not_grow_with_distinct_services(self):
+        for i in range(2):
+            BookedService.objects.create(user=self.user, service_name=f'Service {i}', booking_date=date(2026, 1, 5), booking_time='09:00')
+        few = self.count_queries()
+        for i in range(2, 20):
+            BookedService.objects.create(user=self.user, service_name=f'Service {i}', booking_date=date(2026, 1, 5), booking_time='09:00')
+        many = self.count_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(self.client.get('/api/analytics/').json()['booked_services_service_distribution']), 20)
+
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return {'build': self.builds}
+
+    def payload(self, sources=analytics_cache.SOURCE_MODELS, **params):
+        return analytics_cache.cached_payload('test', params or {'timeframe': 'month'}, self.build, sources)
+
+    def test_payload_is_reused_until_a_source_model_changes(self):
+        self.assertEqual(self.payload(), {'build': 1})
+        self.assertEqual(self.payload(), {'build': 1})
+        self.assertEqual(self.payload(timeframe='week'), {'build': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            LabResult.objects.create(user=self.user, lab_type='CBC')
+        self.assertEqual(self.payload(), {'build': 3})
+
+    def test_changes_to_other_models_keep_the_payload(self):
+        self.payload(sources=('LabResult',))
+        with self.captureOnCommitCallbacks(execute=True):
+            BookedService.objects.create(
+                user=self.user, service_name='MRI', booking_date=date(2026, 1, 5), booking_time='09:00',
+            )
+        self.assertEqual(self.payload(sources=('LabResult',)), {'build': 1})
+
+    def test_stats_endpoint(self):
+        self.payload()
+        self.payload()
+        self.assertEqual(self.client.get('/api/analytics/cache-stats/').status_code, 403)
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+        stats = self.client.get('/api/analytics/cache-stats/').json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 50.0))
+        self.assertEqual(set(stats['versions']), set(analytics_cache.SOURCE_MODELS))
+
+class AnalyticsExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        for day in [date(2026, 1, 5), date(2026, 2, 5)]:
+            BookedService.objects.create(user=user, service_name='MRI', booking_date=day, booking_time='09:00')
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+
+    def test_streams_selected_fields_for_date_range(self):
+        response = self.client.get('/api/analytics/export/booked_services/', {
+            'format': 'ndjson', 'start': '2026-02-01', 'end': '2026-02-28', 'fields': 'service_name,booking_date',
+        })
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{'service_name': 'MRI', 'booking_date': '2026-02-05'}])
+
+    async def test_streams_asynchronously_under_asgi(self):
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get('/api/analytics/export/booked_services/', {'fields': 'booking_date'})
+        self.assertTrue(response.is_async)
+        body = b''.join([part async for part in response.streaming_content]).decode()
+        self.assertEqual(body.splitlines(), ['booking_date', '2026-01-05', '2026-02-05'])
+
+    def test_rejects_fields_outside_the_whitelist(self):
+        response = self.client.get('/api/analytics/export/lab_results/', {'fields': 'result_file'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AnalyticsStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+
+    def test_streams_deltas_published_by_saves(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = BookedService.objects.create(user=self.user, service_name='MRI', booking_date=date(2026, 1, 5), booking_time='09:00')
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'Confirmed'
+            booking.save()
+
+        response = self.client.get('/api/analytics/stream/', {'last_id': 1})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = iter(response.streaming_content)
+        self.assertEqual(next(frames), b'retry: 1000\n\n')
+        frame = next(frames).decode()
+        self.assertTrue(frame.startswith('id: 2\nevent: delta\n'))
+        event = json.loads(frame.split('data: ', 1)[1])
+        self.assertEqual(event['metric'], 'booked_services')
+        self.assertCountEqual(
+            [(c['dimension'], c['value'], c['delta']) for c in event['changes']],
+            [('status', 'Pending', -1), ('status', 'Confirmed', 1)],
+        )
+        response.close()
+
+    def test_publish_returns_the_id_it_reserved(self):
+        self.assertEqual(live_events.publish('users', [{'delta': 1}]), 1)
+        incr = cache.incr
+
+        def incr_racing_another_writer(key, delta=1):
+            value = incr(key, delta)
+            incr(key, delta)  # another process publishes before this one reads the counter
+            return value
+
+        with mock.patch.object(cache, 'incr', incr_racing_another_writer):
+            self.assertEqual(live_events.publish('users', [{'delta': 2}]), 2)
+        self.assertEqual([event['id'] for event in live_events.events_since(0)], [1, 2])
+
+
+class AnalyticsBenchmarkTests(TestCase):
+    def test_generates_data_and_reports_each_endpoint(self):
+        call_command('generate_analytics_data', appointments=40, patients=8, doctors=2, stdout=StringIO())
+        self.assertEqual(Appointment.objects.count(), 40)
+
+        cache.set('unrelated', 'kept')
+        out = StringIO()
+        call_command('benchmark_analytics', endpoint=['analytics_api'], repeat=1, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(cache.get('unrelated'), 'kept')  # only analytics payloads are invalidated
+        self.assertFalse(Session.objects.exists())  # the benchmark's admin session is deleted
+        self.assertEqual(report['rows']['Appointment'], 40)
+        self.assertEqual(report['endpoints']['analytics_api']['cold']['status'], 200)
+        self.assertGreater(report['endpoints']['analytics_api']['cold']['queries'], 0)
+
+
+class CohortTests(TestCase):
+    def setUp(self):
+        doctor_user = User.objects.create(username='doc1', email='doc1@example.com', role='doctor')
+        self.doctor = Doctor.objects.create(
+            user=doctor_user, specialization='Pediatrics', license_number='LIC-1', years_of_experience=5, contact_info='',
+        )
+        self.patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        self.other = User.objects.create(username='patient2', email='patient2@example.com', role='patient')
+
+    def visit(self, patient, day, status='Completed'):
+        Appointment.objects.create(
+            patient=patient, doctor=self.doctor, consultation_type='F2F', consultation_date=day,
+            consultation_time='09:00', approval_status='Approved', status=status,
+        )
+
+    def test_retention_cancellation_and_utilisation_matrices(self):
+        last_month = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+        self.visit(self.patient, last_month + timedelta(days=1))
+        self.visit(self.patient, last_month + timedelta(days=21))
+        self.visit(self.other, timezone.localdate(), status='Cancelled')
+
+        with self.assertNumQueries(5):
+            cohorts = collect_cohorts(2)
+
+        previous, current = cohorts['retention']
+        self.assertEqual(cohorts['months'], [previous['cohort'], current['cohort']])
+        self.assertEqual(previous['retained'], [1, 0])
+        self.assertEqual((previous['returned_30'], previous['return_rate_90']), (1, 100.0))
+        self.assertEqual(cohorts['cancellations'][1]['cancelled'], [1])
+        self.assertEqual(cohorts['utilisation'][0]['minutes'], [60, 0])
+        self.assertEqual(cohorts['utilisation'][0]['share'], [100.0, 0])
+
+    def test_month_without_minutes_has_no_share(self):
+        self.visit(self.patient, timezone.localdate())
+        Appointment.objects.update(duration_minutes=0)
+        cohorts = collect_cohorts(1)
+        self.assertEqual(cohorts['utilisation'][0]['minutes'], [0])
+        self.assertEqual(cohorts['utilisation'][0]['share'], [0])
+
+
+class ScheduleSummaryTests(TestCase):
+    def test_any_window_costs_two_queries(self):
+        user = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        for day in [date(2026, 1, 5), date(2026, 1, 5), date(2026, 3, 1)]:
+            BookedService.objects.create(user=user, service_name='MRI', booking_date=day, booking_time='09:00')
+
+        with self.assertNumQueries(2):
+            fortnight = summarise_schedule(date(2026, 1, 1))
+        with self.assertNumQueries(2):
+            quarter = summarise_schedule(date(2026, 1, 1), days=90)
+
+        self.assertEqual((len(fortnight), len(quarter)), (14, 90))
+        self.assertEqual(fortnight[4]['lab_count'], 2)
+        self.assertEqual(sum(day['lab_count'] for day in quarter), 3)
+        self.assertEqual(fortnight[4]['appt_link'], '/manage/consultations/?date=2026-01-05')
+
+
+class AdminTableTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        for i in range(5):
+            BookedService.objects.create(
+                user=self.patient, service_name='MRI' if i % 2 else 'X-ray', booking_date=date(2026, 1, 5),
+                booking_time=f'{i + 8:02d}:00',
+            )
+        session = self.client.session
+        session['is_admin'] = True
+        session.save()
+
+    def get(self, **params):
+        response = self.client.get('/api/admin/tables/booked_services/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_keyset_pages_cover_every_row_once(self):
+        first = self.get(limit=2, count=1)
+        self.assertEqual(first['total'], 5)
+        self.assertEqual([row['time'] for row in first['rows']], ['12:00:00', '11:00:00'])
+        ids = [row['id'] for row in first['rows']]
+        cursor = first['next']
+        while cursor:
+            page = self.get(limit=2, cursor=cursor)
+            self.assertNotIn('total', page)
+            ids += [row['id'] for row in page['rows']]
+            cursor = page['next']
+        self.assertEqual(sorted(ids), sorted(BookedService.objects.values_list('pk', flat=True)))
+
+    def test_search_filter_and_bad_input(self):
+        rows = self.get(search='mri', sort='date-asc')['rows']
+        self.assertEqual([row['time'] for row in rows], ['09:00:00', '11:00:00'])
+        self.assertEqual(self.get(date_from='2026-01-06')['rows'], [])
+        self.assertEqual(self.client.get('/api/admin/tables/booked_services/', {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/tables/secrets/').status_code, 404)
+
+
+# Counts queries against the models; keep the database cache's own queries out of them
+@override_settings(CACHES=LOCMEM_CACHES)
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spawned = []
+        patcher = mock.patch('myapp.utils.snapshots._spawn', self.spawned.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stale_snapshot_is_served_while_one_refresh_runs(self):
+        with self.assertNumQueries(7):
+            self.assertEqual(dashboard_kpis()['total_users'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_kpis()['total_users'], 0)
+            self.assertEqual(dashboard_kpis()['total_users'], 0)
+        self.assertEqual(len(self.spawned), 1)  # single flight: the second read found the lock taken
+
+        self.spawned[0]()
+        self.assertEqual(dashboard_kpis()['total_users'], 1)
+        self.assertEqual(len(self.spawned), 1)
+
+
+class ActivityFeedTests(TestCase):
+    def test_log_and_sources_merge_in_one_query(self):
+        patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+        BookedService.objects.create(user=patient, service_name='MRI', booking_date=date(2026, 1, 5), booking_time='09:00')
+        record_event('login', 'Login: patient1', 'patient1@example.com', user=patient)
+        record_event('login', 'Login: patient1', 'patient1@example.com', user=patient)  # duplicate signal
+        self.assertEqual(ActivityEvent.objects.count(), 2)  # recorded as is, shown once
+
+        with self.assertNumQueries(1):
+            activities = recent_activity(8)
+        self.assertEqual([a['summary'] for a in activities], ['Login: patient1', 'Service: MRI (patient1)'])
+        self.assertEqual(activities[1]['detail'], 'Pending')
+
+        record_event('clear', 'Recent activity cleared')
+        self.assertEqual([a['type'] for a in recent_activity(8)], ['ServiceBooking'])
+
+    def test_prune_keeps_recent_events(self):
+        record_event('login', 'Login: old')
+        ActivityEvent.objects.update(created_at=timezone.now() - timedelta(days=120))
+        record_event('login', 'Login: new')
+        call_command('prune_activity_events', stdout=StringIO())
+        self.assertEqual(list(ActivityEvent.objects.values_list('summary', flat=True)), ['Login: new'])
+
+
+# Counts queries against the models; keep the database cache's own queries out of them
+@override_settings(CACHES=LOCMEM_CACHES)
+class FragmentCacheTests(TestCase):
+    TEMPLATE = (
+        '{% load fragments %}{% cachefragment "bookings" "BookedService" day %}'
+        '{% for booking in bookings %}{{ booking.service_name }} {% endfor %}{% endcachefragment %}'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create(username='patient1', email='patient1@example.com', role='patient')
+
+    def render(self, day=date(2026, 1, 5)):
+        bookings = BookedService.objects.filter(booking_date=day).order_by('booking_time')
+        return Template(self.TEMPLATE).render(Context({'bookings': bookings, 'day': day}))
+
+    def book(self, service_name):
+        with self.captureOnCommitCallbacks(execute=True):
+            BookedService.objects.create(
+                user=self.patient, service_name=service_name, booking_date=date(2026, 1, 5), booking_time='09:00',
+            )
+
+    def test_fragment_renders_once_per_change(self):
+        self.book('MRI')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render(), 'MRI ')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), 'MRI ')
+        self.assertEqual(self.render(date(2026, 1, 6)), '')  # varies on the day
+
+        self.book('X-ray')
+        self.assertEqual(self.render(), 'MRI X-ray ')
+        counts = fragment_cache.stats()['fragments']['bookings']
+        self.assertEqual((counts['hits'], counts['misses'], counts['hit_rate']), (1, 3, 25.0))
+
+    def test_unknown_source_model_is_a_syntax_error(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load fragments %}{% cachefragment "x" "Invoice" %}{% endcachefragment %}')
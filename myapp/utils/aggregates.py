@@ -0,0 +1,97 @@
+"""Single-query conditional counts.
+
+``aggregate_counts`` evaluates any number of filtered ``COUNT``s over one
+queryset in a single ``SELECT``, using ``COUNT(*) FILTER (WHERE ...)`` on
+PostgreSQL (and an equivalent ``CASE`` on other backends)::
+
+    aggregate_counts(User.objects.all(), {
+        'total': None,
+        'active': Q(is_active=True),
+        'roles': by_value('role', ['admin', 'doctor']),
+    })
+    # {'total': 12, 'active': 11, 'roles': {'admin': 1, 'doctor': 4}}
+
+Adding a KPI adds a column to the query, not another round-trip.
+
+``distribution`` is the GROUP BY counterpart for open-ended value sets
+(service names, lab types, ...): one ``values().annotate(Count)`` query,
+zero-filled with the values that must always appear.
+"""
+from django.db.models import Count, Q
+
+
+def aggregate_counts(queryset, spec):
+    """Count every condition in ``spec`` over ``queryset`` in one query.
+
+    ``spec`` maps names to a ``Q`` (rows matching it), ``None`` or an empty
+    ``Q`` (all rows) or a nested dict of the same shape. Returns the same shape with integers.
+    """
+    aggregates, slots = {}, []
+
+    def collect(node, out):
+        for name, condition in node.items():
+            if isinstance(condition, dict):
+                out[name] = {}
+                collect(condition, out[name])
+                continue
+            # Generated aliases: the names may hold characters like "A+"
+            alias = f'kpi_{len(slots)}'
+            aggregates[alias] = Count('pk', filter=condition) if condition else Count('pk')
+            slots.append((alias, out, name))
+
+    result = {}
+    collect(spec, result)
+    row = queryset.aggregate(**aggregates) if aggregates else {}
+    for alias, out, name in slots:
+        out[name] = row[alias] or 0
+    return result
+
+
+def window(field, start=None, end=None):
+    """``Q`` for ``start <= field < end``; either bound may be omitted."""
+    condition = Q()
+    if start is not None:
+        condition &= Q(**{f'{field}__gte': start})
+    if end is not None:
+        condition &= Q(**{f'{field}__lt': end})
+    return condition
+
+
+def by_value(field, values, condition=None):
+    """``{value: Q(field=value)}`` for each of ``values``, optionally ANDed with ``condition``."""
+    return {
+        value: Q(**{field: value}) & condition if condition is not None else Q(**{field: value})
+        for value in values
+    }
+
+
+def distribution(model, field, filters=None, values=None, unknown=None):
+    """``{value: count}`` of ``field`` over ``model`` in one ``GROUP BY``.
+
+    ``model`` is a model class or queryset; ``filters`` a ``Q`` or a dict of
+    lookups. Every entry of ``values`` (default: the field's choices) is
+    present, zero when no row has it; values found in the data but not
+    listed follow, most frequent first. Rows with an empty value are counted
+    under ``unknown``, or left out when it is ``None``.
+    """
+    queryset = model._default_manager.all() if isinstance(model, type) else model
+    if isinstance(filters, Q):
+        queryset = queryset.filter(filters)
+    elif filters:
+        queryset = queryset.filter(**filters)
+    if values is None:
+        try:
+            values = [choice for choice, _ in queryset.model._meta.get_field(field).flatchoices]
+        except Exception:
+            # Related lookups ('doctor__specialization') have no choices to fill from
+            values = []
+    counts = dict.fromkeys(values, 0)
+    rows = queryset.values(field).annotate(distribution_count=Count('pk')).order_by('-distribution_count')
+    for row in rows:
+        value = row[field]
+        if value in (None, ''):
+            if unknown is None:
+                continue
+            value = unknown
+        counts[value] = counts.get(value, 0) + row['distribution_count']
+    return counts
@@ -0,0 +1,106 @@
+"""Versioned cache for analytics payloads.
+
+Each source model has a data-version counter in the cache, bumped from
+``post_save``/``post_delete`` once the write commits. Cached payloads are
+keyed by their parameters *and* the current versions of the models they
+read, so a payload is reused until one of those tables actually changes;
+a bump simply makes new keys and the old entries expire on their own.
+``ANALYTICS_CACHE_TIMEOUT`` (seconds) bounds how long a payload is reused
+when nothing changes, since "last N days" windows still move with time.
+
+Versions live in the default cache, so every process that writes must
+share it with the processes that read (``CACHES`` in settings: Redis, or
+the database cache).
+"""
+import hashlib
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+SOURCE_MODELS = (
+    'User', 'UserProfile', 'Patient', 'Doctor',
+    'Appointment', 'LiveAppointment', 'BookedService', 'LabResult', 'Prescription',
+)
+
+VERSION_KEY = 'analytics:version:{}'
+STATS_KEYS = {'hits': 'analytics:cache:hits', 'misses': 'analytics:cache:misses'}
+
+
+def _fresh_version():
+    # Starts from the clock so a counter lost on eviction never repeats an old version
+    return time.time_ns()
+
+
+def bump(model_name):
+    """Invalidate every payload that reads ``model_name``."""
+    key = VERSION_KEY.format(model_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def versions(model_names=SOURCE_MODELS):
+    """``{model_name: version}``, initialising missing counters."""
+    keys = {VERSION_KEY.format(name): name for name in model_names}
+    found = cache.get_many(list(keys))
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+    return {name: found[key] for key, name in keys.items()}
+
+
+def _count(stat):
+    key = STATS_KEYS[stat]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def cached_payload(name, params, build, sources=SOURCE_MODELS):
+    """Return ``build()`` for ``name``/``params``, reusing it while ``sources`` are unchanged."""
+    current = versions(sources)
+    fingerprint = repr((sorted(params.items()), sorted(current.items())))
+    key = f'analytics:{name}:{hashlib.sha256(fingerprint.encode()).hexdigest()}'
+    payload = cache.get(key)
+    if payload is not None:
+        _count('hits')
+        return payload
+    _count('misses')
+    payload = build()
+    cache.set(key, payload, getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 300))
+    return payload
+
+
+def stats():
+    """Hit/miss counters since the cache was last cleared."""
+    counts = cache.get_many(list(STATS_KEYS.values()))
+    hits = counts.get(STATS_KEYS['hits'], 0)
+    misses = counts.get(STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 2) if total else 0,
+        'versions': versions(),
+    }
+
+
+def _on_change(sender, **kwargs):
+    name = sender.__name__
+    transaction.on_commit(lambda: bump(name))
+
+
+def connect():
+    for name in SOURCE_MODELS:
+        model = apps.get_model('myapp', name)
+        uid = f'analytics_cache:{name}'
+        post_save.connect(_on_change, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_change, sender=model, dispatch_uid=uid)
@@ -0,0 +1,121 @@
+"""Reference-counted attachments.
+
+Several rows can point at the same blob store file (for example one
+password reset ID photo shared by a notification per admin). Each file has
+an ``Attachment`` row whose ``ref_count`` is raised by
+``acquire_attachment()`` and lowered by ``release_attachments()``; the blob
+is deleted once the count reaches zero and no other table still uses it.
+
+Deleting a notification, directly or through a cascade from its user,
+releases its reference from a ``post_delete`` signal (see ``connect()``).
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete
+
+from .blob_store import get_blob_store
+
+
+def acquire_attachment(uploaded, references=1):
+    """Store the uploaded file once and add ``references`` to it.
+
+    Returns the ``Attachment``. ``uploaded`` is a Django ``UploadedFile``; it
+    is streamed into the blob store chunk by chunk.
+    """
+    from ..models import Attachment
+
+    store = get_blob_store()
+    content_type = uploaded.content_type or 'application/octet-stream'
+    key, size = store.save_stream(uploaded.chunks(), content_type)
+    with transaction.atomic():
+        attachment, _ = Attachment.objects.select_for_update().get_or_create(
+            key=key, defaults={'content_type': content_type, 'size': size},
+        )
+        # A concurrent release may have removed the blob between the save and the lock
+        if not store.exists(key):
+            uploaded.seek(0)
+            store.save_stream(uploaded.chunks(), content_type)
+        Attachment.objects.filter(key=key).update(ref_count=F('ref_count') + references)
+    attachment.refresh_from_db()
+    return attachment
+
+
+def add_references(key, content_type, size, references=1):
+    """Record ``references`` more rows pointing at a blob that is already stored."""
+    from ..models import Attachment
+
+    with transaction.atomic():
+        Attachment.objects.get_or_create(key=key, defaults={'content_type': content_type, 'size': size})
+        Attachment.objects.filter(key=key).update(ref_count=F('ref_count') + references)
+
+
+def _used_elsewhere(keys):
+    """Return the subset of ``keys`` still used by a table outside ``Attachment``.
+
+    Blobs are content-addressed, so an identical lab result or prescription
+    file or profile photo shares the key without holding an attachment
+    reference. Runs one query per table whatever the number of keys.
+    """
+    from ..models import DoctorSignature, LabResult, Prescription, UserProfile
+
+    keys = set(keys)
+    if not keys:
+        return set()
+    used = set(LabResult.objects.filter(file_key__in=keys).values_list('file_key', flat=True))
+    for file_key, signature_key in Prescription.objects.filter(
+        Q(file_key__in=keys) | Q(signature_key__in=keys)
+    ).values_list('file_key', 'signature_key'):
+        used.update((file_key, signature_key))
+    used.update(DoctorSignature.objects.filter(key__in=keys).values_list('key', flat=True))
+    # Keys are hex digests, so matching the serialised variants cannot hit a size name
+    photo_filter = Q()
+    for key in keys:
+        photo_filter |= Q(photo_variants__icontains=key)
+    for variants in UserProfile.objects.filter(photo_filter).values_list('photo_variants', flat=True):
+        used.update((variants or {}).values())
+    return used & keys
+
+
+def release_attachments(keys):
+    """Drop one reference per item in ``keys``; free blobs nobody uses.
+
+    Keys without an ``Attachment`` row are left alone. Blobs are deleted
+    only after the surrounding transaction commits.
+    """
+    from ..models import Attachment
+
+    counts = Counter(key for key in keys if key)
+    if not counts:
+        return []
+
+    store = get_blob_store()
+    with transaction.atomic():
+        by_count = {}
+        for key, count in counts.items():
+            by_count.setdefault(count, []).append(key)
+        for count, same in by_count.items():
+            Attachment.objects.filter(key__in=same).update(ref_count=F('ref_count') - count)
+        orphans = list(
+            Attachment.objects.select_for_update()
+            .filter(key__in=list(counts), ref_count__lte=0)
+            .values_list('key', flat=True)
+        )
+        Attachment.objects.filter(key__in=orphans).delete()
+        used = _used_elsewhere(orphans)
+        freed = [key for key in orphans if key not in used]
+        for key in freed:
+            transaction.on_commit(lambda key=key: store.delete(key))
+    return freed
+
+
+def _on_notification_deleted(sender, instance, **kwargs):
+    if instance.file_key:
+        release_attachments([instance.file_key])
+
+
+def connect():
+    from ..models import Notification
+
+    post_delete.connect(_on_notification_deleted, sender=Notification, dispatch_uid='attachments:Notification')
@@ -0,0 +1,204 @@
+"""Compression codecs for blobs at rest.
+
+A compressed blob starts with a 16-byte header::
+
+    MAGIC (7 bytes) | codec (1 byte) | decompressed size (8 bytes, big-endian)
+
+followed by the compressed stream. Blobs without the header are stored as-is
+(uncompressed uploads, content that did not shrink, and blobs written before
+compression existed), so the header doubles as the per-blob codec flag.
+
+``zlib`` is always available; ``zstd`` is used when the optional
+``zstandard`` package is installed. Content that is already compressed
+(JPEG, PNG, WebP, ZIP, ...) is detected by MIME type or magic bytes and
+stored without a codec.
+"""
+import io
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+MAGIC = b'\x00MSBLOB'
+HEADER_SIZE = len(MAGIC) + 1 + 8
+
+CODEC_ZLIB = b'z'
+CODEC_ZSTD = b's'
+CODEC_NAMES = {CODEC_ZLIB: 'zlib', CODEC_ZSTD: 'zstd'}
+
+# Keep the compressed copy only if it saves at least this fraction
+MIN_SAVINGS = 0.1
+
+PRECOMPRESSED_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic', 'image/avif',
+    'application/zip', 'application/gzip', 'application/x-7z-compressed',
+    'video/mp4', 'audio/mpeg',
+}
+_PRECOMPRESSED_MAGIC = (
+    b'\xff\xd8\xff',       # JPEG
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'GIF8',               # GIF
+    b'PK\x03\x04',         # ZIP / DOCX / XLSX
+    b'\x1f\x8b',           # gzip
+    b'\x28\xb5\x2f\xfd',   # zstd
+)
+
+
+def default_codec(setting='auto'):
+    """Resolve the ``BLOB_STORE_COMPRESSION`` setting to a codec byte or None."""
+    if setting in (None, '', 'none'):
+        return None
+    if setting == 'zstd' or (setting == 'auto' and zstandard is not None):
+        if zstandard is None:
+            raise ValueError("BLOB_STORE_COMPRESSION=zstd requires the zstandard package")
+        return CODEC_ZSTD
+    if setting in ('zlib', 'auto'):
+        return CODEC_ZLIB
+    raise ValueError(f"Unknown BLOB_STORE_COMPRESSION: {setting}")
+
+
+def is_precompressed(content_type, head: bytes) -> bool:
+    """True if the content is already compressed and not worth recompressing."""
+    if content_type and content_type.split(';')[0].strip().lower() in PRECOMPRESSED_TYPES:
+        return True
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return True
+    return head.startswith(_PRECOMPRESSED_MAGIC)
+
+
+def compressor(codec):
+    """Return an object with ``compress(data)`` and ``flush()`` for ``codec``."""
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(6)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=6).compressobj()
+    raise ValueError(f"Unknown codec: {codec!r}")
+
+
+def _decompressor(codec):
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown codec: {codec!r}")
+
+
+def pack_header(codec, size: int) -> bytes:
+    return MAGIC + codec + struct.pack('>Q', size)
+
+
+def read_header(fh):
+    """Return ``(codec, decompressed_size)`` and leave ``fh`` after the header,
+    or ``(None, None)`` with ``fh`` rewound for blobs stored without a codec."""
+    head = fh.read(HEADER_SIZE)
+    if len(head) == HEADER_SIZE and head.startswith(MAGIC):
+        codec = head[len(MAGIC):len(MAGIC) + 1]
+        if codec in CODEC_NAMES:
+            return codec, struct.unpack('>Q', head[-8:])[0]
+    fh.seek(0)
+    return None, None
+
+
+class DecompressingReader(io.RawIOBase):
+    """Readable, seekable view of the decompressed content of a blob.
+
+    Decompression streams forward; seeking backwards restarts it from the
+    start of the compressed data, so Range requests stay correct.
+    """
+
+    def __init__(self, raw, codec, size, chunk_size=64 * 1024):
+        self._raw = raw
+        self._codec = codec
+        self._size = size
+        self._chunk_size = chunk_size
+        self._data_start = raw.tell()
+        self._restart()
+
+    def _restart(self):
+        self._raw.seek(self._data_start)
+        self._decompressor = _decompressor(self._codec)
+        self._buffer = b''
+        self._pos = 0      # position of the reader
+        self._decoded = 0  # bytes decompressed so far (end of _buffer)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        if pos < self._decoded - len(self._buffer):
+            self._restart()
+        self._pos = pos
+        return pos
+
+    def _fill(self):
+        """Decompress the next chunk into the buffer; False at end of stream."""
+        data = self._raw.read(self._chunk_size)
+        if not data:
+            return False
+        out = self._decompressor.decompress(data)
+        self._buffer += out
+        self._decoded += len(out)
+        return True
+
+    def readinto(self, buffer):
+        if self._pos >= self._size:
+            return 0
+        buffer_start = self._decoded - len(self._buffer)
+        # Skip forward to the read position, discarding what is behind it
+        while self._decoded <= self._pos:
+            self._buffer = b''
+            if not self._fill():
+                return 0
+            buffer_start = self._decoded - len(self._buffer)
+        if buffer_start < self._pos:
+            self._buffer = self._buffer[self._pos - buffer_start:]
+        while len(self._buffer) < len(buffer) and self._fill():
+            pass
+        chunk = self._buffer[:len(buffer)]
+        self._buffer = self._buffer[len(chunk):]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+
+def open_decoded(fh):
+    """Wrap a stored blob file object so reads return the original content."""
+    codec, size = read_header(fh)
+    if codec is None:
+        return fh
+    return DecompressingReader(fh, codec, size)
+
+
+def stat_encoded(fh, stored_size):
+    """Return ``(codec_name, original_size, stored_size)`` for a stored blob."""
+    codec, size = read_header(fh)
+    if codec is None:
+        return None, stored_size, stored_size
+    return CODEC_NAMES[codec], size, stored_size
@@ -0,0 +1,396 @@
+"""Content-addressed blob storage for uploaded files.
+
+Files are keyed by the SHA-256 of their content, so uploading the same file
+twice stores it once. Database rows keep only the key (plus size and MIME
+type) instead of a base64 copy of the file.
+
+Uploads can be stored with ``save_stream()``, which hashes and writes the
+file chunk by chunk so a request never holds the whole file in memory.
+
+Blobs are compressed at rest when that saves space (see ``blob_codecs``).
+The key is always the hash of the original content, and ``open()`` returns
+the original bytes, so callers never see the codec.
+
+Two backends are available and selected with ``settings.BLOB_STORE_BACKEND``:
+
+- ``local``: files live under ``settings.BLOB_STORE_ROOT`` (development)
+- ``supabase``: files live in the ``settings.SUPABASE_STORAGE_BUCKET_BLOBS``
+  bucket of Supabase Storage (production on Railway, whose disk is ephemeral).
+  Blobs are read through a short-lived signed URL with HTTP Range requests,
+  so a download only has one chunk in flight and a Range request only
+  fetches the bytes it asks for.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from . import blob_codecs
+
+SHA256_HEX_LENGTH = 64
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+SIGNED_URL_TTL = 300  # seconds; only needs to outlive the start of a read
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def compute_key(content: bytes) -> str:
+    """Return the storage key (SHA-256 hex digest) for ``content``."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_blob_key(value) -> bool:
+    """True if ``value`` looks like a blob store key rather than legacy data."""
+    if not isinstance(value, str) or len(value) != SHA256_HEX_LENGTH:
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def _key_path(key: str) -> str:
+    # Fan out into sub-directories so no single directory grows unbounded
+    return f"{key[:2]}/{key[2:4]}/{key}"
+
+
+class BlobNotFound(Exception):
+    """Raised when a key is not present in the blob store."""
+
+
+class BlobTooLarge(ValueError):
+    """Raised by ``save_stream()`` once a stream grows past ``max_size``."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        super().__init__(f"File exceeds the {max_size // (1024 * 1024)}MB limit")
+
+
+def _compression_codec():
+    return blob_codecs.default_codec(getattr(settings, 'BLOB_STORE_COMPRESSION', 'auto'))
+
+
+def _spool(chunks, directory=None, max_size=MAX_UPLOAD_SIZE, content_type=None):
+    """Write ``chunks`` to a temp file, hashing as they arrive.
+
+    Unless the content is already compressed, a compressed copy is written
+    alongside and kept instead of the raw copy when it is worth it.
+
+    Returns ``(tmp_path, key, size)`` where ``size`` is the original size.
+    The caller owns ``tmp_path``. Temp files are removed before
+    ``BlobTooLarge`` (or any other error) propagates.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    codec = _compression_codec()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    packed_path = packed = compressor = None
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if size == 0 and codec and not blob_codecs.is_precompressed(content_type, chunk[:16]):
+                    packed_fd, packed_path = tempfile.mkstemp(dir=directory, suffix='.part')
+                    packed = os.fdopen(packed_fd, 'wb')
+                    packed.write(blob_codecs.pack_header(codec, 0))
+                    compressor = blob_codecs.compressor(codec)
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise BlobTooLarge(max_size)
+                digest.update(chunk)
+                fh.write(chunk)
+                if compressor:
+                    packed.write(compressor.compress(chunk))
+        if compressor:
+            packed.write(compressor.flush())
+            # The header needs the original size, known only now
+            packed.seek(0)
+            packed.write(blob_codecs.pack_header(codec, size))
+            packed.close()
+            if os.path.getsize(packed_path) <= size * (1 - blob_codecs.MIN_SAVINGS):
+                os.replace(packed_path, tmp_path)
+            else:
+                os.remove(packed_path)
+    except BaseException:
+        if packed:
+            packed.close()
+        for path in (tmp_path, packed_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+class BlobStore:
+    """Interface shared by all blob store backends."""
+
+    def save(self, content: bytes, content_type=None) -> str:
+        """Store ``content`` and return its key. Saving existing content is a no-op."""
+        return self.save_stream([content], content_type, max_size=None)[0]
+
+    def save_stream(self, chunks, content_type=None, max_size=MAX_UPLOAD_SIZE):
+        """Store an iterable of byte chunks and return ``(key, size)``.
+
+        Only one chunk is held in memory at a time. Raises ``BlobTooLarge``
+        as soon as more than ``max_size`` bytes have been read.
+        """
+        raise NotImplementedError
+
+    def open(self, key: str):
+        """Return a readable binary file object with the original content of ``key``."""
+        return blob_codecs.open_decoded(self.open_stored(key))
+
+    def open_stored(self, key: str):
+        """Return the blob as stored (possibly compressed)."""
+        raise NotImplementedError
+
+    def stat(self, key: str):
+        """Return ``(codec_name, original_size, stored_size)``; codec is None
+        for blobs stored uncompressed."""
+        with self.open_stored(key) as fh:
+            fh.seek(0, io.SEEK_END)
+            stored_size = fh.tell()
+            fh.seek(0)
+            return blob_codecs.stat_encoded(fh, stored_size)
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def read(self, key: str) -> bytes:
+        with self.open(key) as fh:
+            return fh.read()
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs on the local filesystem under ``root``."""
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, _key_path(key))
+
+    def save_stream(self, chunks, content_type=None, max_size=MAX_UPLOAD_SIZE):
+        # Spool inside the store root so the final rename stays on one filesystem;
+        # readers never see partial blobs
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path, key, size = _spool(chunks, tmp_dir, max_size, content_type)
+        try:
+            target = self.path(key)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return key, size
+
+    def open_stored(self, key: str):
+        try:
+            return open(self.path(key), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SupabaseBlobStore(BlobStore):
+    """Stores blobs in a Supabase Storage bucket."""
+
+    def __init__(self, bucket, url=None, service_key=None):
+        self.bucket = bucket
+        self.url = url or settings.SUPABASE_URL
+        self.service_key = service_key or settings.SUPABASE_SERVICE_KEY
+        self._client = None
+
+    @property
+    def storage(self):
+        if self._client is None:
+            from supabase import create_client
+            self._client = create_client(self.url, self.service_key)
+        return self._client.storage.from_(self.bucket)
+
+    def save_stream(self, chunks, content_type=None, max_size=MAX_UPLOAD_SIZE):
+        # The key is only known once the whole stream is hashed, so spool to
+        # disk first and let the client upload from the file path
+        tmp_path, key, size = _spool(chunks, max_size=max_size, content_type=content_type)
+        try:
+            if not self.exists(key):
+                self.storage.upload(
+                    _key_path(key),
+                    tmp_path,
+                    file_options={
+                        'content-type': content_type or 'application/octet-stream',
+                        'upsert': 'true',
+                    },
+                )
+        finally:
+            os.remove(tmp_path)
+        return key, size
+
+    def open_stored(self, key: str):
+        try:
+            signed = self.storage.create_signed_url(_key_path(key), SIGNED_URL_TTL)
+        except Exception as e:
+            raise BlobNotFound(key) from e
+        url = signed.get('signedURL') or signed.get('signedUrl')
+        if not url:
+            raise BlobNotFound(key)
+        return RangeReader(url, self._http_client(), key=key)
+
+    def _http_client(self):
+        import httpx
+        return httpx.Client(timeout=httpx.Timeout(30.0, connect=10.0))
+
+    def exists(self, key: str) -> bool:
+        try:
+            return bool(self.storage.exists(_key_path(key)))
+        except Exception:
+            return False
+
+    def delete(self, key: str):
+        self.storage.remove([_key_path(key)])
+
+
+class RangeReader(io.RawIOBase):
+    """Readable, seekable view of a remote blob fetched with HTTP Range requests.
+
+    The response body is consumed one chunk at a time, so only the chunk being
+    read is held in memory. Seeking away from the current position re-issues
+    the request from the new offset instead of reading what lies in between.
+    """
+
+    def __init__(self, url, client, key=None, chunk_size=READ_CHUNK_SIZE):
+        self._url = url
+        self._client = client
+        self._key = key
+        self._chunk_size = chunk_size
+        self._size = None
+        self._pos = 0
+        self._response = None
+        self._chunks = None
+        self._ranged = True
+        self._stream_pos = 0  # offset of the next byte the response yields
+        self._chunk = b''     # last chunk received, kept for short rewinds
+        self._chunk_start = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            if self._size is None:
+                # The response headers carry the total size; keep the body
+                # open since callers usually rewind to read from the start
+                self._open(0)
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def _open(self, start):
+        self._close_response()
+        request = self._client.build_request('GET', self._url, headers={'Range': f'bytes={start}-'})
+        response = self._client.send(request, stream=True)
+        if response.status_code == 416:
+            # Range starts at or past the end: "Content-Range: bytes */<size>"
+            response.close()
+            self._size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+            self._chunks = iter(())
+            self._stream_pos = start
+            return
+        if response.status_code == 404:
+            response.close()
+            raise BlobNotFound(self._key)
+        response.raise_for_status()
+        self._response = response
+        self._chunks = response.iter_bytes(self._chunk_size)
+        if response.status_code == 206:
+            self._ranged = True
+            self._stream_pos = start
+            self._size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+        else:
+            # Range ignored: the body is the whole blob, skipped up to start
+            self._ranged = False
+            self._stream_pos = 0
+            self._size = int(response.headers['Content-Length'])
+
+    def readinto(self, buffer):
+        while not self._chunk_start <= self._pos < self._chunk_start + len(self._chunk):
+            if self._size is not None and self._pos >= self._size:
+                return 0
+            if (self._chunks is None or self._pos < self._stream_pos
+                    or (self._ranged and self._pos > self._stream_pos)):
+                self._open(self._pos)
+            chunk = next(self._chunks, b'')
+            if not chunk:
+                return 0
+            self._chunk, self._chunk_start = chunk, self._stream_pos
+            self._stream_pos += len(chunk)
+        offset = self._pos - self._chunk_start
+        data = self._chunk[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def _close_response(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+        self._chunks = None
+        self._chunk = b''
+        self._chunk_start = 0
+
+    def close(self):
+        if not self.closed:
+            self._close_response()
+            self._client.close()
+        super().close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Return the configured blob store (created once per process)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = getattr(settings, 'BLOB_STORE_BACKEND', 'local')
+                if backend == 'supabase':
+                    _store = SupabaseBlobStore(settings.SUPABASE_STORAGE_BUCKET_BLOBS)
+                elif backend == 'local':
+                    _store = LocalBlobStore(settings.BLOB_STORE_ROOT)
+                else:
+                    raise ValueError(f"Unknown BLOB_STORE_BACKEND: {backend}")
+    return _store
@@ -0,0 +1,303 @@
+"""Streaming, range-capable file downloads.
+
+Files are sent in fixed-size chunks instead of one ``HttpResponse`` body, so
+a worker never holds a whole decoded file in memory. Single-range ``Range``
+requests are honoured (206 Partial Content) so PDF viewers can seek.
+
+Legacy rows that still keep files as base64 text (bare or as a
+``data:<mime>;base64,`` URL) are wrapped in ``Base64Reader``, which decodes
+lazily and knows the decoded size up front, so ``Content-Length`` is set
+without decoding the file.
+
+Files kept in the blob store get a strong ``ETag`` (their SHA-256 key).
+Views call ``not_modified()`` before opening the blob so a revalidation
+costs one row lookup. URLs built with ``versioned_url()`` name the content
+they point at and are cached as immutable.
+
+Production runs under ASGI, where Django reads a synchronous iterator to
+the end before sending any of it. ``streaming_body()`` hands such
+responses an async iterator instead; see its docstring.
+"""
+import base64
+import io
+import re
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+VERSION_LENGTH = 16
+
+# Versioned URLs never change content; unversioned ones must revalidate every time
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+EXTENSION_MAP = {
+    'application/pdf': '.pdf',
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class Base64Reader(io.RawIOBase):
+    """Seekable binary reader that decodes a base64 string on demand.
+
+    Base64 maps every 4 characters to 3 bytes, so any byte offset can be
+    decoded from the matching 4-character group without touching the rest.
+    """
+
+    def __init__(self, encoded: str):
+        self._encoded = encoded
+        padding = len(encoded) - len(encoded.rstrip('='))
+        self._size = len(encoded) // 4 * 3 - padding
+        self._pos = 0
+
+    @classmethod
+    def open(cls, encoded: str):
+        """Return a reader for ``encoded``, falling back to a full decode for
+        payloads that are not canonical (line breaks, missing padding)."""
+        if len(encoded) % 4 == 0 and '\n' not in encoded and ' ' not in encoded:
+            return cls(encoded)
+        return io.BytesIO(base64.b64decode(encoded))
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        if self._pos >= self._size:
+            return 0
+        end = min(self._pos + len(buffer), self._size)
+        group_start = self._pos // 3
+        group_end = (end + 2) // 3
+        decoded = base64.b64decode(self._encoded[group_start * 4:group_end * 4])
+        skip = self._pos - group_start * 3
+        chunk = decoded[skip:skip + (end - self._pos)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+def open_data_url(data_url: str):
+    """Split a ``data:<mime>;base64,<payload>`` URL into ``(mime_type, reader)``.
+
+    Raises ``ValueError`` if ``data_url`` is not a base64 data URL.
+    """
+    if not data_url or not data_url.startswith('data:') or ',' not in data_url:
+        raise ValueError("Not a base64 data URL")
+    header, payload = data_url.split(',', 1)
+    mime_type = header[len('data:'):].split(';')[0] or 'application/octet-stream'
+    return mime_type, Base64Reader.open(payload)
+
+
+def blob_etag(key: str) -> str:
+    """Strong ETag for the blob stored under ``key``."""
+    return f'"{key}"'
+
+
+def versioned_url(url: str, key) -> str:
+    """Append the blob version to ``url`` so its response can be cached forever."""
+    if not key:
+        return url
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}v={key[:VERSION_LENGTH]}"
+
+
+def _set_cache_headers(response, request, key):
+    response['ETag'] = blob_etag(key)
+    if request.GET.get('v') == key[:VERSION_LENGTH]:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+
+
+def not_modified(request, key):
+    """Return a 304 response if ``If-None-Match`` already names ``key``.
+
+    Returns ``None`` when the file has to be sent (or has no key yet, as with
+    legacy base64 rows).
+    """
+    header = request.headers.get('If-None-Match')
+    if not key or not header:
+        return None
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    etags = [etag[2:] if etag.startswith('W/') else etag for etag in parse_etags(header)]
+    if '*' not in etags and blob_etag(key) not in etags:
+        return None
+    response = HttpResponseNotModified()
+    _set_cache_headers(response, request, key)
+    return response
+
+
+def _file_size(fh):
+    size = getattr(fh, 'size', None)
+    if isinstance(size, int):
+        return size
+    pos = fh.tell()
+    fh.seek(0, io.SEEK_END)
+    size = fh.tell()
+    fh.seek(pos)
+    return size
+
+
+def parse_range_header(header, size):
+    """Return ``(start, end)`` (inclusive) for a single-range ``Range`` header.
+
+    Returns ``None`` when the header is absent or not a single byte range (the
+    full file is served), and raises ``ValueError`` when the range cannot be
+    satisfied for a file of ``size`` bytes.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _iter_range(fh, start, length, chunk_size):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def _read_batch(parts, batch_size):
+    """Join parts from ``parts`` until ``batch_size`` bytes; ``b''`` once exhausted."""
+    batch, size = [], 0
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        batch.append(part)
+        size += len(part)
+        if size >= batch_size:
+            break
+    return b''.join(batch)
+
+
+async def _async_parts(parts, batch_size):
+    # Default sync_to_async is thread-sensitive: every read (and any queryset
+    # iterator behind it) runs in this request's one sync thread
+    read = sync_to_async(_read_batch)
+    try:
+        while True:
+            batch = await read(parts, batch_size)
+            if not batch:
+                break
+            yield batch
+    finally:
+        close = getattr(parts, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_body(request, parts, batch_size=DEFAULT_CHUNK_SIZE):
+    """``parts`` (bytes or str) as the content of a ``StreamingHttpResponse``.
+
+    Under ASGI a synchronous iterator would be read to the end into memory
+    before the first byte is sent, so it is wrapped in an async iterator
+    that pulls about ``batch_size`` bytes at a time in a worker thread.
+    Under WSGI ``parts`` is returned unchanged.
+    """
+    if isinstance(request, ASGIRequest):
+        return _async_parts(iter(parts), batch_size)
+    return parts
+
+
+def stream_file(request, fh, content_type, filename, as_attachment=True, size=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, blob_key=None):
+    """Build a streaming response for the binary file object ``fh``.
+
+    The response owns ``fh`` and closes it once the body has been sent. Pass
+    the blob store ``blob_key`` to add ``ETag`` and ``Cache-Control`` headers.
+    """
+    if size is None:
+        size = _file_size(fh)
+    disposition = content_disposition_header(as_attachment, filename)
+
+    try:
+        byte_range = parse_range_header(request.headers.get('Range'), size)
+    except ValueError:
+        fh.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if byte_range is None and not isinstance(request, ASGIRequest):
+        response = FileResponse(fh, content_type=content_type)
+        response.block_size = chunk_size
+        response['Content-Length'] = str(size)
+    elif byte_range is None:
+        # FileResponse iterates synchronously, which ASGI would buffer in full
+        response = StreamingHttpResponse(
+            streaming_body(request, _iter_range(fh, 0, size, chunk_size), chunk_size),
+            content_type=content_type,
+        )
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            streaming_body(request, _iter_range(fh, start, length, chunk_size), chunk_size),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    if disposition:
+        response['Content-Disposition'] = disposition
+    if blob_key:
+        _set_cache_headers(response, request, blob_key)
+    return response
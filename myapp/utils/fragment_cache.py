@@ -0,0 +1,97 @@
+"""Versioned cache for rendered template fragments.
+
+``{% cachefragment %}`` (``templatetags/fragments.py``) keeps a rendered
+block under a key made of its name, the values it varies on and the current
+data versions of the models it reads (see ``utils.analytics_cache``). Saving
+or deleting one of those models bumps its version, so the next render
+misses once and every render after that is a single cache read, with no
+queries for the querysets inside the block. ``FRAGMENT_CACHE_TIMEOUT``
+(seconds) bounds how long an unchanged fragment is reused.
+
+Hits, misses and the time spent rendering misses are counted per fragment
+for ``stats()``, and each render is logged on the request for the
+``{% fragment_report %}`` panel.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import analytics_cache
+
+KEY = 'fragment:{}:{}'
+STATS_KEY = 'fragment:stats:{}:{}'
+NAMES_KEY = 'fragment:names'
+
+
+def _add(key, amount=1):
+    if not cache.add(key, amount, None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, None)
+
+
+def _register(name):
+    # Only on a miss, so the occasional lost update is repaired by the next one
+    names = cache.get(NAMES_KEY) or set()
+    if name not in names:
+        cache.set(NAMES_KEY, names | {name}, None)
+
+
+def request_log(request):
+    """This request's fragment renders, in order: ``{'name', 'hit', 'ms'}``."""
+    if not hasattr(request, '_fragment_log'):
+        request._fragment_log = []
+    return request._fragment_log
+
+
+def cached_fragment(name, sources, vary_on, render, request=None):
+    """Return ``render()`` for ``name``/``vary_on``, reusing it while ``sources`` are unchanged."""
+    started = time.perf_counter()
+    # Versions are read first: a write during the render leaves the fragment stale
+    current = analytics_cache.versions(sources)
+    fingerprint = repr((list(vary_on), sorted(current.items())))
+    key = KEY.format(name, hashlib.sha256(fingerprint.encode()).hexdigest())
+    content = cache.get(key)
+    hit = content is not None
+    if hit:
+        _add(STATS_KEY.format(name, 'hits'))
+    else:
+        content = render()
+        cache.set(key, content, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 600))
+        _register(name)
+        _add(STATS_KEY.format(name, 'misses'))
+        _add(STATS_KEY.format(name, 'render_us'), int((time.perf_counter() - started) * 1_000_000))
+    if request is not None:
+        request_log(request).append({
+            'name': name, 'hit': hit, 'ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+    return content
+
+
+def _rate(hits, misses):
+    total = hits + misses
+    return round(hits / total * 100, 2) if total else 0
+
+
+def stats():
+    """Hit/miss counters per fragment since the cache was last cleared."""
+    names = sorted(cache.get(NAMES_KEY) or ())
+    keys = [STATS_KEY.format(name, stat) for name in names for stat in ('hits', 'misses', 'render_us')]
+    counts = cache.get_many(keys)
+    fragments = {}
+    for name in names:
+        hits = counts.get(STATS_KEY.format(name, 'hits'), 0)
+        misses = counts.get(STATS_KEY.format(name, 'misses'), 0)
+        render_us = counts.get(STATS_KEY.format(name, 'render_us'), 0)
+        fragments[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': _rate(hits, misses),
+            'avg_miss_ms': round(render_us / misses / 1000, 2) if misses else 0,
+        }
+    hits = sum(fragment['hits'] for fragment in fragments.values())
+    misses = sum(fragment['misses'] for fragment in fragments.values())
+    return {'hits': hits, 'misses': misses, 'hit_rate': _rate(hits, misses), 'fragments': fragments}
@@ -0,0 +1,68 @@
+"""Live analytics deltas for the server-sent event stream.
+
+The rollup signal handlers already work out which counts a write moved
+(``rollups.apply_change``); once the write commits they are published here
+as one event::
+
+    {'id': 42, 'metric': 'appointments', 'changes': [
+        {'day': '2026-10-17', 'dimension': 'status', 'value': 'Pending', 'delta': -1},
+        {'day': '2026-10-17', 'dimension': 'status', 'value': 'Completed', 'delta': 1},
+    ]}
+
+Events are numbered from a counter in the default cache and kept for
+``LIVE_EVENTS_TTL`` seconds, so a stream (or a browser reconnecting with
+``Last-Event-ID``) reads everything after the last id it saw. Like the
+analytics cache versions, this needs the writers and the stream to share
+one cache (``CACHES`` in settings: Redis, or the database cache).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+SEQ_KEY = 'analytics:events:seq'
+EVENT_KEY = 'analytics:events:{}'
+
+# never hand a stream more than this many events per read
+MAX_BATCH = 200
+
+
+def _ttl():
+    return getattr(settings, 'LIVE_EVENTS_TTL', 600)
+
+
+def last_id():
+    """Id of the newest published event (0 when none)."""
+    return cache.get(SEQ_KEY, 0)
+
+
+def publish(metric, changes):
+    """Store one event for ``metric`` and return its id."""
+    # Use the id this call produced: re-reading the counter could return a later writer's id
+    if cache.add(SEQ_KEY, 1, None):
+        event_id = 1
+    else:
+        try:
+            event_id = cache.incr(SEQ_KEY)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(SEQ_KEY, 1, None)
+            event_id = 1
+    cache.set(EVENT_KEY.format(event_id), {'id': event_id, 'metric': metric, 'changes': changes}, _ttl())
+    return event_id
+
+
+def publish_on_commit(metric, changes):
+    """``publish`` once the current transaction commits (now outside one)."""
+    if changes:
+        transaction.on_commit(lambda: publish(metric, changes))
+
+
+def events_since(event_id):
+    """Events newer than ``event_id``, oldest first; expired ones are skipped."""
+    newest = last_id()
+    if newest < event_id:
+        # counter was reset (cache cleared): start over from the beginning
+        event_id = 0
+    ids = range(max(event_id, newest - MAX_BATCH) + 1, newest + 1)
+    found = cache.get_many([EVENT_KEY.format(i) for i in ids])
+    return [found[EVENT_KEY.format(i)] for i in ids if EVENT_KEY.format(i) in found]
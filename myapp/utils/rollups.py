@@ -0,0 +1,342 @@
+"""Daily analytics rollups.
+
+``DailyRollup`` holds one count per (day, metric, dimension, value), so
+analytics over past days reads a few hundred small rows instead of scanning
+the source tables. The counts are kept current from model signals:
+
+* ``pre_save``/``pre_delete`` read the row's dimensions as stored;
+* ``post_save``/``post_delete`` apply the difference (+1 for the new
+  dimensions, -1 for the old ones) and publish it to ``live_events`` for
+  the dashboard's event stream.
+
+Changes that bypass signals (``QuerySet.update``, raw SQL) are corrected by
+``manage.py rebuild_rollups``, which recomputes whole days from the source
+tables and is meant to run nightly.
+
+Readers (``rollup_counts``, ``rollup_series``) use rollups for days before
+today and count today's rows live, so today is always exact.
+"""
+import logging
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from . import live_events
+from .timeseries import LABEL_FORMATS, TRUNCATE, bucket_start, day_bound, next_bucket
+
+logger = logging.getLogger(__name__)
+
+Metric = namedtuple('Metric', 'model date_field dimensions')
+
+ALL = 'all'
+
+# metric -> source model, date field and {dimension: lookup}
+METRICS = {
+    'appointments': Metric('Appointment', 'created_at', {
+        'status': 'status',
+        'approval_status': 'approval_status',
+        'type': 'consultation_type',
+        'doctor': 'doctor_id',
+        'specialization': 'doctor__specialization',
+    }),
+    'lab_results': Metric('LabResult', 'upload_date', {
+        'type': 'lab_type',
+    }),
+    'prescriptions': Metric('Prescription', 'created_at', {
+        'status': 'status',
+        'doctor': 'doctor_id',
+    }),
+    'booked_services': Metric('BookedService', 'booking_date', {
+        'status': 'status',
+        'service_name': 'service_name',
+    }),
+    'users': Metric('User', 'date_joined', {
+        'role': 'role',
+        'active': 'is_active',
+    }),
+}
+
+
+def _model(name, apps=global_apps):
+    return apps.get_model('myapp', name)
+
+
+def _as_day(value):
+    """Local calendar day of a date or datetime."""
+    if isinstance(value, datetime):
+        return (timezone.localtime(value) if timezone.is_aware(value) else value).date()
+    return value
+
+
+def _as_value(value):
+    return '' if value is None else str(value)
+
+
+def _keys(metric, row):
+    """``{(day, dimension, value)}`` a source row contributes to."""
+    spec = METRICS[metric]
+    if row is None or row.get(spec.date_field) is None:
+        return set()
+    day = _as_day(row[spec.date_field])
+    keys = {(day, ALL, '')}
+    for dimension, lookup in spec.dimensions.items():
+        keys.add((day, dimension, _as_value(row[lookup])))
+    return keys
+
+
+def _read(metric, pk):
+    spec = METRICS[metric]
+    model = _model(spec.model)
+    return model._base_manager.filter(pk=pk).values(spec.date_field, *spec.dimensions.values()).first()
+
+
+def _bump(metric, day, dimension, value, delta):
+    DailyRollup = _model('DailyRollup')
+    lookup = dict(metric=metric, day=day, dimension=dimension, value=value)
+    if DailyRollup.objects.filter(**lookup).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            DailyRollup.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Created concurrently since the update above
+        DailyRollup.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def apply_change(metric, before, after):
+    """Move one row's counts from the ``before`` keys to the ``after`` keys.
+
+    Returns the changes made as ``[{'day', 'dimension', 'value', 'delta'}]``.
+    """
+    old, new = _keys(metric, before), _keys(metric, after)
+    changes = [(key, -1) for key in old - new] + [(key, 1) for key in new - old]
+    for (day, dimension, value), delta in changes:
+        _bump(metric, day, dimension, value, delta)
+    return [
+        {'day': day.isoformat(), 'dimension': dimension, 'value': value, 'delta': delta}
+        for (day, dimension, value), delta in changes
+    ]
+
+
+# ---- signal handlers --------------------------------------------------------
+
+def _metric_for(sender):
+    for metric, spec in METRICS.items():
+        if sender._meta.app_label == 'myapp' and sender.__name__ == spec.model:
+            return metric
+    return None
+
+
+def _remember(sender, instance, **kwargs):
+    metric = _metric_for(sender)
+    if metric is None:
+        return
+    try:
+        # Savepoint: a failed read must not break the caller's transaction
+        with transaction.atomic():
+            adding = instance._state.adding or instance.pk is None
+            instance._rollup_before = None if adding else _read(metric, instance.pk)
+    except Exception:
+        # never raise from signal handlers; rebuild_rollups reconciles
+        logger.exception('Could not read %s %s before the change', metric, instance.pk)
+        instance._rollup_before = None
+
+
+def _on_save(sender, instance, **kwargs):
+    metric = _metric_for(sender)
+    if metric is None:
+        return
+    try:
+        with transaction.atomic():
+            changes = apply_change(metric, getattr(instance, '_rollup_before', None), _read(metric, instance.pk))
+        live_events.publish_on_commit(metric, changes)
+    except Exception:
+        logger.exception('Could not update %s rollups for pk %s; rebuild_rollups will reconcile', metric, instance.pk)
+
+
+def _on_delete(sender, instance, **kwargs):
+    metric = _metric_for(sender)
+    if metric is None:
+        return
+    try:
+        with transaction.atomic():
+            changes = apply_change(metric, getattr(instance, '_rollup_before', None), None)
+        live_events.publish_on_commit(metric, changes)
+    except Exception:
+        logger.exception('Could not update %s rollups for pk %s; rebuild_rollups will reconcile', metric, instance.pk)
+
+
+def connect():
+    for spec in METRICS.values():
+        model = _model(spec.model)
+        uid = f'rollups:{spec.model}'
+        pre_save.connect(_remember, sender=model, dispatch_uid=uid)
+        pre_delete.connect(_remember, sender=model, dispatch_uid=uid)
+        post_save.connect(_on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=uid)
+
+
+# ---- reconciliation ----------------------------------------------------------
+
+def _grouped(metric, queryset, lookup):
+    """``{(day, value): count}`` for ``queryset`` grouped by day and ``lookup``."""
+    spec = METRICS[metric]
+    if queryset.model._meta.get_field(spec.date_field).get_internal_type() == 'DateTimeField':
+        day_expr = TruncDate(spec.date_field)
+    else:
+        day_expr = F(spec.date_field)
+    values = ('rollup_day',) if lookup is None else ('rollup_day', lookup)
+    rows = queryset.annotate(rollup_day=day_expr).values(*values).annotate(n=Count('pk')).order_by()
+    return {(row['rollup_day'], '' if lookup is None else _as_value(row[lookup])): row['n'] for row in rows}
+
+
+def rebuild(metrics=None, start=None, end=None, apps=global_apps):
+    """Recompute rollups for days ``start <= day < end`` (either may be open).
+
+    Returns ``{metric: rows written}``. Runs per metric in one transaction so
+    readers never see a half-rebuilt metric.
+    """
+    DailyRollup = _model('DailyRollup', apps)
+    written = {}
+    for metric in metrics or METRICS:
+        spec = METRICS[metric]
+        model = _model(spec.model, apps)
+        source = model._base_manager.exclude(**{f'{spec.date_field}__isnull': True})
+        existing = DailyRollup.objects.filter(metric=metric)
+        if start is not None:
+            source = source.filter(**{f'{spec.date_field}__gte': day_bound(model, spec.date_field, start)})
+            existing = existing.filter(day__gte=start)
+        if end is not None:
+            source = source.filter(**{f'{spec.date_field}__lt': day_bound(model, spec.date_field, end)})
+            existing = existing.filter(day__lt=end)
+        rows = []
+        for dimension, lookup in [(ALL, None), *spec.dimensions.items()]:
+            for (day, value), n in _grouped(metric, source, lookup).items():
+                rows.append(DailyRollup(day=day, metric=metric, dimension=dimension, value=value, count=n))
+        with transaction.atomic():
+            existing.delete()
+            DailyRollup.objects.bulk_create(rows, batch_size=1000)
+        written[metric] = len(rows)
+    return written
+
+
+# ---- readers -----------------------------------------------------------------
+
+def _live_today(metric, dimension, start, end):
+    """Source rows for the part of ``[start, end)`` that falls on or after today."""
+    spec = METRICS[metric]
+    model = _model(spec.model)
+    today = timezone.localdate()
+    lower = max(start, today) if start is not None else today
+    if end is not None and end <= lower:
+        return None
+    queryset = model._base_manager.filter(**{f'{spec.date_field}__gte': day_bound(model, spec.date_field, lower)})
+    if end is not None:
+        queryset = queryset.filter(**{f'{spec.date_field}__lt': day_bound(model, spec.date_field, end)})
+    return queryset
+
+
+def _as_date(value):
+    return None if value is None else _as_day(value)
+
+
+def rollup_counts(metric, dimension, start=None, end=None):
+    """``{value: count}`` of ``metric`` by ``dimension`` for ``start <= t < end``.
+
+    ``start``/``end`` are dates or midnight datetimes; ``dimension='all'``
+    returns ``{'': total}``.
+    """
+    start, end = _as_date(start), _as_date(end)
+    today = timezone.localdate()
+    counts = {}
+    rollups = _model('DailyRollup').objects.filter(metric=metric, dimension=dimension, day__lt=today)
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lt=end)
+    for row in rollups.values('value').annotate(n=Sum('count')).order_by():
+        if row['n']:
+            counts[row['value']] = row['n']
+    live = _live_today(metric, dimension, start, end)
+    if live is not None:
+        if dimension == ALL:
+            live_counts = {'': live.count()}
+        else:
+            # Today's rows are few: read just their values so the query stays
+            # a range scan of the date index (a GROUP BY lets the planner pick
+            # the dimension's index and walk the whole table instead)
+            lookup = METRICS[metric].dimensions[dimension]
+            live_counts = Counter(_as_value(value) for value in live.values_list(lookup, flat=True).iterator())
+        for value, n in live_counts.items():
+            if n:
+                counts[value] = counts.get(value, 0) + n
+    return counts
+
+
+def rollup_distribution(metric, dimension, start=None, end=None, values=None, unknown=None):
+    """``aggregates.distribution()`` read from the rollups.
+
+    Every entry of ``values`` (default: the source field's choices) is
+    present, zero when no row has it; other values found follow, most
+    frequent first. Rows with an empty value are counted under ``unknown``,
+    or left out when it is ``None``.
+    """
+    if values is None:
+        spec = METRICS[metric]
+        try:
+            field = _model(spec.model)._meta.get_field(spec.dimensions[dimension])
+            values = [choice for choice, _ in field.flatchoices]
+        except Exception:
+            # Related lookups ('doctor__specialization') have no choices to fill from
+            values = []
+    counts = dict.fromkeys(values, 0)
+    found = rollup_counts(metric, dimension, start, end)
+    for value in sorted(found, key=found.get, reverse=True):
+        key = value
+        if value == '':
+            if unknown is None:
+                continue
+            key = unknown
+        counts[key] = counts.get(key, 0) + found[value]
+    return counts
+
+
+def rollup_total(metric, start=None, end=None):
+    """Number of ``metric`` rows for ``start <= t < end``."""
+    return rollup_counts(metric, ALL, start, end).get('', 0)
+
+
+def rollup_series(metric, buckets, unit='month', label='month'):
+    """``[{label: ..., 'count': ...}]`` of ``metric`` for each of ``buckets``.
+
+    ``buckets`` comes from ``timeseries.calendar_buckets`` with the same
+    ``unit``; empty buckets are zero.
+    """
+    if not buckets:
+        return []
+    start, end = min(buckets), next_bucket(unit, max(buckets))
+    today = timezone.localdate()
+    counts = {}
+    rows = (
+        _model('DailyRollup').objects
+        .filter(metric=metric, dimension=ALL, day__gte=start, day__lt=min(end, today))
+        .annotate(bucket=TRUNCATE[unit]('day'))
+        .values('bucket')
+        .annotate(n=Sum('count'))
+        .order_by()
+    )
+    for row in rows:
+        day = _as_day(row['bucket'])
+        counts[day] = counts.get(day, 0) + row['n']
+    live = _live_today(metric, ALL, start, end)
+    if live is not None:
+        current = bucket_start(unit, today)
+        counts[current] = counts.get(current, 0) + live.count()
+    fmt = LABEL_FORMATS[unit]
+    return [{label: start.strftime(fmt), 'count': counts.get(start, 0)} for start in buckets]
@@ -0,0 +1,79 @@
+"""Stale-while-revalidate snapshots in the default cache.
+
+``get_snapshot(name, build, ttl, sources)`` returns the cached result of
+``build()`` for ``name``. Once it is older than ``ttl`` seconds, or one of
+the ``sources`` models has changed since it was built (the version counters
+of ``utils.analytics_cache``), the stale snapshot is still returned
+immediately while a background thread rebuilds it. A lock taken with
+``cache.add`` makes that refresh single-flight: whichever request takes the
+lock rebuilds, and everyone else keeps reading the old snapshot instead of
+running the same queries at the same time.
+
+Only a cold cache (first request, or nothing read for ``MAX_STALE_SECONDS``)
+builds in the request; concurrent cold requests wait briefly for the one
+holding the lock rather than all building at once.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+from . import analytics_cache
+
+KEY = 'snapshot:{}'
+LOCK_KEY = 'snapshot:{}:lock'
+# A refresh that dies without releasing its lock frees it after this long
+LOCK_SECONDS = 60
+# Snapshots are never served older than this; past it the next read rebuilds
+MAX_STALE_SECONDS = 600
+# How long a cold read waits for another request's build before building itself
+COLD_WAIT_SECONDS = 2
+POLL_SECONDS = 0.05
+
+
+def _spawn(target):
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _store(name, build, sources):
+    # Versions are read first: a write during the build leaves the snapshot stale
+    current = analytics_cache.versions(sources)
+    data = build()
+    cache.set(KEY.format(name), {'data': data, 'built_at': time.time(), 'versions': current}, MAX_STALE_SECONDS)
+    return data
+
+
+def _refresh(name, build, sources):
+    try:
+        _store(name, build, sources)
+    finally:
+        cache.delete(LOCK_KEY.format(name))
+        connections.close_all()  # this thread's connections only
+
+
+def _build_cold(name, build, sources):
+    lock = LOCK_KEY.format(name)
+    deadline = time.monotonic() + COLD_WAIT_SECONDS
+    while not cache.add(lock, 1, LOCK_SECONDS):
+        if time.monotonic() >= deadline:
+            return build()
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(KEY.format(name))
+        if entry is not None:
+            return entry['data']
+    try:
+        return _store(name, build, sources)
+    finally:
+        cache.delete(lock)
+
+
+def get_snapshot(name, build, ttl, sources=analytics_cache.SOURCE_MODELS):
+    """``build()``'s cached result, refreshed in the background once stale."""
+    entry = cache.get(KEY.format(name))
+    if entry is None:
+        return _build_cold(name, build, sources)
+    stale = time.time() - entry['built_at'] >= ttl or entry['versions'] != analytics_cache.versions(sources)
+    if stale and cache.add(LOCK_KEY.format(name), 1, LOCK_SECONDS):
+        _spawn(lambda: _refresh(name, build, sources))
+    return entry['data']
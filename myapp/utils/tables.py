@@ -0,0 +1,147 @@
+"""Keyset-paginated JSON sources for the admin tables.
+
+A ``Table`` describes one listing: its base queryset, the columns it sends
+(compact JSON keys mapped to ORM lookups), the sort orders it allows, the
+columns ``search`` matches and the filters it accepts. ``Table.page`` turns
+request parameters into one page::
+
+    ?sort=date-desc&search=santos&type=X-ray&date_from=2026-01-01&limit=50
+
+    {"rows": [{"id": 812, "date": "2026-03-02T09:15:00Z", ...}], "next": "WyIyMDI2..."}
+
+Pages are addressed by keyset, not offset: ``next`` is an opaque cursor
+holding the last row's sort values and primary key, and the following page
+is ``WHERE (sort, pk) > cursor ORDER BY sort, pk LIMIT n``. Every page
+costs the same however deep it is, and rows added in the meantime neither
+repeat nor go missing. Rows are read as ``values()`` projections, so blob
+columns never leave the database.
+
+Sort columns must be non-null: ``NULL`` never compares equal in the keyset
+condition, so rows holding one would be skipped.
+"""
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+
+from .timeseries import day_bound
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def _json_default(value):
+    # Full precision: a cursor rounded to milliseconds would skip or repeat rows
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=_json_default).encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    """Sort values stored in ``cursor``; raises ``ValueError`` if it is not one of ours."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def after(keys, values, descending=False):
+    """Rows past ``values`` in ``keys`` order: ``(k1, k2, ...) > (v1, v2, ...)``."""
+    op = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, key in enumerate(keys):
+        condition |= Q(**dict(zip(keys[:i], values[:i])), **{f'{key}__{op}': values[i]})
+    return condition
+
+
+def _limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_LIMIT
+    except ValueError:
+        raise ValueError('limit must be a number')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+class Table:
+    """One paginated listing.
+
+    ``queryset`` is a callable returning the base queryset, ``fields`` maps
+    JSON keys to lookups, ``sorts`` maps sort names (the first is the
+    default) to ``(lookups, descending)``, ``search`` lists the lookups
+    ``?search=`` matches, ``filters`` maps parameters to exact-match lookups
+    and ``date_field`` is filtered by ``?date_from=``/``?date_to=``
+    (inclusive). ``summary``, if given, is called with the filtered queryset
+    for the first page and its result returned alongside the rows.
+    """
+
+    def __init__(self, queryset, fields, sorts, search=(), filters=None, date_field=None, summary=None):
+        self.queryset = queryset
+        self.fields = fields
+        self.sorts = sorts
+        self.search = search
+        self.filters = filters or {}
+        self.date_field = date_field
+        self.summary = summary
+
+    def filtered(self, params):
+        """Base queryset narrowed by the search term, filters and date range."""
+        queryset = self.queryset()
+        term = (params.get('search') or '').strip()
+        if term and self.search:
+            condition = Q()
+            for lookup in self.search:
+                condition |= Q(**{f'{lookup}__icontains': term})
+            queryset = queryset.filter(condition)
+        for param, lookup in self.filters.items():
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: params[param]})
+        if self.date_field:
+            model = queryset.model
+            start = _parse_date(params.get('date_from'))
+            end = _parse_date(params.get('date_to'))
+            if start is not None:
+                queryset = queryset.filter(**{f'{self.date_field}__gte': day_bound(model, self.date_field, start)})
+            if end is not None:
+                queryset = queryset.filter(
+                    **{f'{self.date_field}__lt': day_bound(model, self.date_field, end + timedelta(days=1))}
+                )
+        return queryset
+
+    def page(self, params):
+        """One page of rows for ``params``; raises ``ValueError`` for a bad parameter."""
+        sort = params.get('sort') or next(iter(self.sorts))
+        if sort not in self.sorts:
+            raise ValueError(f"Unknown sort '{sort}'")
+        lookups, descending = self.sorts[sort]
+        keys = [*lookups, 'pk']
+        limit = _limit(params.get('limit'))
+        queryset = self.filtered(params)
+
+        result = {}
+        if params.get('cursor'):
+            queryset = queryset.filter(after(keys, decode_cursor(params['cursor'], len(keys)), descending))
+        else:
+            if params.get('count'):
+                result['total'] = queryset.count()
+            if self.summary:
+                result['summary'] = self.summary(queryset)
+
+        columns = list(dict.fromkeys([*self.fields.values(), *keys]))
+        order = [f'-{key}' if descending else key for key in keys]
+        fetched = list(queryset.order_by(*order).values(*columns)[:limit + 1])
+        rows = fetched[:limit]
+        result['rows'] = [{name: row[lookup] for name, lookup in self.fields.items()} for row in rows]
+        result['next'] = encode_cursor([rows[-1][key] for key in keys]) if len(fetched) > limit else None
+        return result
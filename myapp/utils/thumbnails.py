@@ -0,0 +1,96 @@
+"""Profile photo thumbnails.
+
+Uploaded profile photos are resized with Pillow into fixed-size square
+variants (``THUMBNAIL_SIZES``) and written to the blob store. The profile
+keeps the blob keys in ``UserProfile.photo_variants`` and pages reference
+the photo through the ``profile_photo_thumbnail`` URL instead of embedding a
+base64 data URL in the HTML.
+"""
+import io
+
+from django.urls import reverse
+from PIL import Image, ImageOps, features
+
+from .blob_store import get_blob_store
+from .downloads import open_data_url, versioned_url
+
+THUMBNAIL_SIZES = (64, 160, 512)
+DEFAULT_THUMBNAIL_SIZE = 512
+ORIGINAL_VARIANT = 'original'
+
+# WebP is much smaller for photos; fall back to JPEG if Pillow was built without it
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+THUMBNAIL_MIME_TYPE = 'image/webp' if THUMBNAIL_FORMAT == 'WEBP' else 'image/jpeg'
+THUMBNAIL_QUALITY = 80
+
+
+def render_thumbnails(content: bytes) -> dict:
+    """Return ``{size: encoded_bytes}`` for every size in ``THUMBNAIL_SIZES``.
+
+    Raises ``ValueError`` if ``content`` is not an image Pillow can read.
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}") from e
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha and THUMBNAIL_FORMAT == 'WEBP' else 'RGB')
+
+    thumbnails = {}
+    for size in THUMBNAIL_SIZES:
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        thumbnails[size] = buffer.getvalue()
+    return thumbnails
+
+
+def save_profile_photo(profile, content: bytes, content_type=None):
+    """Store ``content`` and its thumbnails and point ``profile`` at them.
+
+    Sets ``photo_variants`` and ``photo_url`` on ``profile`` but does not save
+    it; the profile must already have a primary key.
+    """
+    thumbnails = render_thumbnails(content)
+    store = get_blob_store()
+    variants = {ORIGINAL_VARIANT: store.save(content, content_type)}
+    for size, data in thumbnails.items():
+        variants[str(size)] = store.save(data, THUMBNAIL_MIME_TYPE)
+    profile.photo_variants = variants
+    profile.photo_url = photo_thumbnail_url(profile.profile_id, variants, DEFAULT_THUMBNAIL_SIZE)
+    return profile.photo_url
+
+
+def build_missing_thumbnails(profile):
+    """Create thumbnails for a profile whose photo is still a base64 data URL.
+
+    Returns True if the profile was updated and saved.
+    """
+    photo = profile.photo_url
+    if not photo or not photo.startswith('data:'):
+        return False
+    content_type, fh = open_data_url(photo)
+    with fh:
+        content = fh.read()
+    save_profile_photo(profile, content, content_type)
+    profile.save(update_fields=['photo_variants', 'photo_url'])
+    return True
+
+
+def photo_thumbnail_url(profile_id, variants, size):
+    """Return the thumbnail URL for ``size``.
+
+    The URL carries the variant's key as a version, so it can be cached
+    forever.
+    """
+    url = reverse('profile_photo_thumbnail', args=[profile_id, size])
+    return versioned_url(url, (variants or {}).get(str(size)))
+
+
+def thumbnail_mime_type(data_head: bytes) -> str:
+    """Sniff the MIME type of a stored thumbnail from its first bytes."""
+    if data_head[:4] == b'RIFF' and data_head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
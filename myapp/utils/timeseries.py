@@ -0,0 +1,47 @@
+"""Calendar buckets for count series (see ``rollups.rollup_series``).
+
+Buckets are real calendar days, ISO weeks (starting Monday) or months, so
+labels always name the period that was counted.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+TRUNCATE = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+LABEL_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+
+
+def bucket_start(unit, moment):
+    """First day of the ``unit`` bucket containing ``moment``."""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(unit, start):
+    """First day of the bucket after the one starting at ``start``."""
+    if unit == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=7 if unit == 'week' else 1)
+
+
+def calendar_buckets(unit, anchor, count):
+    """Start dates of the ``count`` buckets ending with the one holding ``anchor``, newest first."""
+    buckets = [bucket_start(unit, anchor)]
+    while len(buckets) < count:
+        buckets.append(bucket_start(unit, buckets[-1] - timedelta(days=1)))
+    return buckets
+
+
+def day_bound(model, field, day):
+    """``day`` as a lookup value for ``model.field``: midnight in the current timezone for datetimes."""
+    if model._meta.get_field(field).get_internal_type() != 'DateTimeField':
+        return day
+    moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+